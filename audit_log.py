@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+操作日志异步批量写入
+调用方只把日志放入内存队列，后台线程按条数或时间批量写入 operation_logs；
+数据库不可用时写入本地暂存文件，恢复后按原顺序补写；
+暂存文件中无法解析或数据库拒绝的行移到 .rejected 文件，不会阻塞之后的写入
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import pymysql
+
+from db import get_db_conn
+
+AUDIT_CONFIG = {
+    "batch_size": 200,        # 队列达到此条数立即写入
+    "flush_interval": 2.0,    # 最多等待此秒数后写入
+    "max_queue": 10000,       # 队列上限，超出部分直接写入暂存文件
+    "retry_interval": 30,     # 写入失败后此秒数内不再连接数据库，新日志直接暂存
+    "spill_path": os.path.join(os.path.expanduser("~"), ".recycle_mind", "audit_spill.jsonl"),
+}
+
+INSERT_SQL = ("INSERT INTO operation_logs (user_id, username, operation, details, ip_address, timestamp) "
+              "VALUES (%s, %s, %s, %s, %s, %s)")
+
+# 与数据本身有关的错误（外键、字段超长等），重试也不会成功；其余错误视为连接问题，稍后重试
+DATA_ERRORS = (pymysql.err.IntegrityError, pymysql.err.DataError)
+
+
+class AuditLogWriter:
+    """操作日志写入器，log() 不做任何数据库操作，可在界面线程中随意调用"""
+
+    def __init__(self, connect=get_db_conn, batch_size=200, flush_interval=2.0, max_queue=10000,
+                 retry_interval=30, spill_path=None):
+        self._connect = connect
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.retry_interval = retry_interval
+        self.spill_path = spill_path
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._spill_lock = threading.RLock()
+        self._in_flight = 0
+        self._flush_requested = False
+        self._closed = False
+        self._retry_at = 0.0
+        self._thread = None
+        self._stats = {
+            'queued': 0,
+            'written': 0,
+            'batches': 0,
+            'spilled': 0,
+            'replayed': 0,
+            'rejected': 0,
+            'failures': 0,
+        }
+
+    def log(self, user_id, username, operation, details="", ip_address=None):
+        """记录一条日志，时间取调用时刻而不是写入时刻"""
+        event = (user_id, username, operation, details, ip_address,
+                 datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        with self._cond:
+            if not self._closed and len(self._queue) < self.max_queue:
+                self._queue.append(event)
+                self._stats['queued'] += 1
+                if len(self._queue) >= self.batch_size:
+                    self._cond.notify_all()
+                self._ensure_thread()
+                return
+        # 已关闭或队列已满：不丢日志，直接暂存
+        self._spill([event])
+
+    def flush(self, timeout=5.0):
+        """等待队列中的日志写入（或暂存）完毕，超时返回 False"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if not self._queue and not self._in_flight:
+                return True
+            self._flush_requested = True
+            self._ensure_thread()
+            self._cond.notify_all()
+            while self._queue or self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=5.0):
+        """停止后台线程，剩余日志写入数据库，写不进去的暂存到本地文件"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        with self._cond:
+            left = list(self._queue)
+            self._queue.clear()
+        if left:
+            self._spill(left)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._queue) + self._in_flight
+        stats['spill_file'] = self.spill_path if self._has_spill() else None
+        return stats
+
+    def _ensure_thread(self):
+        """首次使用时启动后台线程（调用方持有锁）"""
+        if self._thread is None and not self._closed:
+            self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while not (self._closed or self._flush_requested or len(self._queue) >= self.batch_size):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.batch_size))]
+                self._in_flight = len(batch)
+                closing = self._closed
+
+            if batch or (self._has_spill() and time.monotonic() >= self._retry_at):
+                self._write(batch, force=closing)
+
+            with self._cond:
+                self._in_flight = 0
+                if not self._queue:
+                    self._flush_requested = False
+                self._cond.notify_all()
+                if closing and not self._queue:
+                    return
+
+    def _write(self, batch, force=False):
+        """先补写暂存文件，再写入本批日志，两者各自提交；失败则本批暂存"""
+        if not force and time.monotonic() < self._retry_at:
+            self._spill(batch)
+            return
+        try:
+            # 补写期间不允许追加暂存文件，避免删除文件时丢掉新追加的日志
+            with self._spill_lock:
+                conn = self._connect()
+                try:
+                    self._replay_spill(conn)
+                    if batch:
+                        self._insert(conn, batch)
+                finally:
+                    conn.close()
+        except Exception as e:
+            print(f"操作日志写入失败，已暂存到本地文件: {e}")
+            self._retry_at = time.monotonic() + self.retry_interval
+            with self._cond:
+                self._stats['failures'] += 1
+            self._spill(batch)
+            return
+        self._retry_at = 0.0
+        with self._cond:
+            self._stats['written'] += len(batch)
+            self._stats['batches'] += 1
+
+    def _has_spill(self):
+        return bool(self.spill_path) and os.path.exists(self.spill_path)
+
+    def _spill(self, events):
+        if not events:
+            return
+        if not self.spill_path:
+            for event in events:
+                print(f"操作日志: {event[1]} - {event[2]} - {event[3]}")
+            return
+        with self._spill_lock:
+            os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+            with open(self.spill_path, 'a', encoding='utf-8') as f:
+                # 上次追加到一半就退出时先补上换行，新日志不会和残缺的行连在一起
+                if f.tell() and not self._ends_with_newline(self.spill_path):
+                    f.write("\n")
+                for event in events:
+                    f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        with self._cond:
+            self._stats['spilled'] += len(events)
+
+    @staticmethod
+    def _ends_with_newline(path):
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _insert(self, conn, events):
+        """在一个事务中分批写入日志，失败时回滚后抛出异常"""
+        conn.begin()
+        try:
+            with conn.cursor() as cursor:
+                for start in range(0, len(events), self.batch_size):
+                    cursor.executemany(INSERT_SQL, events[start:start + self.batch_size])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _replay_spill(self, conn):
+        """把暂存文件中的日志按原顺序补写（单独提交），返回补写的条数；调用方持有暂存锁
+
+        无法解析的行和数据库拒绝的日志移到 .rejected 文件；连接出错时只保留尚未写入的行，稍后重试
+        """
+        if not self._has_spill():
+            return 0
+        # 残缺的多字节字符按替换字符读出，该行随后因无法解析被移走
+        with open(self.spill_path, encoding='utf-8', errors='replace') as f:
+            lines = [line if line.endswith("\n") else line + "\n" for line in f if line.strip()]
+        events, rejected = [], []
+        for line in lines:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                rejected.append(line)
+                continue
+            if isinstance(event, list) and len(event) == 6:
+                events.append((event, line))
+            else:
+                rejected.append(line)
+
+        written = 0
+        try:
+            self._insert(conn, [event for event, _ in events])
+            written = len(events)
+        except DATA_ERRORS:
+            # 整批被拒绝时逐条写入，找出有问题的日志
+            for i, (event, line) in enumerate(events):
+                try:
+                    self._insert(conn, [event])
+                    written += 1
+                except DATA_ERRORS as e:
+                    print(f"暂存的操作日志无法写入，已移到 {self.spill_path}.rejected: {e}")
+                    rejected.append(line)
+                except Exception:
+                    self._replace_spill([line for _, line in events[i:]], rejected, written)
+                    raise
+        except Exception:
+            self._replace_spill([line for _, line in events], rejected, 0)
+            raise
+        self._replace_spill([], rejected, written)
+        return written
+
+    def _replace_spill(self, remaining, rejected, written):
+        """用尚未写入的行替换暂存文件，并把被拒绝的行追加到 .rejected 文件（调用方持有暂存锁）"""
+        if rejected:
+            with open(self.spill_path + ".rejected", 'a', encoding='utf-8') as f:
+                f.writelines(rejected)
+        if remaining:
+            partial = self.spill_path + ".tmp"
+            with open(partial, 'w', encoding='utf-8') as f:
+                f.writelines(remaining)
+            os.replace(partial, self.spill_path)
+        else:
+            os.remove(self.spill_path)
+        with self._cond:
+            self._stats['written'] += written
+            self._stats['replayed'] += written
+            self._stats['rejected'] += len(rejected)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_audit_writer():
+    """全局日志写入器（首次使用时创建，程序退出时写完剩余日志）"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = AuditLogWriter(**AUDIT_CONFIG)
+                atexit.register(_writer.close)
+    return _writer
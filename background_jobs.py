@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台任务
+在后台线程中排队执行耗时的计算（合成方案优化、备份和恢复等），界面保持响应，支持进度和取消
+"""
+
+import itertools
+import traceback
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+# JobCancelled 定义在不依赖 PyQt6 的 blend_planner 中，无界面的优化服务也会用到
+from blend_planner import JobCancelled
+
+
+class JobSignals(QObject):
+    progress = pyqtSignal(int, int, str)   # 任务ID, 进度(0-100), 说明
+    finished = pyqtSignal(int, object)     # 任务ID, 计算结果
+    failed = pyqtSignal(int, str)          # 任务ID, 错误信息
+    cancelled = pyqtSignal(int)            # 任务ID
+
+
+class BackgroundJob(QRunnable):
+    """一个后台任务
+
+    func 必须接受关键字参数 progress(percent, text)，并在各阶段调用它；
+    任务被取消后 progress 会抛出 JobCancelled 以尽快结束计算。
+    """
+
+    def __init__(self, job_id, title, func, args=(), kwargs=None):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.job_id = job_id
+        self.title = title
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.signals = JobSignals()
+        self._cancelled = False
+
+    @property
+    def is_cancelled(self):
+        return self._cancelled
+
+    def cancel(self):
+        self._cancelled = True
+
+    def report(self, percent, text=""):
+        if self._cancelled:
+            raise JobCancelled()
+        self.signals.progress.emit(self.job_id, int(percent), text)
+
+    def run(self):
+        if self._cancelled:
+            self.signals.cancelled.emit(self.job_id)
+            return
+        try:
+            self.report(0, "开始")
+            result = self.func(*self.args, progress=self.report, **self.kwargs)
+        except JobCancelled:
+            self.signals.cancelled.emit(self.job_id)
+        except Exception as e:
+            traceback.print_exc()
+            self.signals.failed.emit(self.job_id, str(e))
+        else:
+            if self._cancelled:
+                # 求解过程中无法中断，取消后到达的结果直接丢弃
+                self.signals.cancelled.emit(self.job_id)
+            else:
+                self.signals.finished.emit(self.job_id, result)
+
+
+class BackgroundJobRunner(QObject):
+    """任务队列：最多同时运行 max_concurrent 个任务，其余排队"""
+
+    job_added = pyqtSignal(int, str)
+    job_progress = pyqtSignal(int, int, str)
+    job_finished = pyqtSignal(int, object)
+    job_failed = pyqtSignal(int, str)
+    job_cancelled = pyqtSignal(int)
+
+    def __init__(self, max_concurrent=2, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_concurrent)
+        self.jobs = {}
+        self._ids = itertools.count(1)
+
+    def submit(self, title, func, *args, **kwargs):
+        """提交任务，返回任务ID"""
+        job = BackgroundJob(next(self._ids), title, func, args, kwargs)
+        job.signals.progress.connect(self.job_progress)
+        job.signals.finished.connect(self._on_finished)
+        job.signals.failed.connect(self._on_failed)
+        job.signals.cancelled.connect(self._on_cancelled)
+        self.jobs[job.job_id] = job
+        self.job_added.emit(job.job_id, title)
+        self.pool.start(job)
+        return job.job_id
+
+    def cancel(self, job_id):
+        """取消任务：排队中的任务直接移出队列，运行中的任务在下一个阶段结束"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        job.cancel()
+        if self.pool.tryTake(job):
+            self._on_cancelled(job_id)
+
+    def cancel_all(self):
+        for job_id in list(self.jobs):
+            self.cancel(job_id)
+
+    def active_count(self):
+        return len(self.jobs)
+
+    def _on_finished(self, job_id, result):
+        self.jobs.pop(job_id, None)
+        self.job_finished.emit(job_id, result)
+
+    def _on_failed(self, job_id, message):
+        self.jobs.pop(job_id, None)
+        self.job_failed.emit(job_id, message)
+
+    def _on_cancelled(self, job_id):
+        if self.jobs.pop(job_id, None) is not None:
+            self.job_cancelled.emit(job_id)
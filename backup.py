@@ -0,0 +1,692 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据备份
+用服务器端游标分块读取，每块序列化为 NDJSON 后写入 gzip 文件，内存占用与表大小无关；
+各表（大表按 id 范围拆成多段）在多个连接上并行导出，各连接使用同一时刻的一致性快照，
+全部导出后再把 gzip 文件原样存入 zip，备份用时取决于最大的表而不是所有表之和；
+恢复时同样逐块读取，多行 INSERT 批量写入，全部表在一个事务中完成；
+不依赖 PyQt6，界面通过 progress 回调显示进度
+
+备份分三种：
+  全量 full：所有表的全部数据
+  增量 incremental：相对最近一次任意备份的变化
+  差异 differential：相对最近一次全量备份的变化
+每个备份的 manifest 记录各表水位线和上一级备份，恢复时从全量备份开始依次应用整条备份链
+"""
+
+import gzip
+import itertools
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta
+
+import pymysql
+import pymysql.cursors
+
+from db import get_db_conn
+from waste_sync import DELETION_RETENTION_DAYS, SYNC_OVERLAP, record_restore
+
+BACKUP_TABLES = ['users', 'wastes', 'product_standards', 'operation_logs', 'backup_logs']
+
+BACKUP_TYPES = {
+    'full': "全量备份",
+    'incremental': "增量备份",
+    'differential': "差异备份",
+}
+
+# 可以只备份变化部分的表: 表 -> (方式, 水位线列)
+#   append: 只追加的表，按自增 id 取新行
+#   upsert: 按修改时间取变化的行，删除的行从删除记录表中取
+INCREMENTAL_TABLES = {
+    'operation_logs': ('append', 'id'),
+    'backup_logs': ('append', 'id'),
+    'wastes': ('upsert', 'updated_at'),
+}
+
+# upsert 表: 表 -> (主键列, 删除记录表, 删除时间列)
+UPSERT_KEYS = {
+    'wastes': ('名称', 'waste_deletions', 'deleted_at'),
+}
+
+# backup_logs 中记录备份链的列
+BACKUP_LOG_COLUMNS = {
+    'backup_type': "VARCHAR(20) NOT NULL DEFAULT 'full'",
+    'parent_path': "VARCHAR(255) NULL",
+    'watermarks': "TEXT NULL",
+    'duration_seconds': "DOUBLE NULL",
+    'source': "VARCHAR(20) NOT NULL DEFAULT 'manual'",
+}
+
+# 备份/恢复互斥锁（MySQL 命名锁，不同机器上的程序和后台服务之间同样有效）
+LOCK_NAME = "recycle_mind_backup"
+
+# 每次从服务器读取的行数
+CHUNK_ROWS = 5000
+
+# 恢复时每条 INSERT 写入的行数
+RESTORE_BATCH_ROWS = 2000
+
+# 读取备份时每次解析的行数
+PARSE_LINES = 2000
+
+# 并行导出使用的连接数（连接池上限为 8，留出界面和其他任务使用的连接）
+PARALLEL_WORKERS = 4
+
+# 估计行数超过此值的 append 表按 id 范围拆成多段并行导出
+SPLIT_ROWS = 200000
+
+# FLUSH TABLES WITH READ LOCK 最多等待的秒数，超时则不加锁
+SNAPSHOT_LOCK_WAIT = 5
+
+FORMAT_VERSION = 4
+MANIFEST_NAME = "manifest.json"
+
+
+def _json_default(value):
+    """日期、Decimal 等按字符串保存，与旧版备份一致"""
+    return str(value)
+
+
+def _estimate_rows(conn, tables):
+    """各表的估计行数（information_schema，仅用于进度显示）"""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT TABLE_NAME, TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()"
+        )
+        estimates = {name: rows or 0 for name, rows in cursor.fetchall()}
+    return {table: max(int(estimates.get(table, 0)), 1) for table in tables}
+
+
+def _table_columns(conn):
+    """当前库中各表的列名: {表: set(列名)}"""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE()"
+        )
+        columns = {}
+        for table, column in cursor.fetchall():
+            columns.setdefault(table, set()).add(column)
+    return columns
+
+
+def ensure_backup_schema(conn):
+    """给 backup_logs 补上记录备份链的列，没有 ALTER 权限时返回 False（只能做全量备份）"""
+    try:
+        existing = _table_columns(conn).get('backup_logs', set())
+        with conn.cursor() as cursor:
+            for column, definition in BACKUP_LOG_COLUMNS.items():
+                if column not in existing:
+                    cursor.execute(f"ALTER TABLE backup_logs ADD COLUMN {column} {definition}")
+        conn.commit()
+        return True
+    except Exception as e:
+        print(f"增量备份不可用，将只做全量备份: {e}")
+        return False
+
+
+def last_backup(conn, backup_type):
+    """增量备份的上一级是最近一次任意备份，差异备份的上一级是最近一次全量备份"""
+    query = ("SELECT backup_name, backup_path, backup_type, watermarks FROM backup_logs "
+             "WHERE status = 'success' AND watermarks IS NOT NULL")
+    if backup_type == 'differential':
+        query += " AND backup_type = 'full'"
+    query += " ORDER BY id DESC LIMIT 1"
+    with conn.cursor() as cursor:
+        cursor.execute(query)
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    return {'name': row[0], 'path': row[1], 'type': row[2], 'watermarks': json.loads(row[3])}
+
+
+def record_backup(conn, manifest, backup_file, created_by, source='manual'):
+    """把完成的备份写入 backup_logs，水位线供下一次增量/差异备份使用，耗时和大小用于统计备份成本"""
+    if not ensure_backup_schema(conn):
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO backup_logs (backup_name, backup_path, backup_size, created_by)
+                VALUES (%s, %s, %s, %s)
+            """, (manifest['name'], backup_file, manifest['size'], created_by))
+        conn.commit()
+        return
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO backup_logs (backup_name, backup_path, backup_size, created_by,
+                                     backup_type, parent_path, watermarks, duration_seconds, source)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, (manifest['name'], backup_file, manifest['size'], created_by,
+              manifest['type'], manifest.get('base_path'), json.dumps(manifest['watermarks']),
+              manifest.get('seconds'), source))
+    conn.commit()
+
+
+def _capture_watermarks(conn, tables, columns):
+    """备份开始前记录各表水位线: append 表取最大 id，upsert 表取服务器当前时间"""
+    marks = {}
+    with conn.cursor() as cursor:
+        for table in tables:
+            if table not in INCREMENTAL_TABLES:
+                continue
+            kind, column = INCREMENTAL_TABLES[table]
+            if column not in columns.get(table, ()):
+                continue
+            if kind == 'append':
+                cursor.execute(f"SELECT COALESCE(MAX(`{column}`), 0) FROM `{table}`")
+                marks[table] = int(cursor.fetchone()[0])
+            elif UPSERT_KEYS[table][1] in columns:
+                cursor.execute("SELECT NOW(6)")
+                marks[table] = str(cursor.fetchone()[0])
+    return marks
+
+
+def _deletions_cover(since):
+    """删除记录只保留有限天数，上一级备份太旧时删除信息可能不全"""
+    try:
+        since = datetime.fromisoformat(since)
+    except (TypeError, ValueError):
+        return False
+    return since > datetime.now() - timedelta(days=DELETION_RETENTION_DAYS - 1)
+
+
+def _table_plan(table, backup_type, since, marks):
+    """一张表的备份方式，返回 (方式, WHERE 子句, 参数)"""
+    if table not in marks:
+        return 'full', "", ()
+    kind, column = INCREMENTAL_TABLES[table]
+    changes_only = backup_type != 'full' and table in since
+    if kind == 'append':
+        if changes_only:
+            return 'append', f"WHERE `{column}` > %s AND `{column}` <= %s", (since[table], marks[table])
+        # 全量备份也截止到水位线，之后插入的行留给下一次增量备份，避免重复
+        return 'full', f"WHERE `{column}` <= %s", (marks[table],)
+    if changes_only and _deletions_cover(since[table]):
+        overlap = int(SYNC_OVERLAP.total_seconds())
+        return 'upsert', f"WHERE `{column}` > %s - INTERVAL {overlap} SECOND", (since[table],)
+    return 'full', "", ()
+
+
+def _dump_query(conn, path, query, params, chunk_rows, on_chunk):
+    """把查询结果写成 gzip 压缩的 NDJSON 文件，返回 (列名, 行数)"""
+    # 出错时不关闭游标：SSCursor.close() 会把剩余结果全部读完，由调用方直接断开连接
+    cursor = conn.cursor(pymysql.cursors.SSCursor)
+    cursor.execute(query, params or None)
+    columns = [col[0] for col in cursor.description]
+    count = 0
+    with gzip.open(path, 'wb', compresslevel=6) as f:
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            lines = "".join(json.dumps(row, ensure_ascii=False, default=_json_default) + "\n" for row in rows)
+            f.write(lines.encode('utf-8'))
+            count += len(rows)
+            on_chunk(count)
+    cursor.close()
+    return columns, count
+
+
+def _split_ranges(low, high, parts):
+    """把 id 区间 (low, high] 均分为 parts 段"""
+    bounds = [low + (high - low) * i // parts for i in range(parts + 1)]
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+def _plan_parts(conn, table, mode, where, params, since, marks, estimate, workers):
+    """一张表要导出的片段: [(成员名, 查询, 参数, 估计行数)]
+
+    行数较多的 append 表按 id 范围拆段，各段之间没有重叠，按顺序拼起来就是整张表；
+    全量备份的第一段不设下限（快照之后才删除的旧行也要导出）
+    """
+    query = f"SELECT * FROM `{table}` "
+    kind, column = INCREMENTAL_TABLES.get(table, (None, None))
+    if kind == 'append' and estimate > SPLIT_ROWS and workers > 1:
+        if mode == 'append':
+            low = since[table]
+        else:
+            with conn.cursor() as cursor:
+                cursor.execute(f"SELECT COALESCE(MIN(`{column}`), 1) - 1 FROM `{table}`")
+                low = int(cursor.fetchone()[0])
+        count = min(workers, -(-estimate // SPLIT_ROWS))
+        ranges = _split_ranges(low, marks[table], count)
+        if len(ranges) > 1:
+            result = []
+            for i, (a, b) in enumerate(ranges):
+                if i == 0 and mode != 'append':
+                    part_where, part_params = f"WHERE `{column}` <= %s", (b,)
+                else:
+                    part_where, part_params = f"WHERE `{column}` > %s AND `{column}` <= %s", (a, b)
+                result.append((f"{table}.{i:03d}.ndjson.gz", query + part_where, part_params, b - a))
+            return result
+    return [(f"{table}.ndjson.gz", query + where, params, estimate)]
+
+
+def _open_snapshots(conn, connect, count, capture):
+    """开启 count 个同一时刻的一致性快照连接，返回 (连接列表, capture() 的结果, 是否加了全局读锁)
+
+    有 RELOAD 权限时先用 FLUSH TABLES WITH READ LOCK 短暂阻止写入，在锁内记录水位线并开启全部快照，
+    各连接看到的数据与水位线完全一致。这把锁会阻塞整个 MySQL 实例上所有库的写入（包括界面的保存），
+    直到快照全部开启（通常几十毫秒）；有长事务或长查询未结束时最多等待 SNAPSHOT_LOCK_WAIT 秒，
+    超时则放弃加锁。没有 RELOAD 权限或等待超时时，先记录水位线再依次开启快照（相隔仅几毫秒），
+    append 表由水位线截止不受影响，upsert 表在这几毫秒内的修改会被下一次增量备份重复取到，结果不变。
+    conn 多为连接池中的连接，临时修改的 lock_wait_timeout 在返回前恢复原值
+    """
+    locked = False
+    previous_wait = None
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute("SELECT @@SESSION.lock_wait_timeout")
+            previous_wait = cursor.fetchone()[0]
+            cursor.execute("SET SESSION lock_wait_timeout = %s", (SNAPSHOT_LOCK_WAIT,))
+            cursor.execute("FLUSH TABLES WITH READ LOCK")
+            locked = True
+        except Exception as e:
+            print(f"无法加全局读锁，各连接的快照可能相差几毫秒: {e}")
+    conns = []
+    try:
+        result = capture()
+        for _ in range(count):
+            worker = connect()
+            conns.append(worker)
+            with worker.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+    except Exception:
+        for worker in conns:
+            worker.close()
+        raise
+    finally:
+        with conn.cursor() as cursor:
+            if locked:
+                cursor.execute("UNLOCK TABLES")
+            if previous_wait is not None:
+                cursor.execute("SET SESSION lock_wait_timeout = %s", (previous_wait,))
+    return conns, result, locked
+
+
+def _dump_worker(conn, tasks, staging, chunk_rows, counts, stop):
+    """工作线程：在自己的快照连接上依次导出队列中的片段，返回 {成员名: (列名, 行数)}"""
+    results = {}
+    completed = False
+    try:
+        while not stop.is_set():
+            try:
+                member, query, params, _ = tasks.get_nowait()
+            except queue.Empty:
+                break
+
+            def on_chunk(count, member=member):
+                counts[member] = count
+                if stop.is_set():
+                    raise RuntimeError("备份已中止")
+
+            results[member] = _dump_query(conn, os.path.join(staging, member), query, params, chunk_rows, on_chunk)
+        conn.commit()
+        completed = True
+    finally:
+        if not completed:
+            # 未读完的结果集会让连接处于不可用状态，直接断开而不是归还连接池
+            try:
+                getattr(conn, 'raw', conn).close()
+            except Exception:
+                pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+    return results
+
+
+def create_backup(backup_file, backup_type='full', tables=None, chunk_rows=CHUNK_ROWS,
+                  progress=None, connect=get_db_conn, workers=PARALLEL_WORKERS):
+    """流式备份到 backup_file（zip），返回 manifest
+
+    增量/差异备份找不到可用的上一级备份时自动改为全量备份（manifest['type'] 为实际类型）。
+    各片段在 workers 个连接上并行导出，每个片段先写入备份目录下的临时目录，全部完成后再打包。
+    progress(percent, text) 定时在调用线程中调用；它抛出的异常（例如取消）会中止备份并删除未完成的文件
+    """
+    tables = tables or BACKUP_TABLES
+    progress = progress or (lambda percent, text="": None)
+    start = time.perf_counter()
+    partial = backup_file + ".part"
+    manifest = {
+        'format': 'ndjson',
+        'version': FORMAT_VERSION,
+        'name': os.path.splitext(os.path.basename(backup_file))[0],
+        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'type': 'full',
+        'tables': {},
+    }
+
+    conn = connect()
+    staging = tempfile.mkdtemp(prefix=".backup_", dir=os.path.dirname(os.path.abspath(backup_file)))
+    completed = False
+    try:
+        parent = None
+        if backup_type != 'full' and ensure_backup_schema(conn):
+            parent = last_backup(conn, backup_type)
+        if parent is not None:
+            manifest.update(type=backup_type, base=os.path.basename(parent['path']),
+                            base_path=parent['path'], since=parent['watermarks'])
+        since = manifest.get('since', {})
+
+        columns = _table_columns(conn)
+        tables = [table for table in tables if table in columns]
+        estimates = _estimate_rows(conn, tables)
+        workers = max(1, workers)
+        conns, marks, manifest['consistent'] = _open_snapshots(
+            conn, connect, workers, lambda: _capture_watermarks(conn, tables, columns)
+        )
+        manifest['watermarks'] = marks
+
+        # 片段按估计行数从大到小排队，最大的表最先开始
+        parts = {}
+        try:
+            for table in tables:
+                mode, where, params = _table_plan(table, manifest['type'], since, marks)
+                info = {'mode': mode}
+                parts[table] = _plan_parts(conn, table, mode, where, params, since, marks, estimates[table], workers)
+                if mode == 'upsert':
+                    key, deletions, deleted_at = UPSERT_KEYS[table]
+                    overlap = int(SYNC_OVERLAP.total_seconds())
+                    info.update(key=key, deleted_parts=[f"{table}.deleted.ndjson.gz"])
+                    parts[table].append((
+                        f"{table}.deleted.ndjson.gz",
+                        f"SELECT `{key}` FROM `{deletions}` WHERE `{deleted_at}` > %s - INTERVAL {overlap} SECOND",
+                        (since[table],), 1
+                    ))
+                manifest['tables'][table] = info
+        except Exception:
+            for worker in conns:
+                worker.close()
+            raise
+        ordered = sorted(itertools.chain(*parts.values()), key=lambda task: -task[3])
+        tasks = queue.Queue()
+        for task in ordered:
+            tasks.put(task)
+
+        estimates = {task[0]: max(task[3], 1) for task in ordered}
+        total = sum(estimates.values())
+        counts = {}
+        stop = threading.Event()
+        results = {}
+        with ThreadPoolExecutor(len(conns), thread_name_prefix="backup-dump") as executor:
+            futures = [executor.submit(_dump_worker, c, tasks, staging, chunk_rows, counts, stop) for c in conns]
+            try:
+                pending = futures
+                while pending:
+                    finished, pending = wait(pending, timeout=0.2, return_when=FIRST_EXCEPTION)
+                    for future in finished:
+                        results.update(future.result())
+                    done = sum(min(count, estimates[member]) for member, count in list(counts.items()))
+                    rows = sum(counts.values())
+                    progress(min(99, int(done * 100 / total)), f"已导出 {rows} 行（{len(conns)} 个连接并行）")
+            except BaseException:
+                stop.set()
+                raise
+
+        for table, table_parts in parts.items():
+            info = manifest['tables'][table]
+            deleted_parts = info.get('deleted_parts', [])
+            data_parts = [task[0] for task in table_parts if task[0] not in deleted_parts]
+            info.update(columns=results[data_parts[0]][0], parts=data_parts,
+                        rows=sum(results[member][1] for member in data_parts))
+            if deleted_parts:
+                info['deleted'] = sum(results[member][1] for member in deleted_parts)
+
+        progress(99, "写入备份文件")
+        # 各片段已是 gzip 压缩，存入 zip 时不再压缩
+        with zipfile.ZipFile(partial, 'w', compression=zipfile.ZIP_STORED) as zipf:
+            for member in results:
+                zipf.write(os.path.join(staging, member), member)
+            zipf.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=2),
+                          compress_type=zipfile.ZIP_DEFLATED)
+        os.replace(partial, backup_file)
+        completed = True
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+        if not completed and os.path.exists(partial):
+            os.remove(partial)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    manifest['size'] = os.path.getsize(backup_file)
+    manifest['seconds'] = time.perf_counter() - start
+    progress(100, "备份完成")
+    return manifest
+
+
+class BackupLocked(Exception):
+    """另一个备份或恢复任务正在运行"""
+
+
+@contextmanager
+def backup_lock(connect=get_db_conn):
+    """备份/恢复互斥，拿不到锁时立即抛出 BackupLocked 而不是等待"""
+    conn = connect()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT GET_LOCK(%s, 0)", (LOCK_NAME,))
+            if cursor.fetchone()[0] != 1:
+                raise BackupLocked("另一个备份或恢复任务正在运行")
+        try:
+            yield
+        finally:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+                cursor.fetchone()
+    finally:
+        conn.close()
+
+
+def backup_and_record(backup_file, backup_type='full', created_by=None, source='manual',
+                      progress=None, connect=get_db_conn):
+    """备份并写入 backup_logs（调用方已持有 backup_lock）"""
+    manifest = create_backup(backup_file, backup_type, progress=progress, connect=connect)
+    conn = connect()
+    try:
+        record_backup(conn, manifest, backup_file, created_by, source)
+    finally:
+        conn.close()
+    return manifest
+
+
+def run_backup(backup_file, backup_type='full', created_by=None, source='manual', progress=None, connect=get_db_conn):
+    """加锁备份并记录，返回 manifest"""
+    with backup_lock(connect):
+        return backup_and_record(backup_file, backup_type, created_by, source, progress, connect)
+
+
+def read_manifest(zipf):
+    """备份的 manifest，旧版（每表一个 JSON）备份返回 None"""
+    if MANIFEST_NAME not in zipf.namelist():
+        return None
+    return json.loads(zipf.read(MANIFEST_NAME).decode('utf-8'))
+
+
+def _iter_member(zipf, name):
+    """逐块解析 NDJSON 成员（.gz 成员先解压）：多行拼成一个 JSON 数组一次解析，比逐行 json.loads 快数倍"""
+    with zipf.open(name) as raw, (gzip.GzipFile(fileobj=raw) if name.endswith('.gz') else raw) as member:
+        lines = []
+        for line in member:
+            line = line.strip()
+            if line:
+                lines.append(line)
+            if len(lines) >= PARSE_LINES:
+                yield from json.loads(b"[" + b",".join(lines) + b"]")
+                lines = []
+        if lines:
+            yield from json.loads(b"[" + b",".join(lines) + b"]")
+
+
+def _iter_parts(zipf, names):
+    """按顺序读取多个成员，拼成一个行迭代器"""
+    for name in names:
+        yield from _iter_member(zipf, name)
+
+
+def iter_table(zipf, table, manifest=None):
+    """读取备份中的一张表，返回 (列名, 行迭代器)；表不在备份中时返回 None
+
+    兼容旧版备份（第 3 版每表一个 <table>.ndjson；更早的 <table>.json 整表一次读入）
+    """
+    manifest = manifest if manifest is not None else read_manifest(zipf)
+    if manifest is not None:
+        info = manifest['tables'].get(table)
+        if info is None:
+            return None
+        return info['columns'], _iter_parts(zipf, info.get('parts', [f"{table}.ndjson"]))
+
+    name = f"{table}.json"
+    if name not in zipf.namelist():
+        return None
+    table_data = json.loads(zipf.read(name).decode())
+    return table_data['columns'], iter(table_data['data'])
+
+
+def backup_chain(backup_file):
+    """恢复 backup_file 需要依次应用的备份文件，从全量备份开始"""
+    chain = []
+    path = backup_file
+    while True:
+        with zipfile.ZipFile(path, 'r') as zipf:
+            manifest = read_manifest(zipf)
+        chain.append(path)
+        if manifest is None or manifest.get('type', 'full') == 'full':
+            break
+        # 上一级备份优先在同一目录中查找（整体搬移备份目录后仍可恢复），其次用记录的原路径
+        base = os.path.join(os.path.dirname(path), manifest['base'])
+        if not os.path.exists(base):
+            base = manifest.get('base_path') or base
+        if not os.path.exists(base):
+            raise FileNotFoundError(f"缺少上一级备份文件: {manifest['base']}")
+        if base in chain:
+            raise ValueError(f"备份链存在循环: {manifest['base']}")
+        path = base
+    return chain[::-1]
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _delete_keys(cursor, table, key, keys):
+    cursor.execute(f"DELETE FROM `{table}` WHERE `{key}` IN ({', '.join(['%s'] * len(keys))})", keys)
+
+
+def restore_backup(backup_file, tables=None, batch_rows=RESTORE_BATCH_ROWS, progress=None, connect=get_db_conn):
+    """从备份恢复；增量/差异备份先恢复所在备份链上的全量备份，再依次应用之后的备份
+
+    整条备份链在一个事务中完成，出错或取消时整体回滚。逐块读取备份，每批 batch_rows 行用一条多行
+    INSERT 写入；恢复期间关闭外键检查，各表可按任意顺序清空和写入。
+    恢复了 wastes 表时在提交前写入恢复标记（见 waste_sync.RESTORE_MARKER），增量同步的客户端据此全量重新加载。
+    返回 {'tables': {表: 行数}, 'chain': [文件], 'rows', 'seconds', 'rows_per_second'}
+    """
+    tables = tables or BACKUP_TABLES
+    progress = progress or (lambda percent, text="": None)
+    start = time.perf_counter()
+    chain = backup_chain(backup_file)
+    result = {'tables': {}, 'chain': chain}
+
+    with ExitStack() as stack:
+        # 每一步: (备份文件名, 表, 方式, 列名, 行迭代器, 删除的主键迭代器, 主键列)
+        steps = []
+        total = 0
+        for path in chain:
+            zipf = stack.enter_context(zipfile.ZipFile(path, 'r'))
+            manifest = read_manifest(zipf)
+            for table in tables:
+                table_data = iter_table(zipf, table, manifest)
+                if table_data is None:
+                    continue
+                info = manifest['tables'][table] if manifest is not None else {}
+                mode = info.get('mode', 'full')
+                deleted = iter(())
+                if mode == 'upsert':
+                    deleted = _iter_parts(zipf, info.get('deleted_parts', [f"{table}.deleted.ndjson"]))
+                steps.append((os.path.basename(path), table, mode, *table_data, deleted, info.get('key')))
+                total += info.get('rows', 0) + info.get('deleted', 0)
+        total = max(total, 1)
+
+        conn = connect()
+        completed = False
+        try:
+            conn.begin()
+            with conn.cursor() as cursor:
+                cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+                done = 0
+                for name, table, mode, columns, rows, deleted, key in steps:
+                    progress(int(done * 100 / total), f"{name}: 恢复 {table}")
+                    if mode == 'full':
+                        cursor.execute(f"DELETE FROM `{table}`")
+                    for batch in _batches(deleted, batch_rows):
+                        _delete_keys(cursor, table, key, [row[0] for row in batch])
+                        done += len(batch)
+                    column_list = ", ".join(f"`{c}`" for c in columns)
+                    placeholders = ", ".join(["%s"] * len(columns))
+                    query = f"INSERT INTO `{table}` ({column_list}) VALUES ({placeholders})"
+                    key_index = columns.index(key) if mode == 'upsert' else None
+                    count = 0
+                    for batch in _batches(rows, batch_rows):
+                        if key_index is not None:
+                            # 修改过的行先删除旧版本再插入
+                            _delete_keys(cursor, table, key, [row[key_index] for row in batch])
+                        # pymysql 把 executemany 改写为多行 INSERT，并按 max_allowed_packet 自动拆分
+                        cursor.executemany(query, batch)
+                        count += len(batch)
+                        done += len(batch)
+                        progress(min(99, int(done * 100 / total)), f"{name}: 恢复 {table} {count} 行")
+                    result['tables'][table] = result['tables'].get(table, 0) + count
+                if 'wastes' in result['tables']:
+                    try:
+                        record_restore(cursor)
+                    except Exception as e:
+                        # 没有 waste_deletions 表时增量同步未启用，客户端本来就全量加载
+                        print(f"未写入恢复标记: {e}")
+                cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+            conn.commit()
+            completed = True
+        finally:
+            if not completed:
+                # 直接断开：服务器回滚未提交的事务，关闭了外键检查的会话也不会回到连接池
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+                try:
+                    getattr(conn, 'raw', conn).close()
+                except Exception:
+                    pass
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    seconds = time.perf_counter() - start
+    rows = sum(result['tables'].values())
+    result.update(rows=rows, seconds=seconds, rows_per_second=rows / seconds if seconds > 0 else 0.0)
+    progress(100, "恢复完成")
+    return result
+
+
+def run_restore(backup_file, progress=None, connect=get_db_conn):
+    """加锁恢复，避免与正在运行的备份同时进行"""
+    with backup_lock(connect):
+        return restore_backup(backup_file, progress=progress, connect=connect)
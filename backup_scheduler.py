@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+自动备份
+按设置的间隔在后台创建备份并清理过期的自动备份；
+程序内由 QTimer 定时调用 run_if_due，也可以不启动界面，直接作为命令行/常驻服务运行：
+
+    python backup_scheduler.py --once          # 到期则备份一次后退出（适合 cron/计划任务）
+    python backup_scheduler.py                 # 常驻运行，定时检查
+
+多个程序/服务同时运行时由 backup.backup_lock 保证同一时刻只有一个备份
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+import backup
+from db import get_db_conn
+
+SETTINGS_PATH = os.path.join(os.path.expanduser("~"), ".recycle_mind", "auto_backup.json")
+
+DEFAULT_SETTINGS = {
+    "enabled": False,
+    "interval_days": 7,
+    "directory": os.path.join(os.path.expanduser("~"), ".recycle_mind", "backups"),
+    "backup_type": "incremental",   # 平时做的备份类型
+    "full_every_days": 7,           # 距上次全量备份超过此天数时改做全量备份，缩短恢复链
+    "keep_days": 30,                # 自动备份保留天数
+}
+
+# 常驻模式下检查是否到期的间隔（秒）
+CHECK_INTERVAL = 600
+
+
+def load_settings(path=SETTINGS_PATH):
+    settings = dict(DEFAULT_SETTINGS)
+    try:
+        with open(path, encoding='utf-8') as f:
+            settings.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"读取自动备份设置失败，使用默认设置: {e}")
+    return settings
+
+
+def save_settings(settings, path=SETTINGS_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(settings, f, ensure_ascii=False, indent=2)
+
+
+def _seconds_since(conn, where):
+    """最近一次满足条件的成功备份距现在的秒数（按服务器时间），没有则返回 None"""
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT TIMESTAMPDIFF(SECOND, MAX(created_at), NOW()) FROM backup_logs "
+                       f"WHERE status = 'success' AND {where}")
+        row = cursor.fetchone()
+    return None if row is None else row[0]
+
+
+def is_due(conn, settings):
+    """距上次自动备份是否已超过设置的间隔"""
+    elapsed = _seconds_since(conn, "source = 'auto'")
+    return elapsed is None or elapsed >= settings['interval_days'] * 86400
+
+
+def choose_type(conn, settings):
+    """平时按设置的类型备份，距上次全量备份太久（或从未做过）时做全量备份"""
+    if settings['backup_type'] == 'full':
+        return 'full'
+    elapsed = _seconds_since(conn, "backup_type = 'full' AND watermarks IS NOT NULL")
+    if elapsed is None or elapsed >= settings['full_every_days'] * 86400:
+        return 'full'
+    return settings['backup_type']
+
+
+def apply_retention(conn, keep_days):
+    """删除超过保留天数的自动备份文件并把记录标为 expired，返回删除的备份名称
+
+    最近一次自动备份、手动备份以及仍被保留的备份所依赖的上一级备份都不删除，保证剩下的备份都能恢复
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT id, backup_name, backup_path, parent_path, source,
+                   created_at < NOW() - INTERVAL %s DAY
+            FROM backup_logs WHERE status = 'success' ORDER BY id DESC
+        """, (keep_days,))
+        rows = cursor.fetchall()
+
+    latest_auto = next((row[0] for row in rows if row[4] == 'auto'), None)
+    keep = [row for row in rows if row[4] != 'auto' or not row[5] or row[0] == latest_auto]
+    parents = {row[2]: row[3] for row in rows}
+    needed = set()
+    for row in keep:
+        path = row[2]
+        while path and path not in needed:
+            needed.add(path)
+            path = parents.get(path)
+
+    expired = [row for row in rows if row[2] not in needed]
+    for backup_id, name, path, *_ in expired:
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            print(f"删除过期备份失败 {path}: {e}")
+            continue
+        with conn.cursor() as cursor:
+            cursor.execute("UPDATE backup_logs SET status = 'expired' WHERE id = %s", (backup_id,))
+        conn.commit()
+        print(f"已删除过期备份: {name}")
+    return [row[1] for row in expired]
+
+
+def run_if_due(settings, progress=None, connect=get_db_conn, force=False, created_by=None):
+    """到期则创建一次自动备份并清理过期备份，返回结果摘要；未到期返回 None
+
+    另一个备份正在运行时抛出 backup.BackupLocked
+    """
+    with backup.backup_lock(connect):
+        # 拿到锁后再判断一次，避免两个进程先后通过检查而重复备份
+        conn = connect()
+        try:
+            backup.ensure_backup_schema(conn)
+            if not force and not is_due(conn, settings):
+                return None
+            backup_type = choose_type(conn, settings)
+        finally:
+            conn.close()
+
+        os.makedirs(settings['directory'], exist_ok=True)
+        name = f"auto_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        backup_file = os.path.join(settings['directory'], f"{name}.zip")
+        manifest = backup.backup_and_record(backup_file, backup_type, created_by, 'auto', progress, connect)
+
+        conn = connect()
+        try:
+            expired = apply_retention(conn, settings['keep_days'])
+        finally:
+            conn.close()
+    return {
+        'name': manifest['name'],
+        'file': backup_file,
+        'type': manifest['type'],
+        'size': manifest['size'],
+        'seconds': manifest['seconds'],
+        'rows': sum(info['rows'] for info in manifest['tables'].values()),
+        'expired': expired,
+    }
+
+
+def _print_progress(percent, text=""):
+    print(f"[{percent:3d}%] {text}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RecycleMind 自动备份")
+    parser.add_argument("--once", action="store_true", help="检查一次，到期则备份后退出")
+    parser.add_argument("--force", action="store_true", help="不论是否到期都立即备份一次后退出")
+    parser.add_argument("--dir", help="备份目录")
+    parser.add_argument("--interval-days", type=int, help="备份间隔（天）")
+    parser.add_argument("--type", choices=list(backup.BACKUP_TYPES), help="备份类型")
+    parser.add_argument("--keep-days", type=int, help="自动备份保留天数")
+    parser.add_argument("--check-interval", type=int, default=CHECK_INTERVAL, help="常驻模式检查间隔（秒）")
+    args = parser.parse_args(argv)
+
+    settings = load_settings()
+    if args.dir:
+        settings['directory'] = args.dir
+    if args.interval_days:
+        settings['interval_days'] = args.interval_days
+    if args.type:
+        settings['backup_type'] = args.type
+    if args.keep_days:
+        settings['keep_days'] = args.keep_days
+
+    while True:
+        try:
+            result = run_if_due(settings, _print_progress, force=args.force)
+            if result is None:
+                print(f"{datetime.now():%Y-%m-%d %H:%M:%S} 未到备份时间")
+            else:
+                print(f"{backup.BACKUP_TYPES[result['type']]} {result['name']} 完成: {result['rows']} 行, "
+                      f"{result['size'] / 1024 / 1024:.1f} MB, 用时 {result['seconds']:.1f} 秒")
+                if result['expired']:
+                    print(f"清理过期备份 {len(result['expired'])} 个")
+        except backup.BackupLocked as e:
+            print(f"跳过本次检查: {e}")
+        except Exception as e:
+            print(f"自动备份失败: {e}")
+            if args.once or args.force:
+                return 1
+        if args.once or args.force:
+            return 0
+        time.sleep(args.check_interval)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
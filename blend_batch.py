@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+命令行批量计算合成方案
+不启动界面（不导入 PyQt6），库存和产品标准只加载一次，各组（产品标准, 区域, 产量）在进程池中并行求解，
+结果写入 CSV/JSON，适合定时生成“今天的库存能做什么”报表：
+
+    python blend_batch.py --weights 5000 10000 --csv report.csv
+    python blend_batch.py --standards ADC12 A380 --areas A区 B区 --weights 5000 --json report.json
+    python blend_batch.py --jobs jobs.json --csv report.csv
+
+--jobs 为 JSON 列表，每项如 {"standard": "ADC12", "area": "A区", "target_weight": 5000, "max_lots": 5}，
+可用的参数见 JOB_OPTIONS
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+
+from blend_planner import BlendPlanner, OPTIMIZE_OPTIONS, check_options
+from db import get_db_conn
+from inventory import ALL_AREAS
+
+# 任务文件中每项可以设置的参数；default_uncertainty 对整批库存生效，由 --default-uncertainty 统一设置
+JOB_OPTIONS = tuple(key for key in OPTIMIZE_OPTIONS if key != 'default_uncertainty')
+
+# CSV 各列：(表头, 取值函数)
+CSV_COLUMNS = [
+    ("产品标准", lambda job, row: row['name']),
+    ("区域", lambda job, row: job['area']),
+    ("产量(kg)", lambda job, row: job['options'].get('target_weight', '')),
+    ("装料下限(kg)", lambda job, row: job['options'].get('min_weight', '')),
+    ("装料上限(kg)", lambda job, row: job['options'].get('max_weight', '')),
+    ("可行性", lambda job, row: '可行' if row['feasible'] else '不可行'),
+    ("状态", lambda job, row: row['status']),
+    ("总成本(元)", lambda job, row: _number(row['total_cost'], 2)),
+    ("总重量(kg)", lambda job, row: _number(row['total_weight'], 2)),
+    ("平均单价(元/kg)", lambda job, row: _number(row['avg_price'], 4)),
+    ("使用批数", lambda job, row: len(row['result'].get('waste_mix') or {}) if row['feasible'] else ''),
+    ("达标概率", lambda job, row: _number(row['probability'], 4)),
+    ("用时(s)", lambda job, row: f"{row['solve_time']:.3f}"),
+    ("缓存", lambda job, row: '是' if row['result'].get('cached') else ''),
+    ("说明", lambda job, row: row['message'].split("\n")[0]),
+]
+
+
+def _number(value, digits):
+    return '' if value is None else round(value, digits)
+
+
+def parse_job(item):
+    """检查任务文件中的一项，返回 {'standard', 'area', 'options'}，无效时抛出 ValueError"""
+    if not isinstance(item, dict) or not isinstance(item.get('standard'), str):
+        raise ValueError("缺少 standard（产品标准名称）")
+    unknown = set(item) - {'standard', 'area'} - set(JOB_OPTIONS)
+    if unknown:
+        raise ValueError(f"不支持的参数: {', '.join(sorted(unknown))}")
+    area = item.get('area', ALL_AREAS)
+    if not isinstance(area, str):
+        raise ValueError("area 应为字符串")
+    options = {key: item[key] for key in JOB_OPTIONS if item.get(key) is not None}
+    check_options(options)
+    return {'standard': item['standard'], 'area': area, 'options': options}
+
+
+def load_jobs(path):
+    """读取任务文件，返回 [{'standard', 'area', 'options'}, ...]，有无效的项时逐项列出后抛出 ValueError"""
+    with open(path, encoding='utf-8') as f:
+        items = json.load(f)
+    if not isinstance(items, list):
+        raise ValueError("任务文件应为 JSON 列表")
+    jobs, errors = [], []
+    for n, item in enumerate(items, 1):
+        try:
+            jobs.append(parse_job(item))
+        except ValueError as e:
+            errors.append(f"第 {n} 项: {e}")
+    if errors:
+        raise ValueError("任务文件中有无效的项:\n" + "\n".join(errors))
+    return jobs
+
+
+def expand_jobs(standards, areas, weights, options):
+    """产品标准、区域和产量的全部组合"""
+    return [{'standard': name, 'area': area, 'options': dict(options, target_weight=weight)}
+            for name in standards for area in areas for weight in weights]
+
+
+def run_batch(planner, jobs, max_workers=None, progress=None, default_uncertainty=0.0, use_cache=True):
+    """求解全部任务，返回与 jobs 顺序相同的对比表（见 optimizer.comparison_row）"""
+    missing = sorted({job['standard'] for job in jobs if planner.find_standard(job['standard']) is None})
+    if missing:
+        raise ValueError(f"没有这些产品标准: {', '.join(missing)}")
+    return planner.optimize_batch(
+        [(planner.find_standard(job['standard']), job['area'], job['options']) for job in jobs],
+        max_workers=max_workers, progress=progress, default_uncertainty=default_uncertainty,
+        use_cache=use_cache)
+
+
+def write_csv(path, jobs, rows):
+    # 带 BOM，Excel 直接打开时中文不乱码
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow([title for title, _ in CSV_COLUMNS])
+        for job, row in zip(jobs, rows):
+            writer.writerow([value(job, row) for _, value in CSV_COLUMNS])
+
+
+def write_json(path, jobs, rows, summary):
+    records = [dict(job, **{key: row[key] for key in ('feasible', 'status', 'total_cost', 'total_weight',
+                                                        'avg_price', 'probability', 'message', 'solve_time')},
+                    result=row['result'])
+               for job, row in zip(jobs, rows)]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'summary': summary, 'results': records}, f, ensure_ascii=False, indent=2)
+
+
+def _print_progress(percent, text=""):
+    print(f"[{percent:3d}%] {text}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RecycleMind 批量计算合成方案")
+    parser.add_argument("--jobs", help="任务文件（JSON 列表），指定后忽略 --standards/--areas/--weights")
+    parser.add_argument("--standards", nargs="+", help="产品标准名称，默认全部")
+    parser.add_argument("--areas", nargs="+", default=[ALL_AREAS], help=f"区域，默认{ALL_AREAS}")
+    parser.add_argument("--weights", nargs="+", type=float, help="产量(kg)，不用 --jobs 时必须指定")
+    parser.add_argument("--min-take", type=float, help="每批废料的最小取用量(kg)")
+    parser.add_argument("--max-lots", type=int, help="最多使用的废料批数")
+    parser.add_argument("--time-limit", type=float, help="混合整数规划每次求解的时间上限（秒）")
+    parser.add_argument("--default-uncertainty", type=float, default=0.0,
+                        help="未记录成分偏差的元素按含量的这一比例计（如 0.05）")
+    parser.add_argument("--workers", type=int, help="进程数，默认为 CPU 核数，1 表示串行计算")
+    parser.add_argument("--no-cache", action="store_true", help="不使用缓存结果，全部重新求解")
+    parser.add_argument("--csv", help="CSV 结果文件")
+    parser.add_argument("--json", help="JSON 结果文件（含完整配料方案）")
+    args = parser.parse_args(argv)
+
+    # 连接数据库之前先检查参数
+    options = {key: value for key, value in (('min_take', args.min_take), ('max_lots', args.max_lots),
+                                             ('time_limit', args.time_limit)) if value is not None}
+    if not args.default_uncertainty >= 0:
+        parser.error("--default-uncertainty 不能小于 0")
+    if not args.jobs:
+        if not args.weights:
+            parser.error("请用 --weights 指定产量，或用 --jobs 指定任务文件")
+        try:
+            for weight in args.weights:
+                check_options(dict(options, target_weight=weight))
+        except ValueError as e:
+            parser.error(str(e))
+
+    started = time.perf_counter()
+    planner = BlendPlanner()
+    try:
+        conn = get_db_conn()
+        try:
+            planner.load_inventory(conn)
+            planner.load_standards(conn)
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"加载库存和产品标准失败: {e}")
+        return 1
+    load_time = time.perf_counter() - started
+    print(f"已加载库存 {len(planner.inventory)} 批，产品标准 {len(planner.product_standards)} 个，"
+          f"用时 {load_time:.2f} 秒")
+
+    try:
+        if args.jobs:
+            jobs = load_jobs(args.jobs)
+        else:
+            standards = args.standards or [s['name'] for s in planner.product_standards]
+            jobs = expand_jobs(standards, args.areas, args.weights, options)
+        solve_started = time.perf_counter()
+        rows = run_batch(planner, jobs, args.workers, _print_progress, args.default_uncertainty,
+                         not args.no_cache)
+    except Exception as e:
+        print(f"批量计算失败: {e}")
+        return 1
+    solve_time = time.perf_counter() - solve_started
+
+    summary = {
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'lots': len(planner.inventory),
+        'jobs': len(jobs),
+        'feasible': sum(1 for row in rows if row['feasible']),
+        'load_time': load_time,
+        'solve_time': solve_time,
+        'workers': args.workers or os.cpu_count(),
+    }
+    for job, row in zip(jobs, rows):
+        cost = f"{row['total_cost']:.2f} 元" if row['feasible'] else row['message'].split("\n")[0]
+        print(f"{row['name']} / {job['area']} / {job['options'].get('target_weight', '-')}: "
+              f"{cost}（{row['solve_time']:.3f} s）")
+    print(f"共 {len(jobs)} 组，可行 {summary['feasible']} 组，求解用时 {solve_time:.2f} 秒")
+
+    try:
+        if args.csv:
+            write_csv(args.csv, jobs, rows)
+            print(f"已写入 {args.csv}")
+        if args.json:
+            write_json(args.json, jobs, rows, summary)
+            print(f"已写入 {args.json}")
+    except OSError as e:
+        print(f"写入结果失败: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成方案计算（不依赖 PyQt6）
+持有内存中的废料库存和产品标准，按区域筛选后求解，结果缓存和热启动与界面共用同一套逻辑；
+废料管理界面和无界面的优化服务（optimization_server.py）都通过它计算
+"""
+
+import json
+
+from inventory import Inventory, ALL_AREAS
+from optimizer import (ROBUST_MODES, PARETO_POINTS, MILP_TIME_LIMIT, WarmStart, solve_blend, solve_standards, solve_jobs,
+                       plan_orders, comparison_row, uncertainty_matrix, pareto_sweep)
+from solver_cache import get_solver_cache, inventory_fingerprint, solve_key
+import waste_sync
+
+# optimize_mix 可以传入的产量和求解参数，供优化服务和命令行批量计算检查输入
+OPTIMIZE_OPTIONS = ('target_weight', 'min_weight', 'max_weight', 'default_uncertainty', 'time_limit',
+                    'min_take', 'unit_weight', 'max_lots', 'mip_gap', 'robust', 'confidence', 'safety_margin')
+
+# 必须大于 0 / 不能小于 0 的数值参数
+POSITIVE_OPTIONS = ('target_weight', 'time_limit', 'min_take', 'unit_weight', 'max_lots')
+NON_NEGATIVE_OPTIONS = ('min_weight', 'max_weight', 'default_uncertainty', 'mip_gap', 'safety_margin')
+
+
+def check_options(options):
+    """检查 optimize_mix 的参数取值，无效时抛出 ValueError"""
+    for key, value in options.items():
+        if key == 'robust':
+            if not isinstance(value, str) or value not in ROBUST_MODES:
+                raise ValueError(f"robust 应为 {' / '.join(ROBUST_MODES)} 之一: {value!r}")
+            continue
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or value != value:
+            raise ValueError(f"参数 {key} 的值无效: {value!r}")
+        if key in POSITIVE_OPTIONS and not value > 0:
+            raise ValueError(f"参数 {key} 应大于 0: {value!r}")
+        if key in NON_NEGATIVE_OPTIONS and value < 0:
+            raise ValueError(f"参数 {key} 不能小于 0: {value!r}")
+    if 'max_lots' in options and options['max_lots'] != int(options['max_lots']):
+        raise ValueError(f"参数 max_lots 应为整数: {options['max_lots']!r}")
+    if 'confidence' in options and not 0 < options['confidence'] < 1:
+        raise ValueError(f"参数 confidence 应在 0 和 1 之间: {options['confidence']!r}")
+    if options.get('min_weight', 0) > options.get('max_weight', float('inf')):
+        raise ValueError("min_weight 不能大于 max_weight")
+    # 不指定产量也没有装料下限时，最低成本的方案就是什么都不取
+    if 'target_weight' not in options and not options.get('min_weight', 0) > 0:
+        raise ValueError("需要 target_weight 或大于 0 的 min_weight")
+
+
+class JobCancelled(Exception):
+    """任务已被取消"""
+
+
+class BlendPlanner:
+    """废料库存、产品标准和求解状态
+
+    数据库读写由调用方传入连接，连接的获取和归还、错误提示都由调用方处理
+    """
+
+    def __init__(self):
+        self.inventory = Inventory.from_rows([])
+        # 增量同步水位线（服务器时间），None 表示只能全量加载
+        self.watermark = None
+        self.sync_enabled = None
+        self.uncertainty_enabled = None
+        self.product_standards = []
+        # 各区域库存的指纹 {区域: (库存, 指纹)}，库存对象替换后自动失效
+        self.inventory_keys = {}
+        # 各产品标准和区域上一次的最优解 {(标准名称, 区域): WarmStart}，修改库存后重新计算时热启动
+        self.warm_starts = {}
+
+    def load_inventory(self, conn):
+        """全量加载废料库存，首次加载时创建增量同步和成分偏差需要的列"""
+        if self.sync_enabled is None:
+            self.sync_enabled = waste_sync.ensure_sync_schema(conn)
+            self.uncertainty_enabled = waste_sync.ensure_uncertainty_schema(conn)
+        rows, watermark = waste_sync.fetch_all(conn, self.uncertainty_enabled, snapshot=self.sync_enabled)
+        # 数值列只在加载时解析一次，表格和优化计算共用
+        self.inventory = Inventory.from_rows(rows)
+        self.watermark = watermark if self.sync_enabled else None
+        return self.inventory
+
+    def sync_inventory(self, conn):
+        """只取上次同步之后变化的废料，返回 apply_changes 的结果；
+        无法增量同步或期间恢复过备份时全量加载并返回 None（self.inventory 换为新的库存对象）
+        """
+        if self.watermark is None:
+            self.load_inventory(conn)
+            return None
+        rows, deleted, watermark = waste_sync.fetch_changes(conn, self.watermark, self.uncertainty_enabled)
+        if waste_sync.RESTORE_MARKER in deleted:
+            self.load_inventory(conn)
+            return None
+        changes = self.apply_changes(rows, deleted)
+        self.watermark = watermark
+        return changes
+
+    def apply_changes(self, rows=(), deleted_names=()):
+        """把若干行的新增/修改/删除应用到库存，返回 (库存, 删除的行, 修改的行, 新增的行)，没有变化时返回 None"""
+        if not len(rows) and not len(deleted_names):
+            return None
+        changes = self.inventory.with_changes(rows, deleted_names)
+        self.inventory = changes[0]
+        return changes
+
+    def load_standards(self, conn):
+        """读取全部产品标准"""
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT name, ranges FROM product_standards")
+            self.product_standards = [{'name': row[0], 'ranges': json.loads(row[1])} for row in cursor.fetchall()]
+        return self.product_standards
+
+    def find_standard(self, name):
+        """按名称查找产品标准，没有时返回 None"""
+        return next((s for s in self.product_standards if s['name'] == name), None)
+
+    def prepare_optimization_data(self, selected_area="全部区域"):
+        """按区域筛选库存，返回求解所需的数组，没有数据时返回 None"""
+        # 区域筛选为向量化掩码，并排除数值无法解析的废料
+        source = self.inventory
+        inventory = source.subset(source.area_mask(selected_area) & source.valid)
+        if not len(inventory):
+            return None
+        
+        return {
+            'source': source,
+            'element_matrix': inventory.element_matrix,
+            'weights': inventory.weights,
+            'prices': inventory.prices,
+            'names': inventory.names,
+            'areas': inventory.areas,
+            'uncertainty': inventory.uncertainty
+        }
+
+    def inventory_key(self, selected_area, data):
+        """区域库存的指纹，同一份库存只计算一次"""
+        inventory = data['source']
+        cached = self.inventory_keys.get(selected_area)
+        if cached is None or cached[0] is not inventory:
+            cached = (inventory, inventory_fingerprint(data['element_matrix'], data['weights'], data['prices'],
+                                                       data['names'], data['areas'], data['uncertainty']))
+            self.inventory_keys[selected_area] = cached
+        return cached[1]
+
+    def optimize_mix(self, standard, selected_area="全部区域",
+                     target_weight=None, min_weight=None, max_weight=None, progress=None,
+                     default_uncertainty=0.0, time_budget=None, **solve_options):
+        """优化混合方案，progress(percent, text) 为可选的进度回调
+
+        default_uncertainty: 未记录成分偏差的元素按含量的这一比例计
+        time_budget: 可选的求解时间上限（秒），与 time_limit 取较小者但不计入缓存键，
+        供优化服务按请求剩余的时间限制求解；上限作用于每次调用求解器，多轮求解在每轮之间还会通过 progress 检查，
+        最多超出一次求解器调用的时间
+        solve_options: 最小取用量、整件取用、稳健求解等参数，原样传给 solve_blend。
+        库存中没有逐批的件重和最小取用量，min_take / unit_weight 在这里是对全部废料相同的标量
+        """
+        try:
+            data = self.prepare_optimization_data(selected_area)
+            if data is None:
+                return {
+                    'feasible': False,
+                    'message': f'在区域 "{selected_area}" 中没有找到废料数据'
+                }
+            
+            # 库存、标准和产量设置都没变时直接使用上次的结果
+            cache = get_solver_cache()
+            key = solve_key(self.inventory_key(selected_area, data), standard['ranges'], selected_area,
+                            target_weight=target_weight, min_weight=min_weight, max_weight=max_weight,
+                            default_uncertainty=default_uncertainty, **solve_options)
+            result = cache.get(key)
+            if result is not None:
+                if progress:
+                    progress(100, "使用缓存结果")
+                return result
+            
+            warm_start = self.warm_starts.setdefault((standard['name'], selected_area), WarmStart())
+            integer = any(key in solve_options for key in ('min_take', 'unit_weight', 'max_lots'))
+            limited = dict(solve_options)
+            if time_budget is not None:
+                limit = solve_options.get('time_limit') or (MILP_TIME_LIMIT if integer else None)
+                limited['time_limit'] = time_budget if limit is None else min(limit, time_budget)
+            check = None
+            if progress:
+                if integer:
+                    stage = f"求解混合整数规划（{len(data['weights'])} 批废料）"
+                elif solve_options.get('robust') in ROBUST_MODES:
+                    stage = f"求解{ROBUST_MODES[solve_options['robust']]}配料（{len(data['weights'])} 批废料）"
+                else:
+                    stage = (f"求解线性规划（{len(data['weights'])} 批废料"
+                             f"{'，从上次的方案热启动' if warm_start.state else ''}）")
+                progress(20, stage)
+
+                # 多轮求解的每轮之间再报告一次进度，取消或超时时 progress 抛出的异常会中止求解
+                def check():
+                    progress(20, stage)
+            # 线性规划求解：约束矩阵由 element_matrix 一次性构建
+            result = solve_blend(data['element_matrix'], data['weights'], data['prices'],
+                                 standard['ranges'], data['names'], data['areas'],
+                                 target_weight=target_weight,
+                                 min_weight=min_weight,
+                                 max_weight=max_weight,
+                                 warm_start=warm_start,
+                                 uncertainty=uncertainty_matrix(data['uncertainty'], data['element_matrix'],
+                                                                default_uncertainty),
+                                 check=check, **limited)
+            cache.put(key, result)
+            if progress:
+                progress(100, "完成")
+            return result
+                
+        except JobCancelled:
+            raise
+        except Exception as e:
+            return {
+                'feasible': False,
+                'message': f'计算错误: {str(e)}'
+            }
+
+    def pareto_front(self, standard, selected_area="全部区域", axis='margin', points=PARETO_POINTS,
+                     progress=None, default_uncertainty=0.0, **solve_options):
+        """计算成本权衡曲线（见 pareto_sweep），其余参数同 optimize_mix"""
+        try:
+            data = self.prepare_optimization_data(selected_area)
+            if data is None:
+                return {
+                    'feasible': False,
+                    'message': f'在区域 "{selected_area}" 中没有找到废料数据'
+                }
+            
+            return pareto_sweep(data['element_matrix'], data['weights'], data['prices'],
+                                data['names'], data['areas'], standard['ranges'],
+                                axis=axis, points=points, progress=progress,
+                                uncertainty=uncertainty_matrix(data['uncertainty'], data['element_matrix'],
+                                                               default_uncertainty),
+                                **solve_options)
+        except JobCancelled:
+            raise
+        except Exception as e:
+            return {
+                'feasible': False,
+                'message': f'计算错误: {str(e)}'
+            }
+
+    def plan_production(self, orders, selected_area="全部区域", progress=None):
+        """多订单联合排产，orders 为 [(standard, weight_kg, priority), ...]"""
+        try:
+            data = self.prepare_optimization_data(selected_area)
+            if data is None:
+                return {
+                    'feasible': False,
+                    'message': f'在区域 "{selected_area}" 中没有找到废料数据'
+                }
+            
+            if progress:
+                progress(20, f"联合求解 {len(orders)} 个订单")
+            # 所有订单在同一个线性规划中共享库存
+            result = plan_orders(data['element_matrix'], data['weights'], data['prices'],
+                                 data['names'], data['areas'], orders)
+            if progress:
+                progress(100, "完成")
+            return result
+        except JobCancelled:
+            raise
+        except Exception as e:
+            return {
+                'feasible': False,
+                'message': f'计算错误: {str(e)}'
+            }
+
+    def optimize_standards(self, names=None, selected_area="全部区域", max_workers=None,
+                           progress=None, default_uncertainty=0.0, **charge_settings):
+        """对全部或指定名称的产品标准批量求解，返回对比表；区域内没有废料时返回 None"""
+        data = self.prepare_optimization_data(selected_area)
+        if data is None:
+            return None
+        
+        standards = self.product_standards
+        if names is not None:
+            names = set(names)
+            standards = [s for s in standards if s['name'] in names]
+        
+        # 有缓存结果的标准不再求解
+        cache = get_solver_cache()
+        inventory_key = self.inventory_key(selected_area, data)
+        # 与 optimize_mix 的缓存键一致：未设置的产量参数也按 None 计入
+        key_settings = dict(charge_settings)
+        key_settings.update({key: key_settings.pop(key, None)
+                             for key in ('target_weight', 'min_weight', 'max_weight')})
+        keys = [solve_key(inventory_key, s['ranges'], selected_area, default_uncertainty=default_uncertainty,
+                          **key_settings) for s in standards]
+        cached = [cache.get(key) for key in keys]
+        misses = [s['name'] for s, result in zip(standards, cached) if result is None]
+        
+        # 库存矩阵只解析一次，各标准在进程池中并行求解
+        solved = iter(solve_standards(data['element_matrix'], data['weights'], data['prices'],
+                                      data['names'], data['areas'], standards,
+                                      selected=misses, max_workers=max_workers, progress=progress,
+                                      uncertainty=uncertainty_matrix(data['uncertainty'], data['element_matrix'],
+                                                                     default_uncertainty),
+                                      **charge_settings))
+        rows = []
+        for standard, key, result in zip(standards, keys, cached):
+            if result is None:
+                row = next(solved)
+                cache.put(key, row['result'])
+            else:
+                row = comparison_row(standard['name'], result, 0.0)
+            rows.append(row)
+        cache.save()
+        return rows
+
+    def optimize_batch(self, jobs, max_workers=None, progress=None, default_uncertainty=0.0, use_cache=True):
+        """批量求解 [(standard, 区域, 产量和求解参数), ...]，返回按 jobs 顺序排列的对比表
+
+        库存只整理一次，未命中缓存的任务在进程池中并行求解；结果与 optimize_mix 共用缓存，
+        use_cache=False 时全部重新求解。缓存命中的行 solve_time 为 0
+        """
+        data = self.prepare_optimization_data(ALL_AREAS)
+        cache = get_solver_cache()
+        rows = [None] * len(jobs)
+        keys = [None] * len(jobs)
+        misses = []
+        area_keys = {}
+        for i, (standard, area, options) in enumerate(jobs):
+            if area not in area_keys:
+                area_data = self.prepare_optimization_data(area)
+                area_keys[area] = None if area_data is None else self.inventory_key(area, area_data)
+            if area_keys[area] is None:
+                rows[i] = comparison_row(standard['name'], {
+                    'feasible': False,
+                    'message': f'在区域 "{area}" 中没有找到废料数据'
+                }, 0.0)
+                continue
+            # 与 optimize_mix 的缓存键一致，两边的结果可以互相使用
+            options = dict(options)
+            settings = {key: options.pop(key, None) for key in ('target_weight', 'min_weight', 'max_weight')}
+            keys[i] = solve_key(area_keys[area], standard['ranges'], area,
+                                default_uncertainty=default_uncertainty, **settings, **options)
+            result = cache.get(keys[i]) if use_cache else None
+            if result is None:
+                misses.append(i)
+            else:
+                rows[i] = comparison_row(standard['name'], result, 0.0)
+
+        if misses:
+            solved = solve_jobs(data['element_matrix'], data['weights'], data['prices'],
+                                data['names'], data['areas'],
+                                [(jobs[i][0], None if jobs[i][1] == ALL_AREAS else jobs[i][1], jobs[i][2])
+                                 for i in misses],
+                                max_workers=max_workers, progress=progress,
+                                uncertainty=uncertainty_matrix(data['uncertainty'], data['element_matrix'],
+                                                               default_uncertainty))
+            for i, row in zip(misses, solved):
+                cache.put(keys[i], row['result'])
+                rows[i] = row
+            cache.save()
+        return rows
@@ -1,4 +1,11 @@
+import atexit
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
 import pymysql
+from pymysql.constants import SERVER_STATUS
 
 DB_CONFIG = {
     "host": "39.106.228.80",  # 确认此IP为你的ECS公网IP
@@ -10,9 +17,218 @@ DB_CONFIG = {
     "autocommit": True
 }
 
+POOL_CONFIG = {
+    "max_size": 8,                # 最大连接数（含正在使用的）
+    "max_idle": 300,              # 空闲超过此秒数的连接被关闭
+    "health_check_interval": 30,  # 空闲超过此秒数的连接在取出时先 ping 一次
+    "acquire_timeout": 10,        # 连接池满时等待的秒数
+}
+
+
+class PooledConnection:
+    """连接池中取出的连接，close() 把连接归还连接池而不是断开"""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise pymysql.err.InterfaceError("连接已归还连接池")
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def raw(self):
+        """底层 pymysql 连接"""
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+
+class ConnectionPool:
+    """线程安全的 MySQL 连接池"""
+
+    def __init__(self, config, max_size=8, max_idle=300, health_check_interval=30,
+                 acquire_timeout=10, connect=pymysql.connect):
+        self.config = config
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self._connect = connect
+        self._idle = deque()  # (连接, 归还时间)
+        self._size = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'created': 0,
+            'reused': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'health_checks': 0,
+            'closed_idle': 0,
+            'closed_broken': 0,
+        }
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _evict_idle(self, now):
+        """关闭空闲过久的连接（调用方持有锁）"""
+        expired = []
+        while self._idle and now - self._idle[0][1] > self.max_idle:
+            expired.append(self._idle.popleft()[0])
+        self._size -= len(expired)
+        self._stats['closed_idle'] += len(expired)
+        return expired
+
+    def acquire(self, timeout=None):
+        """取出一个连接，连接池已满时最多等待 timeout 秒"""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            expired = self._evict_idle(time.monotonic())
+            while True:
+                if self._idle:
+                    conn, released_at = self._idle.pop()  # 后进先出，优先复用最近用过的连接
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn, released_at = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"等待数据库连接超时（连接池上限 {self.max_size}）")
+                self._stats['waits'] += 1
+                self._cond.wait(remaining)
+            self._stats['checkouts'] += 1
+        for stale in expired:
+            self._close_quietly(stale)
+
+        if conn is not None and time.monotonic() - released_at > self.health_check_interval:
+            # 空闲较久的连接可能已被服务器断开，先检查一次
+            with self._cond:
+                self._stats['health_checks'] += 1
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                self._close_quietly(conn)
+                with self._cond:
+                    self._stats['closed_broken'] += 1
+                conn = None
+
+        if conn is None:
+            try:
+                conn = self._connect(**self.config)
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats['created'] += 1
+        else:
+            with self._cond:
+                self._stats['reused'] += 1
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        """归还连接，已断开或处于未提交事务的连接会被重置或丢弃"""
+        healthy = bool(getattr(conn, 'open', False))
+        if healthy:
+            try:
+                autocommit = self.config.get('autocommit', False)
+                in_transaction = conn.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS
+                if in_transaction or conn.get_autocommit() != autocommit:
+                    conn.rollback()
+                    conn.autocommit(autocommit)
+            except Exception:
+                healthy = False
+        with self._cond:
+            if healthy:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._size -= 1
+                self._stats['closed_broken'] += 1
+            self._cond.notify()
+        if not healthy:
+            self._close_quietly(conn)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """with pool.connection() as conn: ..."""
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def stats(self):
+        """连接池统计信息"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(
+                size=self._size,
+                idle=len(self._idle),
+                in_use=self._size - len(self._idle),
+                max_size=self.max_size
+            )
+        return stats
+
+    def close_all(self):
+        """关闭全部空闲连接"""
+        with self._cond:
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+        for conn in idle:
+            self._close_quietly(conn)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """全局连接池（首次使用时创建）"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_CONFIG, **POOL_CONFIG)
+                atexit.register(_pool.close_all)
+    return _pool
+
+
 def get_db_conn():
     try:
-        return pymysql.connect(**DB_CONFIG)
+        return get_pool().acquire()
     except Exception as e:
         print(f"数据库连接失败: {e}")
         raise
+
+
+@contextmanager
+def db_connection():
+    """从连接池取出连接，退出时自动归还"""
+    conn = get_db_conn()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def pool_stats():
+    """连接池统计信息，用于监控"""
+    return get_pool().stats()
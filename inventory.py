@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+废料库存的列式存储
+每次加载时构建一次，表格显示和优化计算共用，不依赖 PyQt6
+"""
+
+import json
+
+import numpy as np
+
+from optimizer import ELEMENT_FIELDS
+
+WASTE_COLUMNS = ["名称", "区域"] + ELEMENT_FIELDS + ["重量", "单价"]
+
+# 数值列在一行数据中的位置: 14 个元素 + 重量 + 单价
+NUMERIC_START = 2
+WEIGHT_COL = NUMERIC_START + len(ELEMENT_FIELDS)
+PRICE_COL = WEIGHT_COL + 1
+
+# 查询结果可选的最后一列: 各元素化验偏差 JSON，如 {"Si": 0.3, "Cu": 0.1}（百分点）
+UNCERTAINTY_COL = PRICE_COL + 1
+
+ALL_AREAS = "全部区域"
+
+
+def _categorical(values):
+    """把字符串列转换为 (类别数组, 编码数组)"""
+    values = np.array(["" if v is None else str(v) for v in values], dtype=object)
+    if len(values) == 0:
+        return np.empty(0, dtype=object), np.empty(0, dtype=np.int32)
+    categories, codes = np.unique(values, return_inverse=True)
+    return categories.astype(object), codes.astype(np.int32)
+
+
+def _to_float(column):
+    """把一列转换为 float64，无法解析的单元格为 NaN"""
+    try:
+        return np.array(column, dtype=float)
+    except (TypeError, ValueError):
+        out = np.empty(len(column))
+        for i, value in enumerate(column):
+            try:
+                out[i] = float(value)
+            except (TypeError, ValueError):
+                out[i] = np.nan
+        return out
+
+
+def parse_uncertainty(value):
+    """成分偏差 JSON 转换为 14 个元素的数组（百分点），未记录的元素为 NaN"""
+    out = np.full(len(ELEMENT_FIELDS), np.nan)
+    if not value:
+        return out
+    try:
+        data = json.loads(value) if isinstance(value, str) else value
+        for element, sigma in data.items():
+            if element in ELEMENT_FIELDS and sigma is not None:
+                out[ELEMENT_FIELDS.index(element)] = abs(float(sigma))
+    except (TypeError, ValueError, AttributeError):
+        pass
+    return out
+
+
+def uncertainty_from_text(text):
+    """界面输入的 "Si:0.3, Cu:0.1" 转换为成分偏差 JSON，空文本返回 None，格式错误抛出 ValueError"""
+    data = {}
+    for part in text.replace("，", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        element, sep, sigma = part.replace("：", ":").partition(":")
+        element = element.strip()
+        if not sep or element not in ELEMENT_FIELDS:
+            raise ValueError(f"无法识别的成分偏差: {part}")
+        data[element] = abs(float(sigma))
+    return json.dumps(data) if data else None
+
+
+def _merge_categories(categories, codes, extra):
+    """类别数组并入新值，返回 (新类别数组, 按新类别数组重编的编码)"""
+    merged = np.unique(np.concatenate([categories, np.asarray(extra, dtype=object)])).astype(object)
+    return merged, np.searchsorted(merged, categories)[codes].astype(np.int32)
+
+
+def _compact(categories, codes):
+    """去掉不再使用的类别"""
+    if len(codes) == 0:
+        return np.empty(0, dtype=object), codes
+    used, codes = np.unique(codes, return_inverse=True)
+    return categories[used], codes.astype(np.int32)
+
+
+class Inventory:
+    """废料库存
+
+    names / areas: 类别数组（categories + codes）
+    composition: n x 14 的元素含量矩阵（百分比，float64）
+    weights / prices: 重量(kg) 与单价(元/kg)
+    invalid: n x 16 布尔矩阵，标记无法解析的数值单元格
+    uncertainty: n x 14 的化验偏差（百分点），未记录的为 NaN
+    """
+
+    def __init__(self, name_categories, name_codes, area_categories, area_codes,
+                 composition, weights, prices, invalid=None, raw_invalid=None, uncertainty=None):
+        self.name_categories = name_categories
+        self.name_codes = name_codes
+        self.area_categories = area_categories
+        self.area_codes = area_codes
+        self.composition = composition
+        self.weights = weights
+        self.prices = prices
+        if invalid is None:
+            invalid = np.zeros((len(weights), PRICE_COL - NUMERIC_START + 1), dtype=bool)
+        self.invalid = invalid
+        # 无法解析的原始文本，仅用于表格显示: {(行, 列): 文本}
+        self.raw_invalid = raw_invalid or {}
+        if uncertainty is None:
+            uncertainty = np.full(composition.shape, np.nan)
+        self.uncertainty = uncertainty
+
+    @classmethod
+    def from_rows(cls, rows):
+        """由数据库查询结果构建，行格式与 WASTE_COLUMNS 一致，可以在最后多一列成分偏差"""
+        rows = list(rows)
+        columns = list(zip(*rows)) if rows else [()] * len(WASTE_COLUMNS)
+        name_categories, name_codes = _categorical(columns[0])
+        area_categories, area_codes = _categorical(columns[1])
+
+        numeric = np.column_stack([_to_float(columns[c]) for c in range(NUMERIC_START, PRICE_COL + 1)]) \
+            if rows else np.empty((0, PRICE_COL - NUMERIC_START + 1))
+        invalid = np.isnan(numeric)
+        raw_invalid = {
+            (int(r), int(c) + NUMERIC_START): "" if rows[r][c + NUMERIC_START] is None else str(rows[r][c + NUMERIC_START])
+            for r, c in zip(*np.nonzero(invalid))
+        }
+        numeric[invalid] = 0.0
+        uncertainty = np.array([parse_uncertainty(row[UNCERTAINTY_COL] if len(row) > UNCERTAINTY_COL else None)
+                                for row in rows]).reshape(len(rows), len(ELEMENT_FIELDS))
+
+        return cls(
+            name_categories, name_codes, area_categories, area_codes,
+            np.ascontiguousarray(numeric[:, :len(ELEMENT_FIELDS)]),
+            numeric[:, WEIGHT_COL - NUMERIC_START].copy(),
+            numeric[:, PRICE_COL - NUMERIC_START].copy(),
+            invalid, raw_invalid, uncertainty
+        )
+
+    def __len__(self):
+        return len(self.weights)
+
+    @property
+    def names(self):
+        return self.name_categories[self.name_codes]
+
+    @property
+    def areas(self):
+        return self.area_categories[self.area_codes]
+
+    @property
+    def element_matrix(self):
+        """元素含量（小数），供优化计算使用"""
+        return self.composition / 100.0
+
+    @property
+    def valid(self):
+        """数值全部可解析的行"""
+        return ~self.invalid.any(axis=1)
+
+    def column(self, field):
+        """按列名取一列，元素列返回组成矩阵的视图"""
+        if field in ELEMENT_FIELDS:
+            return self.composition[:, ELEMENT_FIELDS.index(field)]
+        if field == "名称":
+            return self.names
+        if field == "区域":
+            return self.areas
+        if field == "重量":
+            return self.weights
+        if field == "单价":
+            return self.prices
+        raise KeyError(field)
+
+    def area_list(self):
+        """库存中出现的全部区域（已排序）"""
+        return [area for area in self.area_categories if area != ""]
+
+    def area_mask(self, area):
+        """区域筛选掩码"""
+        if area == ALL_AREAS:
+            return np.ones(len(self), dtype=bool)
+        hit = np.flatnonzero(self.area_categories == area)
+        if len(hit) == 0:
+            return np.zeros(len(self), dtype=bool)
+        return self.area_codes == hit[0]
+
+    def subset(self, mask):
+        """按掩码或下标取子集，类别数组共享"""
+        raw_invalid = None
+        if self.raw_invalid:
+            new_row = {int(old): new for new, old in enumerate(np.arange(len(self))[mask])}
+            raw_invalid = {(new_row[r], c): text for (r, c), text in self.raw_invalid.items() if r in new_row}
+        return Inventory(
+            self.name_categories, self.name_codes[mask],
+            self.area_categories, self.area_codes[mask],
+            self.composition[mask], self.weights[mask], self.prices[mask],
+            self.invalid[mask], raw_invalid, self.uncertainty[mask]
+        )
+
+    def find(self, names):
+        """名称对应的行下标，不存在的名称为 -1"""
+        names = np.asarray(list(names), dtype=object)
+        rows = np.full(len(names), -1)
+        if len(self) == 0 or len(names) == 0:
+            return rows
+        row_of_code = np.full(len(self.name_categories), -1)
+        row_of_code[self.name_codes] = np.arange(len(self))
+        pos = np.searchsorted(self.name_categories, names).clip(max=len(self.name_categories) - 1)
+        hit = self.name_categories[pos] == names
+        rows[hit] = row_of_code[pos[hit]]
+        return rows
+
+    def with_changes(self, rows=(), deleted_names=()):
+        """应用增量变更，返回 (新库存, 删除的原行号, 更新的新行号, 追加行数)
+
+        先删除 deleted_names，再按名称更新已有行或在末尾追加 rows（行格式与 WASTE_COLUMNS 一致）。
+        写时复制：原库存保持不变，仍在使用它的计算任务不受影响。
+        """
+        removed = self.find(deleted_names)
+        removed = np.unique(removed[removed >= 0])
+        keep = np.ones(len(self), dtype=bool)
+        keep[removed] = False
+        base = self.subset(keep)
+
+        patch = Inventory.from_rows(rows)
+        target = base.find(patch.names)
+        new = target < 0
+        appended = int(new.sum())
+        target[new] = len(base) + np.arange(appended)
+
+        def grow(array):
+            return np.concatenate([array, np.zeros((appended,) + array.shape[1:], dtype=array.dtype)])
+
+        name_categories, name_codes = _merge_categories(base.name_categories, base.name_codes, patch.name_categories)
+        area_categories, area_codes = _merge_categories(base.area_categories, base.area_codes, patch.area_categories)
+        name_codes, area_codes = grow(name_codes), grow(area_codes)
+        name_codes[target] = np.searchsorted(name_categories, patch.names)
+        area_codes[target] = np.searchsorted(area_categories, patch.areas)
+        composition, weights, prices, invalid, uncertainty = (
+            grow(base.composition), grow(base.weights), grow(base.prices), grow(base.invalid), grow(base.uncertainty)
+        )
+        composition[target] = patch.composition
+        uncertainty[target] = patch.uncertainty
+        weights[target] = patch.weights
+        prices[target] = patch.prices
+        invalid[target] = patch.invalid
+
+        touched = set(target.tolist())
+        raw_invalid = {key: text for key, text in base.raw_invalid.items() if key[0] not in touched}
+        for (r, c), text in patch.raw_invalid.items():
+            raw_invalid[(int(target[r]), c)] = text
+
+        inventory = Inventory(
+            *_compact(name_categories, name_codes), *_compact(area_categories, area_codes),
+            composition, weights, prices, invalid, raw_invalid, uncertainty
+        )
+        return inventory, removed, np.sort(target[~new]), appended
+
+    def cell_text(self, row, col):
+        """表格显示文本，col 对应 WASTE_COLUMNS"""
+        if col == 0:
+            return self.name_categories[self.name_codes[row]]
+        if col == 1:
+            return self.area_categories[self.area_codes[row]]
+        if (row, col) in self.raw_invalid:
+            return self.raw_invalid[(row, col)]
+        if col < WEIGHT_COL:
+            value = self.composition[row, col - NUMERIC_START]
+        elif col == WEIGHT_COL:
+            value = self.weights[row]
+        else:
+            value = self.prices[row]
+        return np.format_float_positional(value, trim='-')
+
+    def row(self, row):
+        """一行的显示文本列表（与 WasteDialog 字段顺序一致）"""
+        return [self.cell_text(row, col) for col in range(len(WASTE_COLUMNS))]
+
+    def uncertainty_text(self, row):
+        """一行的成分偏差显示文本，如 Si:0.3, Cu:0.1"""
+        values = self.uncertainty[row]
+        return ", ".join(f"{element}:{np.format_float_positional(values[i], trim='-')}"
+                         for i, element in enumerate(ELEMENT_FIELDS) if not np.isnan(values[i]))
+
+    def invalid_rows(self):
+        """含有无法解析数值的行下标"""
+        return np.flatnonzero(self.invalid.any(axis=1))
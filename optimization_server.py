@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成方案优化服务
+不启动界面，在本机提供 HTTP/JSON 接口，供 MES 等系统请求配料方案：
+
+    python optimization_server.py --port 8765
+
+    GET  /health      服务状态、库存批数和排队中的求解数
+    GET  /standards   全部产品标准
+    POST /optimize    {"standard": "ADC12", "area": "全部区域", "target_weight": 5000}
+
+standard 可以是产品标准名称，也可以是 {"name": ..., "ranges": {...}} 形式的临时标准；
+其余字段为 optimize_mix 的产量和求解参数，返回结果与界面中的计算结果结构相同。
+库存和产品标准通过与界面相同的数据库层读取，按 refresh_interval 增量同步
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from blend_planner import BlendPlanner, JobCancelled, OPTIMIZE_OPTIONS, check_options
+from db import get_db_conn
+
+SERVICE_CONFIG = {
+    "host": "127.0.0.1",
+    "port": 8765,
+    "workers": 2,            # 同时进行的求解数
+    "max_pending": 16,       # 排队和求解中的请求超过此数时返回 503
+    "refresh_interval": 5,   # 距上次同步库存和产品标准超过此秒数时，求解前先同步
+    "request_timeout": 120,  # 单次求解超过此秒数时返回 504
+    "max_body": 1024 * 1024, # 请求体最大字节数
+}
+
+HTTP_STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable',
+               504: 'Gateway Timeout'}
+
+
+class RequestError(Exception):
+    """请求无效，status 为返回的 HTTP 状态码"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"无法序列化 {type(value).__name__}")
+
+
+class OptimizationService:
+    """持有一个 BlendPlanner，在线程池中求解，并限制同时求解和排队的请求数
+
+    connect: 返回数据库连接的函数。连接的用法与 pymysql 相同（游标支持 with 语句）；
+    增量同步依赖 MySQL（information_schema、一致性快照、NOW(6)），在其他数据库（如测试用的 SQLite 替身）上
+    自动退回为每次同步都全量读取库存
+    """
+
+    def __init__(self, connect=get_db_conn, **config):
+        self.config = dict(SERVICE_CONFIG, **config)
+        self.connect = connect
+        self.planner = BlendPlanner()
+        self.executor = ThreadPoolExecutor(max_workers=self.config['workers'],
+                                           thread_name_prefix="optimize")
+        self.slots = asyncio.Semaphore(self.config['workers'])
+        self.refresh_lock = asyncio.Lock()
+        self.refreshed_at = None
+        self.pending = 0
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _refresh(self):
+        """同步库存（首次为全量加载）并重新读取产品标准"""
+        conn = self.connect()
+        try:
+            self.planner.sync_inventory(conn)
+            self.planner.load_standards(conn)
+        finally:
+            conn.close()
+
+    async def refresh(self, force=False):
+        """距上次同步超过 refresh_interval 时同步一次，并发的请求只同步一次"""
+        async with self.refresh_lock:
+            if (not force and self.refreshed_at is not None
+                    and time.monotonic() - self.refreshed_at < self.config['refresh_interval']):
+                return
+            # 同步不占用求解线程，避免排在耗时的求解后面
+            await asyncio.get_running_loop().run_in_executor(None, self._refresh)
+            self.refreshed_at = time.monotonic()
+
+    def _solve(self, standard, area, options, deadline):
+        """在求解线程中计算，超时返回 None
+
+        求解器的时间上限设为请求剩余的时间，超时后求解器自行停止；
+        此外在报告进度时检查是否已超时，排队到超时才开始的请求不再求解
+        """
+        def progress(percent, text=""):
+            if time.monotonic() > deadline:
+                raise JobCancelled()
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        try:
+            return self.planner.optimize_mix(standard, area, progress=progress, time_budget=remaining,
+                                             **options)
+        except JobCancelled:
+            return None
+
+    def _finished(self, future):
+        self.pending -= 1
+        if not future.cancelled():
+            future.exception()
+
+    def parse_optimize(self, body):
+        """检查 POST /optimize 的请求体，返回 (产品标准, 区域, 求解参数)"""
+        if not isinstance(body, dict):
+            raise RequestError(400, "请求体应为 JSON 对象")
+        standard = body.get('standard')
+        if isinstance(standard, str):
+            found = self.planner.find_standard(standard)
+            if found is None:
+                raise RequestError(404, f"没有名为 {standard} 的产品标准")
+            standard = found
+        elif not (isinstance(standard, dict) and isinstance(standard.get('ranges'), dict)):
+            raise RequestError(400, "standard 应为产品标准名称或 {\"name\": ..., \"ranges\": {...}}")
+        else:
+            standard = {'name': str(standard.get('name', '')), 'ranges': standard['ranges']}
+        area = body.get('area', "全部区域")
+        if not isinstance(area, str):
+            raise RequestError(400, "area 应为字符串")
+
+        unknown = set(body) - {'standard', 'area'} - set(OPTIMIZE_OPTIONS)
+        if unknown:
+            raise RequestError(400, f"不支持的参数: {', '.join(sorted(unknown))}")
+        options = {key: body[key] for key in OPTIMIZE_OPTIONS if body.get(key) is not None}
+        try:
+            check_options(options)
+        except ValueError as e:
+            raise RequestError(400, str(e)) from None
+        return standard, area, options
+
+    async def optimize(self, body):
+        """求解一个配料方案，返回 (状态码, 结果)"""
+        if self.pending >= self.config['max_pending']:
+            raise RequestError(503, "求解请求过多，请稍后再试")
+        self.pending += 1
+        submitted = False
+        try:
+            await self.refresh()
+            standard, area, options = self.parse_optimize(body)
+
+            timeout = self.config['request_timeout']
+            loop = asyncio.get_running_loop()
+            async with self.slots:
+                future = loop.run_in_executor(self.executor, self._solve, standard, area, options,
+                                              time.monotonic() + timeout)
+                # 超时后求解器最迟在剩余时间用完时停止，结束前继续计入排队数
+                future.add_done_callback(self._finished)
+                submitted = True
+                try:
+                    result = await asyncio.wait_for(asyncio.shield(future), timeout)
+                except asyncio.TimeoutError:
+                    raise RequestError(504, f"求解超过 {timeout} 秒") from None
+        finally:
+            if not submitted:
+                self.pending -= 1
+        if result is None:
+            raise RequestError(504, f"求解超过 {timeout} 秒")
+        return 200, result
+
+    async def route(self, method, path, body):
+        if path == '/health':
+            return 200, {'status': 'ok', 'lots': len(self.planner.inventory),
+                         'standards': len(self.planner.product_standards), 'pending': self.pending,
+                         'workers': self.config['workers']}
+        if path == '/standards':
+            if method != 'GET':
+                raise RequestError(405, "请使用 GET")
+            await self.refresh()
+            return 200, self.planner.product_standards
+        if path == '/optimize':
+            if method != 'POST':
+                raise RequestError(405, "请使用 POST")
+            return await self.optimize(body)
+        raise RequestError(404, f"没有 {path}")
+
+    async def handle(self, reader, writer):
+        """处理一个 HTTP/1.1 连接（每个连接一个请求）"""
+        started = time.monotonic()
+        method = path = '-'
+        try:
+            try:
+                request_line = (await reader.readline()).decode('latin-1').split()
+                if len(request_line) != 3:
+                    raise RequestError(400, "无效的请求行")
+                method, target = request_line[0].upper(), request_line[1]
+                path = urlsplit(target).path.rstrip('/') or '/'
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length') or 0)
+                if length > self.config['max_body']:
+                    raise RequestError(413, "请求体过大")
+                body = None
+                if length:
+                    try:
+                        body = json.loads((await reader.readexactly(length)).decode('utf-8'))
+                    except (ValueError, UnicodeDecodeError) as e:
+                        raise RequestError(400, f"无效的 JSON: {e}") from None
+                status, payload = await self.route(method, path, body)
+            except RequestError as e:
+                status, payload = e.status, {'error': str(e)}
+            except Exception as e:
+                status, payload = 500, {'error': f"服务器错误: {e}"}
+            data = json.dumps(payload, ensure_ascii=False, default=_json_default).encode('utf-8')
+            writer.write(f"HTTP/1.1 {status} {HTTP_STATUS.get(status, '')}\r\n"
+                         f"Content-Type: application/json; charset=utf-8\r\n"
+                         f"Content-Length: {len(data)}\r\n"
+                         f"Connection: close\r\n\r\n".encode('latin-1') + data)
+            await writer.drain()
+            print(f"{method} {path} {status} {time.monotonic() - started:.2f}s")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(service, ready=None):
+    """启动服务并一直运行，ready 为可选的回调，开始监听后以 asyncio.Server 调用"""
+    await service.refresh(force=True)
+    server = await asyncio.start_server(service.handle, service.config['host'], service.config['port'])
+    host, port = server.sockets[0].getsockname()[:2]
+    print(f"优化服务已启动: http://{host}:{port} "
+          f"（库存 {len(service.planner.inventory)} 批，产品标准 {len(service.planner.product_standards)} 个）")
+    if ready:
+        ready(server)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RecycleMind 合成方案优化服务")
+    parser.add_argument("--host", default=SERVICE_CONFIG['host'], help="监听地址")
+    parser.add_argument("--port", type=int, default=SERVICE_CONFIG['port'], help="监听端口")
+    parser.add_argument("--workers", type=int, default=SERVICE_CONFIG['workers'], help="同时进行的求解数")
+    parser.add_argument("--max-pending", type=int, default=SERVICE_CONFIG['max_pending'],
+                        help="最多排队的求解请求数")
+    parser.add_argument("--timeout", type=float, default=SERVICE_CONFIG['request_timeout'],
+                        help="单次求解的时间上限（秒）")
+    args = parser.parse_args(argv)
+
+    service = OptimizationService(host=args.host, port=args.port, workers=args.workers,
+                                  max_pending=args.max_pending, request_timeout=args.timeout)
+    try:
+        asyncio.run(serve(service))
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"优化服务启动失败: {e}")
+        return 1
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
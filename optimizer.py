@@ -0,0 +1,1566 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成方案优化核心
+线性规划/混合整数规划求解（HiGHS），不依赖 PyQt6
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from scipy import sparse
+from scipy.optimize import Bounds, LinearConstraint, linprog, milp
+from scipy.special import ndtri
+
+ELEMENT_FIELDS = ["Si", "Fe", "Cu", "Mn", "Mg", "Zn", "Ti", "Cr", "Ni", "Zr", "Sr", "Bi", "Na", "Al"]
+
+# linprog 状态码 -> 求解状态
+SOLVER_STATUS = {
+    0: 'optimal',
+    1: 'iteration_limit',
+    2: 'infeasible',
+    3: 'unbounded',
+    4: 'numerical_error',
+}
+
+STATUS_MESSAGES = {
+    'iteration_limit': '达到迭代或时间上限，未得到最优解',
+    'infeasible': '无法找到可行解：当前库存无法满足产品标准',
+    'unbounded': '无法找到可行解：问题无界',
+    'numerical_error': '无法找到可行解：求解器数值错误',
+    'not_converged': '机会约束未在轮数上限内收敛，方案可能不是最优，各元素的达标概率也可能略低于置信水平',
+}
+
+
+def element_bounds(ranges):
+    """把产品标准的元素范围转换为 (元素索引, 下限, 上限)，单位为小数"""
+    idx, lo, hi = [], [], []
+    for i, element in enumerate(ELEMENT_FIELDS):
+        if element in ranges:
+            idx.append(i)
+            lo.append(ranges[element]['min'] / 100.0)
+            hi.append(ranges[element]['max'] / 100.0)
+    return np.array(idx, dtype=int), np.array(lo, dtype=float), np.array(hi, dtype=float)
+
+
+def tighten_ranges(ranges, margin):
+    """把产品标准中起作用的上下限（下限大于 0、上限小于 100）各向内收 margin 个百分点"""
+    tightened = {}
+    for element, r in ranges.items():
+        low = r['min'] + margin if r['min'] > 0 else r['min']
+        high = r['max'] - margin if r['max'] < 100 else r['max']
+        tightened[element] = dict(r, min=low, max=high)
+    return tightened
+
+
+def plan_margin(element_analysis):
+    """方案各元素含量离最近的起作用上下限的距离（百分点），没有起作用的上下限时返回 None"""
+    distances = []
+    for data in element_analysis.values():
+        if data['target_min'] > 0:
+            distances.append(data['content'] - data['target_min'])
+        if data['target_max'] < 100:
+            distances.append(data['target_max'] - data['content'])
+    return min(distances) if distances else None
+
+
+def binding_bounds(element_matrix, idx, lo, hi, margin=None):
+    """去掉对所有废料都自然满足的元素范围（如 0~100%），减少约束行"""
+    if len(idx) == 0:
+        return idx, lo, hi
+    content = element_matrix[:, idx]
+    spread = margin[:, idx] if margin is not None else 0
+    keep = (lo > (content - spread).min(axis=0)) | (hi < (content + spread).max(axis=0))
+    return idx[keep], lo[keep], hi[keep]
+
+
+def ratio_constraints(element_matrix, idx, lo, hi, margin=None):
+    """构建元素含量约束矩阵 A_ub x <= 0
+
+    含量下限: sum(x * a) >= min * sum(x)  ->  sum((min - a) * x) <= 0
+    含量上限: sum(x * a) <= max * sum(x)  ->  sum((a - max) * x) <= 0
+    margin: 可选的 n x 14 含量偏差（区间稳健），下限按 a - margin、上限按 a + margin 计
+    """
+    sub = element_matrix[:, idx].T
+    spread = margin[:, idx].T if margin is not None else 0
+    A_ub = np.vstack([lo[:, None] - (sub - spread), (sub + spread) - hi[:, None]])
+    b_ub = np.zeros(A_ub.shape[0])
+    return A_ub, b_ub
+
+
+def charge_constraints(n, target_weight=None, min_weight=None, max_weight=None):
+    """构建产量约束
+
+    指定产量: sum(x) == target_weight
+    炉次范围: min_weight <= sum(x) <= max_weight
+    返回 (A_ub 追加行, b_ub 追加值, A_eq, b_eq)，总量固定后元素约束仍为线性
+    """
+    ones = np.ones((1, n))
+    if target_weight is not None:
+        return np.empty((0, n)), np.empty(0), ones, np.array([float(target_weight)])
+
+    rows, rhs = [], []
+    if min_weight is not None:
+        rows.append(-ones)
+        rhs.append(-float(min_weight))
+    if max_weight is not None:
+        rows.append(ones)
+        rhs.append(float(max_weight))
+    A_ub = np.vstack(rows) if rows else np.empty((0, n))
+    return A_ub, np.array(rhs, dtype=float), None, None
+
+
+def build_result(x, element_matrix, prices, ranges, names, areas):
+    """根据最优重量整理结果字典"""
+    total_weight = float(np.sum(x))
+    total_cost = float(np.dot(x, prices))
+    avg_price = total_cost / total_weight if total_weight > 0 else 0
+
+    # 计算元素含量
+    element_analysis = {}
+    contents = x @ element_matrix / total_weight * 100 if total_weight > 0 else np.zeros(element_matrix.shape[1])
+    for i, element in enumerate(ELEMENT_FIELDS):
+        if element in ranges:
+            content = float(contents[i])
+            target_min = ranges[element]['min']
+            target_max = ranges[element]['max']
+            # 允许求解器容差范围内的误差
+            in_range = target_min - 1e-6 <= content <= target_max + 1e-6
+
+            element_analysis[element] = {
+                'content': content,
+                'target_min': target_min,
+                'target_max': target_max,
+                'in_range': in_range
+            }
+
+    # 废料配比
+    waste_mix = {}
+    for i in np.flatnonzero(x > 0.001):  # 忽略很小的值
+        waste_mix[names[i]] = {
+            'weight': float(x[i]),
+            'area': areas[i]
+        }
+
+    return {
+        'feasible': True,
+        'status': 'optimal',
+        'total_weight': total_weight,
+        'total_cost': total_cost,
+        'avg_price': avg_price,
+        'waste_mix': waste_mix,
+        'element_analysis': element_analysis
+    }
+
+
+class WarmStart:
+    """同一产品标准上一次最优解的信息，供下一次求解热启动
+
+    support: 上次用到的废料名称（库存增删后行号会变，所以按名称记录）
+    duals: (约束签名, 不等式约束对偶值, 等式约束对偶值)，约束行不变时用来挑选候选废料
+    """
+
+    def __init__(self):
+        self.state = None  # (support, duals)，整体替换，多个线程读写时不会读到一半
+
+    def update(self, names, x, signature, ineq_duals, eq_duals):
+        support = [names[i] for i in np.flatnonzero(x > 0)]
+        self.state = (support, (signature, ineq_duals, eq_duals))
+
+
+# 热启动时每轮最多加入的候选废料数
+WARM_START_BATCH = 200
+
+# 热启动最多迭代轮数，超过后改为完整求解
+WARM_START_ROUNDS = 20
+
+
+def _linprog(c, A_ub, b_ub, A_eq, b_eq, bounds, options):
+    return linprog(
+        c,
+        A_ub=A_ub if len(b_ub) else None,
+        b_ub=b_ub if len(b_ub) else None,
+        A_eq=A_eq,
+        b_eq=b_eq,
+        bounds=bounds,
+        method='highs',
+        options=options
+    )
+
+
+def _marginals(res, A_ub, A_eq):
+    ineq = res.ineqlin.marginals if A_ub.shape[0] else np.zeros(0)
+    eq = res.eqlin.marginals if A_eq is not None else np.zeros(0)
+    return ineq, eq
+
+
+def reduced_costs(prices, A_ub, A_eq, ineq_duals, eq_duals):
+    """各废料的检验数 c - A^T y，最优解中未使用的废料检验数都不为负"""
+    d = prices - A_ub.T @ ineq_duals
+    if A_eq is not None:
+        d = d - A_eq.T @ eq_duals
+    return d
+
+
+def _solve_warm(prices, A_ub, b_ub, A_eq, b_eq, weights, options, cols, duals, check=None):
+    """只在候选废料上求解，再用对偶值检查其余废料，有检验数为负的就加入候选后重解
+
+    没有检验数为负的废料时，候选子问题的最优解就是整个问题的最优解。check 见 solve_blend。
+    子问题不可行时按检验数（没有对偶值时按单价）补充候选后重解。
+    返回 (x, 不等式对偶, 等式对偶, 轮数)；超过轮数、全部废料都已加入仍不可行等情况返回 None，由调用方完整求解
+    """
+    n = len(weights)
+    active = weights > 0
+    in_set = np.zeros(n, dtype=bool)
+    in_set[cols] = True
+    tol = 1e-9 * max(1.0, float(np.abs(prices).max(initial=0)))
+    # 子问题不可行时按它从小到大补充候选
+    rank = prices
+    if duals is not None:
+        # 用上一次的对偶值预先挑选最可能进入最优解的废料
+        d = rank = reduced_costs(prices, A_ub, A_eq, *duals)
+        extra = np.flatnonzero((d < -tol) & active & ~in_set)
+        in_set[extra[np.argsort(d[extra])[:WARM_START_BATCH]]] = True
+
+    for rounds in range(1, WARM_START_ROUNDS + 1):
+        if check is not None:
+            check()
+        cols = np.flatnonzero(in_set & active)
+        if len(cols) == 0:
+            return None
+        sub_eq = A_eq[:, cols] if A_eq is not None else None
+        res = _linprog(prices[cols], A_ub[:, cols], b_ub, sub_eq, b_eq,
+                       np.column_stack([np.zeros(len(cols)), weights[cols]]), options)
+        if res.status == 2:
+            # 候选废料凑不出产量或成分（例如上次用到的废料库存减少或被删除），补充一批候选后重解
+            rest = np.flatnonzero(active & ~in_set)
+            if len(rest) == 0:
+                return None
+            in_set[rest[np.argsort(rank[rest])[:max(WARM_START_BATCH, len(cols))]]] = True
+            continue
+        if res.status != 0:
+            return None
+        ineq, eq = _marginals(res, A_ub, A_eq)
+        d = reduced_costs(prices, A_ub, A_eq, ineq, eq)
+        entering = np.flatnonzero((d < -tol) & active & ~in_set)
+        if len(entering) == 0:
+            x = np.zeros(n)
+            x[cols] = res.x
+            return x, ineq, eq, rounds
+        in_set[entering[np.argsort(d[entering])[:max(WARM_START_BATCH, len(cols))]]] = True
+    return None
+
+
+# 占优检查：不超过 PRESOLVE_BLOCK 批的组内两两比较；更大的组分块比较，每块只与单价最低的
+# PRESOLVE_REFERENCE 批已保留批次比较，只会少去掉一些批次，不影响结果，避免批次很多且互不占优时平方级的比较
+PRESOLVE_BLOCK = 256
+PRESOLVE_REFERENCE = 256
+
+
+def presolve_lots(A_ratio, prices, weights, cap):
+    """求解前去掉不影响最优成本的废料批次
+
+    A_ratio: ratio_constraints 构建的元素约束（前一半为下限行，后一半为对应的上限行）
+    cap: 方案最多可能用到的总重(kg)
+    - 没有库存的批次去掉
+    - 约束系数和单价都相同的批次合并为一列，库存相加
+    - 占优：批次 i 单价不高于 j、每个可能起作用的约束行上系数都不大于 j 时，把 j 的用量换成 i 不会违反约束也不增加成本；
+      占优 j 的批次库存合计不少于 cap 时其中总有一批还有余量，j 可以去掉。
+      上下限都起作用的元素要求含量相同才能比较，所以先按这些含量分组，只在组内比较
+    返回 (rep, owner, stats)：rep 为各保留列代表批次的行号（单价最低的排在前面），
+    owner[j] 为批次 j 并入的保留列，去掉的批次为 -1；stats 为各类去掉的批数
+    """
+    n = len(weights)
+    owner = np.full(n, -1)
+    stocked = np.flatnonzero(weights > 0)
+    stats = {'lots': n, 'kept': 0, 'zero_stock': n - len(stocked), 'merged': 0, 'dominated': 0}
+    if not len(stocked):
+        return np.empty(0, dtype=int), owner, stats
+
+    # 系数都不大于 0 的行对任何配比都成立，比较时忽略
+    A = A_ratio[:, stocked]
+    live = (A > 0).any(axis=1)
+    half = len(A) // 2
+    paired = np.concatenate([live[:half] & live[half:]] * 2)
+    keys = np.column_stack([A[paired].T, prices[stocked], A[live & ~paired].T])
+    unique, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    stock = np.bincount(inverse, weights=weights[stocked])
+    stats['merged'] = len(stocked) - len(unique)
+
+    # np.unique 按字典序排列：同一组（上下限都起作用的元素含量相同）的批次连续排列，组内按单价从低到高，
+    # 占优的批次一定排在被占优的批次前面。被去掉的批次也可以计入占优库存，它的占优者同样占优后面的批次
+    width = int(paired.sum())
+    values = unique[:, width:]
+    group = np.concatenate([[0], np.cumsum(np.any(unique[1:, :width] != unique[:-1, :width], axis=1))])
+    sizes = np.bincount(group)
+    small = sizes[group] <= PRESOLVE_BLOCK
+    cover = np.zeros(len(unique))
+    # 小组内两两比较：第 offset 轮比较组内相隔 offset 的批次，没有这样的批次时说明所有小组都已比较完
+    for offset in range(1, len(unique)):
+        i = np.flatnonzero(small[:-offset] & (group[:-offset] == group[offset:]))
+        if not len(i):
+            break
+        j = i + offset
+        hit = np.ones(len(i), dtype=bool)
+        for column in values.T:
+            hit &= column[i] <= column[j]
+        cover += np.bincount(j[hit], weights=stock[i[hit]], minlength=len(unique))
+    dominated = cover >= cap
+
+    # 大组分块，只与单价最低的 PRESOLVE_REFERENCE 批已保留批次和本块中排在前面的批次比较
+    for g in np.flatnonzero(sizes > PRESOLVE_BLOCK):
+        begin, end = np.searchsorted(group, [g, g + 1])
+        kept = np.empty(0, dtype=int)
+        for block in range(begin, end, PRESOLVE_BLOCK):
+            rows = np.arange(block, min(block + PRESOLVE_BLOCK, end))
+            earlier = np.concatenate([kept, rows])
+            covers = np.ones((len(earlier), len(rows)), dtype=bool)
+            covers[len(kept):] = rows[:, None] < rows[None, :]
+            for column in values.T:
+                covers &= column[earlier][:, None] <= column[rows][None, :]
+            removed = stock[earlier] @ covers >= cap
+            dominated[rows[removed]] = True
+            kept = np.concatenate([kept, rows[~removed]])[:PRESOLVE_REFERENCE]
+
+    # 保留的列按单价排列，代表批次取每组合并前的第一批
+    order = np.argsort(unique[:, width], kind='stable')
+    order = order[~dominated[order]]
+    column = np.full(len(unique), -1)
+    column[order] = np.arange(len(order))
+    owner[stocked] = column[inverse]
+    stats['dominated'] = int(dominated.sum())
+    stats['kept'] = len(order)
+    return stocked[first[order]], owner, stats
+
+
+def expand_solution(x_kept, owner, weights):
+    """把精简后各列的用量分回原来的批次：合并的批次按行号顺序依次用满库存"""
+    x = np.zeros(len(weights))
+    lots = np.flatnonzero(owner >= 0)
+    lots = lots[np.argsort(owner[lots], kind='stable')]
+    group = owner[lots]
+    w = weights[lots]
+    # 同一列中排在前面的批次的库存之和
+    before = np.cumsum(w) - w
+    start = np.searchsorted(group, group)
+    before -= before[start]
+    x[lots] = np.clip(x_kept[group] - before, 0, w)
+    return x
+
+
+def achievable_contents(element_matrix, weights, idx, total_weight=None):
+    """各元素在装料总重为 total_weight 时可达到的最低和最高含量（小数）
+
+    只考虑单个元素时，最高含量就是按含量从高到低依次装满 total_weight 的结果（最低含量同理），
+    这是任何配比都无法超过的界限；total_weight 为 None 时为各批废料含量的最小/最大值
+    """
+    stocked = weights > 0
+    content = element_matrix[stocked][:, idx]
+    w = weights[stocked]
+    if total_weight is None or total_weight <= 0:
+        return content.min(axis=0), content.max(axis=0)
+    extremes = []
+    for order in (np.argsort(content, axis=0), np.argsort(-content, axis=0)):
+        sorted_w = w[order]
+        # 每批废料能装入的重量：前面的废料装完后剩余的容量
+        take = np.clip(total_weight - (np.cumsum(sorted_w, axis=0) - sorted_w), 0, sorted_w)
+        extremes.append(np.sum(take * np.take_along_axis(content, order, axis=0), axis=0) / total_weight)
+    return extremes[0], extremes[1]
+
+
+def precheck(element_matrix, weights, ranges, target_weight=None, min_weight=None, margin=None):
+    """求解前快速检查明显无法满足的产品标准，返回问题列表（空列表表示未发现问题）
+
+    margin: 区间稳健时的含量偏差，下限按 a - margin、上限按 a + margin 检查
+    """
+    element_matrix = np.asarray(element_matrix, dtype=float)
+    weights = np.clip(np.asarray(weights, dtype=float), 0, None)
+    required = target_weight if target_weight is not None else min_weight
+    issues = []
+    stock = float(weights.sum())
+    if required and stock < required - 1e-6:
+        issues.append({'type': 'stock', 'required': float(required), 'available': stock})
+        return issues
+    if not stock:
+        return issues
+
+    idx, lo, hi = element_bounds(ranges)
+    if len(idx) == 0:
+        return issues
+    if margin is None:
+        low, high = achievable_contents(element_matrix, weights, idx, required)
+    else:
+        high = achievable_contents(element_matrix - margin, weights, idx, required)[1]
+        low = achievable_contents(element_matrix + margin, weights, idx, required)[0]
+    for j, e in enumerate(idx):
+        if lo[j] > high[j] + 1e-9:
+            issues.append({'type': 'element', 'element': ELEMENT_FIELDS[e], 'bound': 'min',
+                           'required': float(lo[j] * 100), 'achievable': float(high[j] * 100)})
+        if hi[j] < low[j] - 1e-9:
+            issues.append({'type': 'element', 'element': ELEMENT_FIELDS[e], 'bound': 'max',
+                           'required': float(hi[j] * 100), 'achievable': float(low[j] * 100)})
+    return issues
+
+
+def diagnose_infeasibility(element_matrix, weights, prices, ranges, names,
+                           target_weight=None, min_weight=None, max_weight=None, time_limit=None, margin=None):
+    """弹性求解：允许放宽元素范围和废料库存，求使放宽量之和最小的方案
+
+    每批废料增加一个“补充库存”变量，每个元素上下限增加一个松弛变量，两者都按占装料总重的百分比计量，
+    一次求解即可得到需要放宽哪些条件以及放宽多少（L1 最小化，放宽的条件通常很少）。
+    返回 [{'type': 'element', 'element', 'bound', 'current', 'suggested'} 或
+          {'type': 'lot', 'name', 'stock', 'extra'}]，无法诊断时返回 None
+    """
+    element_matrix = np.asarray(element_matrix, dtype=float)
+    weights = np.clip(np.asarray(weights, dtype=float), 0, None)
+    prices = np.asarray(prices, dtype=float)
+    n = len(weights)
+    reference = target_weight if target_weight is not None else min_weight
+    if not reference:
+        return None
+
+    idx, lo, hi = binding_bounds(element_matrix, *element_bounds(ranges), margin)
+    k = len(idx)
+    A_ratio, b_ratio = ratio_constraints(element_matrix, idx, lo, hi, margin)
+    charge_ub, charge_b, A_eq, b_eq = charge_constraints(n, target_weight, min_weight, max_weight)
+
+    # 变量: [x（库存内）, e（补充库存）, v（元素松弛，kg 元素）]；x 和 e 的系数相同
+    A_x = np.vstack([A_ratio, charge_ub])
+    A_ub = np.hstack([A_x, A_x, np.vstack([-np.eye(2 * k), np.zeros((len(charge_b), 2 * k))])])
+    b_ub = np.concatenate([b_ratio, charge_b])
+    if A_eq is not None:
+        A_eq = np.hstack([A_eq, A_eq, np.zeros((1, 2 * k))])
+    # 放宽 1 个百分点的元素范围与补充 1% 装料重量的库存同等代价；单价只用于在放宽量相同时选便宜的
+    scale = 100.0 / reference
+    tie_break = 1e-6 * scale * prices / max(1.0, float(np.abs(prices).max(initial=0)))
+    c = np.concatenate([tie_break, np.full(n, scale) + tie_break, np.full(2 * k, scale)])
+    bounds = np.zeros((2 * n + 2 * k, 2))
+    bounds[:n, 1] = weights
+    bounds[n:, 1] = np.inf
+
+    options = {}
+    if time_limit:
+        options['time_limit'] = float(time_limit)
+    res = _linprog(c, A_ub, b_ub, A_eq, b_eq, bounds, options)
+    if res.status != 0:
+        return None
+
+    total = float(res.x[:2 * n].sum())
+    extra = res.x[n:2 * n]
+    slack = res.x[2 * n:]
+    tol = 1e-6 * reference
+    relaxations = []
+    for j, e in enumerate(idx):
+        for side, amount, current in (('min', slack[j], lo[j]), ('max', slack[k + j], hi[j])):
+            if amount > tol and total > 0:
+                change = amount / total
+                relaxations.append({
+                    'type': 'element', 'element': ELEMENT_FIELDS[e], 'bound': side,
+                    'current': float(current * 100),
+                    'suggested': float((current - change if side == 'min' else current + change) * 100),
+                })
+    for i in np.flatnonzero(extra > tol):
+        relaxations.append({'type': 'lot', 'name': names[i], 'stock': float(weights[i]), 'extra': float(extra[i])})
+    return relaxations
+
+
+def diagnosis_lines(issues):
+    """把预检查或弹性求解的结果整理为说明文字"""
+    lines = []
+    for item in issues:
+        if item['type'] == 'stock':
+            lines.append(f"库存总量 {item['available']:.1f} kg 不足所需的 {item['required']:.1f} kg")
+        elif item['type'] == 'element' and 'achievable' in item:
+            word = "下限" if item['bound'] == 'min' else "上限"
+            limit = "最高" if item['bound'] == 'min' else "最低"
+            lines.append(f"{item['element']} 含量{word} {item['required']:.3f}% 无法满足："
+                         f"当前库存{limit}只能达到 {item['achievable']:.3f}%")
+        elif item['type'] == 'element':
+            word = "下限" if item['bound'] == 'min' else "上限"
+            lines.append(f"{item['element']} 含量{word}由 {item['current']:.3f}% 放宽到 {item['suggested']:.3f}%")
+        elif item['type'] == 'lot':
+            lines.append(f"废料 {item['name']} 库存由 {item['stock']:.1f} kg 增加 {item['extra']:.1f} kg")
+    return lines
+
+
+def _infeasible_result(element_matrix, weights, prices, ranges, names,
+                       target_weight, min_weight, max_weight, time_limit, margin=None):
+    """线性规划不可行时的结果，附带最少需要放宽的元素范围或废料库存"""
+    relaxations = diagnose_infeasibility(element_matrix, weights, prices, ranges, names,
+                                         target_weight, min_weight, max_weight, time_limit, margin)
+    lines = [STATUS_MESSAGES['infeasible']]
+    if relaxations:
+        lines += ["可以按以下方式调整后重新计算:"] + diagnosis_lines(relaxations)
+    return {
+        'feasible': False,
+        'status': 'infeasible',
+        'message': "\n".join(lines),
+        'diagnosis': {'relaxations': relaxations}
+    }
+
+
+# 混合整数规划默认的时间上限（秒）和相对间隙
+MILP_TIME_LIMIT = 30
+MILP_GAP = 1e-3
+
+# 混合整数规划只在线性松弛解用到的废料和检验数最小的这些废料上求解
+MILP_CANDIDATES = 300
+
+
+def _is_set(value):
+    return value is not None and bool(np.any(np.asarray(value) > 0))
+
+
+def _per_lot(value, n):
+    """标量或逐批数组统一为长度 n 的数组，None 视为 0"""
+    return np.broadcast_to(np.asarray(value if value is not None else 0, dtype=float), (n,)).copy()
+
+
+def _solve_integer(element_matrix, weights, prices, ranges, names, areas, idx, lo, hi,
+                   target_weight, min_weight, max_weight, time_limit,
+                   min_take, unit_weight, max_lots, mip_gap, margin=None, uncertainty=None, limits=None,
+                   check=None):
+    """带最小取用量、整件取用和废料批数限制的配料方案（混合整数规划）
+
+    先求线性松弛得到成本下界和检验数，再只在松弛解用到的废料和检验数最小的候选上求混合整数规划；
+    候选上无解时改为在全部废料上求解。最小取用量用半连续变量表示（取 0 或不少于最小取用量），
+    有批数限制时再为每批候选加一个 0/1 变量。
+    limits: idx / lo / hi 所来自的元素范围（留安全裕度时比 ranges 窄），无解时按它给出放宽建议
+    check: 见 solve_blend，在每次求混合整数规划之前调用
+    """
+    start = time.perf_counter()
+    n = len(weights)
+    unit = _per_lot(unit_weight, n)
+    by_unit = unit > 0
+    # 按整件取用时每批最多可用的整件数；库存不足最小取用量的废料只能整批用完
+    count = np.where(by_unit, np.floor(weights / np.where(by_unit, unit, 1) + 1e-9), 0)
+    cap = np.where(by_unit, count * unit, weights)
+    take = np.minimum(_per_lot(min_take, n), cap)
+
+    A_ratio, b_ratio = ratio_constraints(element_matrix, idx, lo, hi, margin)
+    if target_weight is not None and by_unit.any():
+        # 按整件取用时总重很难恰好等于目标产量，允许多出不超过一件
+        charge = charge_constraints(n, None, target_weight, target_weight + float(unit.max()))
+    else:
+        charge = charge_constraints(n, target_weight, min_weight, max_weight)
+    charge_ub, charge_b, A_eq, b_eq = charge
+    A_ub = np.vstack([A_ratio, charge_ub])
+    b_ub = np.concatenate([b_ratio, charge_b])
+
+    limit = float(time_limit or MILP_TIME_LIMIT)
+    # 线性松弛：任何整数方案的成本都不低于它
+    res = _linprog(prices, A_ub, b_ub, A_eq, b_eq, np.column_stack([np.zeros(n), cap]), {'time_limit': limit})
+    status = SOLVER_STATUS.get(res.status, 'numerical_error')
+    if status == 'infeasible':
+        return _infeasible_result(element_matrix, weights, prices, limits or ranges, names,
+                                  target_weight, min_weight, max_weight, time_limit, margin)
+    if status != 'optimal':
+        return {'feasible': False, 'status': status, 'message': STATUS_MESSAGES[status]}
+    lp_bound = float(res.fun)
+    d = reduced_costs(prices, A_ub, A_eq, *_marginals(res, A_ub, A_eq))
+
+    usable = cap > 0
+    support = usable & (res.x > 1e-9)
+    rest = np.flatnonzero(usable & ~support)
+    cols = np.union1d(np.flatnonzero(support), rest[np.argsort(d[rest])[:MILP_CANDIDATES]])
+
+    gap = MILP_GAP if mip_gap is None else float(mip_gap)
+    while True:
+        m = len(cols)
+        # 变量: 整件取用的废料为件数，其余为重量；有批数限制时追加每批是否使用的 0/1 变量
+        scale = np.where(by_unit[cols], unit[cols], 1.0)
+        upper = np.where(by_unit[cols], count[cols], cap[cols])
+        lower = np.where(by_unit[cols], np.ceil(take[cols] / scale - 1e-9), take[cols])
+        integral = by_unit[cols].astype(int)
+        blocks = [A_ub[:, cols] * scale]
+        rows_lb, rows_ub = [np.full(len(b_ub), -np.inf)], [b_ub]
+        if A_eq is not None:
+            blocks.append(A_eq[:, cols] * scale)
+            rows_lb.append(b_eq)
+            rows_ub.append(b_eq)
+
+        if _is_set(max_lots):
+            eye = sparse.identity(m, format='csr')
+            A = sparse.vstack([
+                sparse.hstack([sparse.csr_matrix(np.vstack(blocks)), sparse.csr_matrix((sum(map(len, rows_ub)), m))]),
+                sparse.hstack([eye, -sparse.diags(upper)]),   # 使用量 <= 上限 * 是否使用
+                sparse.hstack([-eye, sparse.diags(lower)]),   # 使用量 >= 最小取用量 * 是否使用
+                sparse.hstack([sparse.csr_matrix((1, m)), np.ones((1, m))]),
+            ], format='csr')
+            rows_lb += [np.full(2 * m, -np.inf), [-np.inf]]
+            rows_ub += [np.zeros(2 * m), [float(max_lots)]]
+            c = np.concatenate([prices[cols] * scale, np.zeros(m)])
+            integrality = np.concatenate([integral, np.ones(m, dtype=int)])
+            bounds = Bounds(np.zeros(2 * m), np.concatenate([upper, np.ones(m)]))
+        else:
+            A = np.vstack(blocks)
+            c = prices[cols] * scale
+            # 2: 半连续（0 或 [下限, 上限]），3: 半整数
+            semi = lower > 0
+            integrality = np.where(semi, integral + 2, integral)
+            bounds = Bounds(np.where(semi, lower, 0), upper)
+
+        if check is not None:
+            check()
+        remaining = max(1.0, limit - (time.perf_counter() - start))
+        res = milp(c, integrality=integrality, bounds=bounds,
+                   constraints=LinearConstraint(A, np.concatenate(rows_lb), np.concatenate(rows_ub)),
+                   options={'time_limit': remaining, 'mip_rel_gap': gap})
+        # 只在候选上无解时改为全部废料；达到时间上限时已没有剩余时间，在更大的问题上重试只会远超上限
+        if res.x is None and m < np.count_nonzero(usable) and res.status == 2:
+            cols = np.flatnonzero(usable)
+            continue
+        break
+
+    if res.x is None:
+        if res.status == 2:
+            return {
+                'feasible': False,
+                'status': 'infeasible',
+                'message': STATUS_MESSAGES['infeasible'] + "\n连续配比可行，但在最小取用量、整件取用或批数限制下"
+                                                           "没有可行解，可以适当放宽这些限制"
+            }
+        status = 'iteration_limit' if res.status == 1 else SOLVER_STATUS.get(res.status, 'numerical_error')
+        return {'feasible': False, 'status': status, 'message': STATUS_MESSAGES[status]}
+
+    amount = res.x[:m]
+    amount = np.where(integral, np.round(amount), np.clip(amount, 0, None))
+    # 去掉求解器容差内的残留量，否则不使用的废料也会计入批数
+    amount[amount < 1e-7 * np.maximum(upper, 1)] = 0
+    if _is_set(max_lots):
+        amount[res.x[m:] < 0.5] = 0
+    x = np.zeros(n)
+    x[cols] = amount * scale
+    result = build_result(x, element_matrix, prices, ranges, names, areas)
+    for j in np.flatnonzero(integral & (amount > 0)):
+        result['waste_mix'][names[cols[j]]]['units'] = int(amount[j])
+    total_cost = result['total_cost']
+    result['status'] = 'optimal' if res.status == 0 else 'time_limit'
+    result['integer'] = {
+        'lots': int(np.count_nonzero(x > 0)),
+        'candidates': m,
+        'mip_gap': float(res.mip_gap) if getattr(res, 'mip_gap', None) is not None else None,
+        'lp_bound': lp_bound,
+        # 相对全部废料上线性松弛下界的间隙，候选筛选后仍然有效
+        'bound_gap': (total_cost - lp_bound) / total_cost if total_cost > 0 else 0.0,
+        'nodes': int(getattr(res, 'mip_node_count', 0) or 0),
+        'time_limit_reached': res.status == 1,
+    }
+    if uncertainty is not None:
+        result['reliability'] = monte_carlo_check(x, element_matrix, uncertainty, ranges)
+    return result
+
+
+# 稳健求解方式
+ROBUST_MODES = {'box': '区间稳健', 'chance': '机会约束'}
+
+# 机会约束割平面的最多轮数；切平面按放大 ROBUST_SLACK 倍的 z 构建，以很小的保守量换取更快收敛；
+# 可行方案与下界的相对差距小于 ROBUST_GAP 时停止
+ROBUST_ROUNDS = 50
+ROBUST_SLACK = 0.02
+ROBUST_GAP = 1e-3
+
+# 蒙特卡洛验证的抽样次数；每批抽样的随机数个数上限，控制内存
+MONTE_CARLO_SAMPLES = 5000
+MONTE_CARLO_BATCH = 2000000
+
+
+def uncertainty_matrix(uncertainty, element_matrix, default_relative=0.0):
+    """化验偏差（百分点，NaN 为未记录）转换为标准差矩阵（小数）
+
+    未记录的按含量的 default_relative 倍计；全部为 0 时返回 None
+    """
+    sigma = np.asarray(uncertainty, dtype=float) / 100.0
+    sigma = np.where(np.isnan(sigma), default_relative * np.asarray(element_matrix, dtype=float), sigma)
+    return sigma if np.any(sigma > 0) else None
+
+
+def _chance_rows(A_rows, sigma_rows, x, z):
+    """各元素约束行的 sum((min - a) x) + z ||σ∘x||（<= 0 为满足），以及 σ∘x 和范数"""
+    spread = sigma_rows * x
+    norms = np.sqrt(np.einsum('ij,ij->i', spread, spread))
+    return A_rows @ x + z * norms, spread, norms
+
+
+def _solve_chance(prices, A_ub, b_ub, A_eq, b_eq, weights, options, sigma_rows, z, anchor=None, check=None):
+    """机会约束：各元素上下限按置信水平满足，各批废料的化验误差相互独立、服从正态分布
+
+    下限行 P(sum(a x) >= min sum(x)) >= p 等价于 sum((min - a) x) + z ||σ∘x|| <= 0（二阶锥约束）。
+    左边是凸的一次齐次函数，在任一点的切平面 ∇f(x0)·x <= 0 都是有效的外逼近，
+    每轮求解线性规划后对仍违反的行加切平面（割平面法），线性规划的最优值是成本下界。
+    anchor() 返回一个满足机会约束的方案（区间稳健解，||σ∘x||₂ <= sum(σ x)），每轮在它与线性规划解的连线上
+    二分找到可行边界点，既作为候选方案，也在该点加切平面，下界与最好候选接近时停止。
+    未使用废料在切平面上的系数与原约束行相同，所以每轮只需在上一轮用到的废料上热启动求解。
+    置信水平对每个元素的上限、下限分别成立，不是全部元素同时达标的联合概率。
+    sigma_rows: 与元素约束行对应的标准差（2k x n）；check 见 solve_blend，每轮开始时调用
+    返回 (linprog 状态码, x, 轮数, 是否收敛, 成本下界)；达到 ROBUST_ROUNDS 仍未收敛时返回最好的可行候选，
+    没有候选时返回最后一轮的外逼近解，它可能略微违反机会约束
+    """
+    k2 = sigma_rows.shape[0]
+    A_rows = A_ub[:k2]
+    z_cut = z * (1 + ROBUST_SLACK)
+    bounds = np.column_stack([np.zeros_like(weights), weights])
+    res = _linprog(prices, A_ub, b_ub, A_eq, b_eq, bounds, options)
+    if res.status != 0:
+        return res.status, None, 1, False, None
+    x, (ineq, eq) = res.x, _marginals(res, A_ub, A_eq)
+    best = None
+
+    for rounds in range(1, ROBUST_ROUNDS + 1):
+        if check is not None:
+            check()
+        bound = float(prices @ x)
+        tol = 1e-9 * max(float(x.sum()), 1.0)
+        f, spread, norms = _chance_rows(A_rows, sigma_rows, x, z)
+        if np.all(f <= tol):
+            return 0, x, rounds, True, bound
+        if best is None and anchor is not None:
+            best = anchor()
+            anchor = None
+        cut_points = [x]
+        if best is not None:
+            # 连线上 max(f) 随 λ 是凸的，且两端分别 > 0 和 <= 0，二分找边界（只涉及两个方案用到的废料）
+            cols = np.flatnonzero((x > 0) | (best > 0))
+            low, high = 0.0, 1.0
+            for _ in range(40):
+                mid = (low + high) / 2
+                point = (1 - mid) * x[cols] + mid * best[cols]
+                if np.all(_chance_rows(A_rows[:, cols], sigma_rows[:, cols], point, z)[0] <= tol):
+                    high = mid
+                else:
+                    low = mid
+            edge = (1 - high) * x + high * best
+            if prices @ edge < prices @ best:
+                best = edge
+            if float(prices @ best) - bound <= ROBUST_GAP * abs(float(prices @ best)):
+                return 0, best, rounds, True, bound
+            cut_points.append(edge)
+
+        for point in cut_points:
+            f_cut, spread, norms = _chance_rows(A_rows, sigma_rows, point, z_cut)
+            rows = np.flatnonzero((f_cut > -tol) & (norms > 0))
+            A_ub = np.vstack([A_ub, A_rows[rows] + z_cut * sigma_rows[rows] * spread[rows] / norms[rows, None]])
+            b_ub = np.concatenate([b_ub, np.zeros(len(rows))])
+            ineq = np.concatenate([ineq, np.zeros(len(rows))])
+        # 候选方案用到的废料一起加入，新的切平面下子问题仍然可行
+        support = (x > 0) if best is None else (x > 0) | (best > 0)
+        warm = _solve_warm(prices, A_ub, b_ub, A_eq, b_eq, weights, options, np.flatnonzero(support), (ineq, eq),
+                           check)
+        if warm is not None:
+            x, ineq, eq, _ = warm
+            continue
+        res = _linprog(prices, A_ub, b_ub, A_eq, b_eq, bounds, options)
+        if res.status != 0:
+            return res.status, None, rounds + 1, False, None
+        x, (ineq, eq) = res.x, _marginals(res, A_ub, A_eq)
+
+    # 未收敛：有可行候选时返回候选，否则返回最后一轮的外逼近解（可能略微违反约束）
+    if best is not None:
+        return 0, best, ROBUST_ROUNDS, False, float(prices @ x)
+    return 0, x, ROBUST_ROUNDS, False, float(prices @ x)
+
+
+def monte_carlo_check(x, element_matrix, uncertainty, ranges, samples=MONTE_CARLO_SAMPLES, seed=0):
+    """蒙特卡洛验证：按化验偏差对方案中各批废料的成分独立正态抽样，统计达到产品标准的概率
+
+    全部抽样在 NumPy 中按批一次计算。返回 {'samples', 'probability'（全部元素同时达标）,
+    'elements': {元素: {'probability', 'mean', 'std'}}}（含量为百分比），方案为空时返回 None
+    """
+    idx, lo, hi = element_bounds(ranges)
+    # 0~100% 的范围总能满足，不必抽样
+    keep = (lo > 0) | (hi < 1)
+    idx, lo, hi = idx[keep], lo[keep], hi[keep]
+    used = np.flatnonzero(x > 0)
+    total = float(x[used].sum())
+    if total <= 0 or len(idx) == 0:
+        return None
+    share = x[used] / total
+    content = element_matrix[used][:, idx]
+    sigma = uncertainty[used][:, idx]
+
+    rng = np.random.default_rng(seed)
+    batch = max(1, MONTE_CARLO_BATCH // content.size)
+    blends = np.empty((samples, len(idx)))
+    for start in range(0, samples, batch):
+        size = min(batch, samples - start)
+        draws = np.clip(content + sigma * rng.standard_normal((size,) + content.shape), 0, 1)
+        blends[start:start + size] = np.einsum('m,smk->sk', share, draws)
+    ok = (blends >= lo - 1e-9) & (blends <= hi + 1e-9)
+    return {
+        'samples': samples,
+        'probability': float(ok.all(axis=1).mean()),
+        'elements': {
+            ELEMENT_FIELDS[e]: {
+                'probability': float(ok[:, j].mean()),
+                'mean': float(blends[:, j].mean() * 100),
+                'std': float(blends[:, j].std() * 100),
+            }
+            for j, e in enumerate(idx)
+        },
+    }
+
+
+def reliability_warnings(reliability, confidence):
+    """抽样达标概率低于置信水平时的提示列表
+
+    机会约束的置信水平对各元素的上下限分别成立，某元素上下限都起作用或抽样误差都会让单个元素的概率略低，
+    全部元素同时达标的概率一般低于置信水平
+    """
+    if not reliability:
+        return []
+    warnings = []
+    low = [f"{element} {item['probability']:.1%}" for element, item in reliability['elements'].items()
+           if item['probability'] < confidence]
+    if low:
+        warnings.append(f"这些元素的抽样达标概率低于置信水平 {confidence:.1%}: {', '.join(low)}")
+    if reliability['probability'] < confidence:
+        warnings.append(f"全部元素同时达标的概率为 {reliability['probability']:.1%}，低于置信水平 {confidence:.1%}"
+                        "（置信水平对各元素分别成立，不是联合概率）")
+    return warnings
+
+
+# 敏感性分析中列出的未使用废料数（检验数最小，即降价后最先进入方案的废料）
+SENSITIVITY_CANDIDATES = 10
+
+
+def _basic_price_ranges(basic, x, weights, A_ub, b_ub, A_eq, d, ineq_duals, tol):
+    """基变量（0 < x < 库存）的单价变化范围 (下降量, 上升量)，在此范围内最优配比不变
+
+    单价变化 Δ 时非基变量的检验数变为 d - Δ·α（α 为单纯形表中该基变量所在行），
+    要求在下界的非基变量检验数不为负、在上界的不为正。基退化（基变量数与约束数不符）时返回 None
+    """
+    m_ub = A_ub.shape[0]
+    A = np.vstack([A_ub, A_eq]) if A_eq is not None else A_ub
+    slack = b_ub - A_ub @ x
+    slack_basic = np.flatnonzero(slack > tol)
+    if len(basic) + len(slack_basic) != A.shape[0]:
+        return None
+    B = np.hstack([A[:, basic], np.eye(A.shape[0])[:, slack_basic]])
+    try:
+        B_inv = np.linalg.inv(B)
+    except np.linalg.LinAlgError:
+        return None
+
+    n = len(weights)
+    is_basic = np.zeros(n, dtype=bool)
+    is_basic[basic] = True
+    at_upper = ~is_basic & (x >= weights - tol) & (weights > 0)
+    fixed = weights <= 0
+    # 取等号的约束的松弛变量在下界，检验数为 -对偶值
+    slack_rows = np.setdiff1d(np.arange(m_ub), slack_basic)
+    slack_d = -ineq_duals[slack_rows]
+
+    ranges = []
+    for row in range(len(basic)):
+        alpha = B_inv[row] @ A
+        alpha_slack = B_inv[row][slack_rows]
+        down, up = -np.inf, np.inf
+        for a, dk, upper in ((alpha, d, at_upper), (alpha_slack, slack_d, np.zeros(len(slack_rows), dtype=bool))):
+            mask = np.abs(a) > 1e-12
+            if a is alpha:
+                mask &= ~is_basic & ~fixed
+            ratio = np.where(mask, dk / np.where(mask, a, 1.0), 0.0)
+            # 在下界: d - Δα >= 0；在上界: d - Δα <= 0
+            le = mask & ((a > 0) != upper)
+            ge = mask & ((a > 0) == upper)
+            if le.any():
+                up = min(up, float(ratio[le].min()))
+            if ge.any():
+                down = max(down, float(ratio[ge].max()))
+        ranges.append((down, up))
+    return ranges
+
+
+def sensitivity_report(x, weights, prices, names, areas, idx, A_ub, b_ub, A_eq, ineq_duals, eq_duals,
+                       target_weight=None, min_weight=None, max_weight=None):
+    """由最优解的对偶值整理敏感性分析
+
+    elements: 每个元素范围放宽 1 个百分点可节省的成本（元），未起约束作用的为 0
+    weight_shadow_price: 产量每增加 1 kg 增加的成本（元/kg），产量不受限时为 None
+    lots: 方案中的废料及检验数最小的未使用废料: 检验数（元/kg）、单价在多大范围内方案不变
+    """
+    total_weight = float(np.sum(x))
+    tol = 1e-7 * max(1.0, float(np.max(weights, initial=0)))
+    k = len(idx)
+    d = reduced_costs(prices, A_ub, A_eq, ineq_duals, eq_duals)
+
+    # 下限行 sum((lo - a) x) <= 0 在 lo 放宽 δ 后右端变为 δ·总重，上限行同理
+    elements = {}
+    for j, e in enumerate(idx):
+        elements[ELEMENT_FIELDS[e]] = {
+            'min_shadow': float(-ineq_duals[j] * total_weight / 100),
+            'max_shadow': float(-ineq_duals[k + j] * total_weight / 100),
+        }
+
+    weight_shadow = None
+    charge_duals = ineq_duals[2 * k:]
+    if target_weight is not None:
+        weight_shadow = float(eq_duals[0])
+    elif len(charge_duals):
+        rows = ([-1.0] if min_weight is not None else []) + ([1.0] if max_weight is not None else [])
+        weight_shadow = float(np.dot(rows, charge_duals))
+
+    used = np.flatnonzero(x > 0.001)
+    unused = np.flatnonzero((x <= tol) & (weights > 0))
+    candidates = unused[np.argsort(d[unused])[:SENSITIVITY_CANDIDATES]]
+    basic = np.flatnonzero((x > tol) & (x < weights - tol))
+    basic_ranges = _basic_price_ranges(basic, x, weights, A_ub, b_ub, A_eq, d, ineq_duals, tol)
+    basic_pos = {int(i): row for row, i in enumerate(basic)}
+
+    lots = {}
+    for i in np.concatenate([used, candidates]):
+        i = int(i)
+        if i in basic_pos:
+            status = 'basic'
+            if basic_ranges is None:
+                low = high = None
+            else:
+                down, up = basic_ranges[basic_pos[i]]
+                low, high = prices[i] + down, prices[i] + up
+        elif x[i] >= weights[i] - tol:
+            # 库存全部用完：单价升到 c - d 之前仍然全部使用，-d 为多 1 kg 库存节省的成本
+            status, low, high = 'upper', -np.inf, prices[i] - d[i]
+        else:
+            # 未使用：单价降到 c - d 以下才会进入方案
+            status, low, high = 'lower', prices[i] - d[i], np.inf
+        lots[names[i]] = {
+            'area': areas[i],
+            'weight': float(x[i]),
+            'status': status,
+            'reduced_cost': float(d[i]) if status != 'basic' else 0.0,
+            'price': float(prices[i]),
+            'price_low': None if low is None or np.isinf(low) else float(low),
+            'price_high': None if high is None or np.isinf(high) else float(high),
+        }
+
+    return {
+        'elements': elements,
+        'weight_shadow_price': weight_shadow,
+        'lots': lots,
+    }
+
+
+def solve_blend(element_matrix, weights, prices, ranges, names, areas,
+                target_weight=None, min_weight=None, max_weight=None, time_limit=None,
+                warm_start=None, min_take=None, unit_weight=None, max_lots=None, mip_gap=None,
+                uncertainty=None, robust=None, confidence=0.95, safety_margin=None, check=None):
+    """求解最低成本配料方案
+
+    element_matrix: 废料数量 x 14 的元素含量矩阵（小数）
+    weights / prices: 各废料库存重量(kg)与单价(元/kg)
+    ranges: 产品标准的元素含量范围（百分比）
+    target_weight: 指定产量(kg)；min_weight / max_weight: 炉次装料范围(kg)
+    warm_start: 可选的 WarmStart，有上一次的最优解时先只在其用到的废料及少量候选上求解，
+    求解后更新为本次的最优解
+    min_take: 每批废料的最小取用量(kg)；unit_weight: 按整件取用时每件重量(kg)；max_lots: 最多使用的废料批数。
+    这三项可以是标量或逐批数组，设置任一项时按混合整数规划求解（不做热启动和敏感性分析），
+    mip_gap 为允许的相对间隙，time_limit 未设置时为 MILP_TIME_LIMIT
+    uncertainty: 可选的 n x 14 化验标准差（小数，见 uncertainty_matrix），给出时结果附带蒙特卡洛达标概率；
+    robust: 'box' 每批废料成分按 ±z·σ 的最坏情况满足标准，'chance' 各元素上下限按 confidence 的概率满足，
+    z 为 confidence 对应的正态分位数。confidence 对每个元素的上限、下限分别成立，全部元素同时达标的概率
+    （reliability['probability']）可能更低，抽样概率低于 confidence 时结果带 'warnings'；
+    机会约束的割平面法未收敛时 status 为 'not_converged'。
+    混合整数规划中 'chance' 按 'box' 处理，机会约束不做热启动和敏感性分析
+    safety_margin: 安全裕度（百分点），按 tighten_ranges 收窄后的范围求解，元素分析和达标概率仍按原标准计算
+    check: 可选，在多轮求解（热启动、机会约束割平面、混合整数规划）的各次求解器调用之间调用，
+    抛出异常即中止求解，用于取消计算；单次求解器调用无法中途打断，最长为 time_limit
+    """
+    element_matrix = np.asarray(element_matrix, dtype=float)
+    weights = np.clip(np.asarray(weights, dtype=float), 0, None)
+    prices = np.asarray(prices, dtype=float)
+    if uncertainty is not None:
+        uncertainty = np.asarray(uncertainty, dtype=float)
+    z = float(ndtri(confidence))
+    margin = z * uncertainty if robust in ROBUST_MODES and uncertainty is not None else None
+    chance = robust == 'chance' and margin is not None
+    limits = tighten_ranges(ranges, safety_margin) if safety_margin else ranges
+
+    # 明显无法满足的标准不必求解
+    issues = precheck(element_matrix, weights, limits, target_weight, min_weight, None if chance else margin)
+    if issues:
+        return {
+            'feasible': False,
+            'status': 'infeasible',
+            'message': "\n".join([STATUS_MESSAGES['infeasible']] + diagnosis_lines(issues)),
+            'diagnosis': {'precheck': issues}
+        }
+
+    # 所有废料在 ±z·σ 内都满足的范围在两种稳健方式下都不起约束作用
+    idx, lo, hi = binding_bounds(element_matrix, *element_bounds(limits), margin)
+    if _is_set(min_take) or _is_set(unit_weight) or _is_set(max_lots):
+        result = _solve_integer(element_matrix, weights, prices, ranges, names, areas, idx, lo, hi,
+                                target_weight, min_weight, max_weight, time_limit,
+                                min_take, unit_weight, max_lots, mip_gap, margin, uncertainty, limits, check)
+        if margin is not None and result['feasible']:
+            result['robust'] = {'mode': 'box', 'confidence': confidence, 'z': z}
+        return result
+
+    A_ratio, b_ub = ratio_constraints(element_matrix, idx, lo, hi, None if chance else margin)
+    charge_ub, charge_b, A_eq, b_eq = charge_constraints(len(weights), target_weight, min_weight, max_weight)
+    A_ub = np.vstack([A_ratio, charge_ub])
+    b_ub = np.concatenate([b_ub, charge_b])
+    bounds = np.column_stack([np.zeros_like(weights), weights])
+    signature = (tuple(idx), target_weight is None, min_weight is None, max_weight is None,
+                 robust if margin is not None else None, confidence)
+
+    options = {}
+    if time_limit:
+        options['time_limit'] = float(time_limit)
+
+    if chance:
+        def anchor():
+            # 区间稳健解一定满足机会约束
+            A_box, b_box = ratio_constraints(element_matrix, idx, lo, hi, margin)
+            res = _linprog(prices, np.vstack([A_box, charge_ub]), np.concatenate([b_box, charge_b]),
+                           A_eq, b_eq, bounds, options)
+            return res.x if res.status == 0 else None
+
+        sub = uncertainty[:, idx].T
+        code, x, rounds, converged, lower_bound = _solve_chance(prices, A_ub, b_ub, A_eq, b_eq, weights, options,
+                                                                np.vstack([sub, sub]), z, anchor, check)
+        status = SOLVER_STATUS.get(code, 'numerical_error')
+        if status == 'infeasible' and rounds == 1:
+            return _infeasible_result(element_matrix, weights, prices, limits, names,
+                                      target_weight, min_weight, max_weight, time_limit)
+        if status == 'infeasible':
+            return {
+                'feasible': False,
+                'status': status,
+                'message': STATUS_MESSAGES[status] + f"\n按名义成分可行，但无法保证各元素以 {confidence:.1%} 的概率达标，"
+                                                     "可以降低置信水平或放宽元素范围"
+            }
+        if status != 'optimal':
+            return {'feasible': False, 'status': status, 'message': STATUS_MESSAGES[status]}
+        result = build_result(x, element_matrix, prices, ranges, names, areas)
+        result['robust'] = {'mode': 'chance', 'confidence': confidence, 'z': z,
+                            'rounds': rounds, 'converged': converged, 'lower_bound': lower_bound}
+        result['reliability'] = monte_carlo_check(x, element_matrix, uncertainty, ranges)
+        warnings = reliability_warnings(result['reliability'], confidence)
+        if not converged:
+            result['status'] = 'not_converged'
+            gap = (result['total_cost'] - lower_bound) / result['total_cost'] if result['total_cost'] > 0 else 0.0
+            warnings.insert(0, STATUS_MESSAGES['not_converged'] + f"（{rounds} 轮后与成本下界相差 {gap:.2%}）")
+        if warnings:
+            result['warnings'] = warnings
+            result['message'] = "\n".join(warnings)
+        return result
+
+    # 去掉无库存、重复和被占优的批次后求解，敏感性分析仍在全部批次上进行
+    start = time.perf_counter()
+    cap = next((w for w in (target_weight, max_weight) if w is not None), float(weights.sum()))
+    rep, owner, presolve = presolve_lots(A_ratio, prices, weights, cap)
+    stock = np.bincount(owner[owner >= 0], weights=weights[owner >= 0], minlength=len(rep))
+    sub_ub, sub_eq = A_ub[:, rep], (A_eq[:, rep] if A_eq is not None else None)
+    presolve['time'] = time.perf_counter() - start
+
+    warm = None
+    state = warm_start.state if warm_start is not None else None
+    if state is not None:
+        support, (old_signature, *old_duals) = state
+        cols = np.flatnonzero(np.isin(np.asarray(names, dtype=object)[rep], support))
+        warm = _solve_warm(prices[rep], sub_ub, b_ub, sub_eq, b_eq, stock, options, cols,
+                           old_duals if old_signature == signature else None, check)
+
+    if warm is not None:
+        x, ineq, eq, rounds = warm
+        x = expand_solution(x, owner, weights)
+    else:
+        res = _linprog(prices[rep], sub_ub, b_ub, sub_eq, b_eq, np.column_stack([np.zeros(len(rep)), stock]),
+                       options)
+        status = SOLVER_STATUS.get(res.status, 'numerical_error')
+        if status == 'infeasible':
+            # 找出最少需要放宽的元素范围或废料库存
+            return _infeasible_result(element_matrix, weights, prices, limits, names,
+                                      target_weight, min_weight, max_weight, time_limit, margin)
+        if status != 'optimal':
+            return {
+                'feasible': False,
+                'status': status,
+                'message': STATUS_MESSAGES[status]
+            }
+        x = expand_solution(res.x, owner, weights)
+        ineq, eq = _marginals(res, sub_ub, sub_eq)
+
+    if warm_start is not None:
+        warm_start.update(names, x, signature, ineq, eq)
+    result = build_result(x, element_matrix, prices, ranges, names, areas)
+    result['sensitivity'] = sensitivity_report(x, weights, prices, names, areas, idx, A_ub, b_ub, A_eq, ineq, eq,
+                                               target_weight, min_weight, max_weight)
+    result['presolve'] = presolve
+    if warm is not None:
+        result['warm_start'] = {'columns': int(np.count_nonzero(x > 0)), 'rounds': rounds}
+    if margin is not None:
+        result['robust'] = {'mode': 'box', 'confidence': confidence, 'z': z}
+    if uncertainty is not None:
+        result['reliability'] = monte_carlo_check(x, element_matrix, uncertainty, ranges)
+    return result
+
+
+# 批量求解时各工作进程共享的库存数据（由 _init_batch_worker 在进程启动时写入）
+_batch_inventory = {}
+
+
+def _init_batch_worker(element_matrix, weights, prices, names, areas, uncertainty=None):
+    """工作进程初始化：库存矩阵只传输和解析一次"""
+    _batch_inventory.update(
+        element_matrix=element_matrix, weights=weights, prices=prices,
+        names=names, areas=areas, uncertainty=uncertainty
+    )
+
+
+def _solve_batch_item(standard, solve_kwargs, area=None):
+    """在工作进程中求解单个产品标准，area 不为 None 时只用该区域的废料"""
+    start = time.perf_counter()
+    inv = _batch_inventory
+    element_matrix, weights, prices = inv['element_matrix'], inv['weights'], inv['prices']
+    names, areas, uncertainty = inv['names'], inv['areas'], inv['uncertainty']
+    if area is not None:
+        rows = np.flatnonzero(np.asarray(areas, dtype=object) == area)
+        element_matrix, weights, prices = element_matrix[rows], weights[rows], prices[rows]
+        names, areas = [names[i] for i in rows], [areas[i] for i in rows]
+        uncertainty = None if uncertainty is None else uncertainty[rows]
+    try:
+        result = solve_blend(element_matrix, weights, prices, standard['ranges'], names, areas,
+                             uncertainty=uncertainty, **solve_kwargs)
+    except Exception as e:
+        result = {'feasible': False, 'status': 'error', 'message': f'计算错误: {str(e)}'}
+    return result, time.perf_counter() - start
+
+
+def comparison_row(name, result, solve_time):
+    """整理批量结果中的一行对比数据"""
+    return {
+        'name': name,
+        'feasible': result['feasible'],
+        'status': result.get('status', ''),
+        'total_cost': result.get('total_cost'),
+        'total_weight': result.get('total_weight'),
+        'avg_price': result.get('avg_price'),
+        'message': result.get('message', ''),
+        'probability': (result.get('reliability') or {}).get('probability'),
+        'solve_time': solve_time,
+        'result': result
+    }
+
+
+def _map_with_inventory(inventory, func, tasks, max_workers, report):
+    """在共享库存的进程池中对每个任务调用 func(*task)，按 tasks 顺序返回结果
+
+    max_workers 为 1 时在当前进程串行计算；每完成一个任务调用 report(完成数, 任务序号)，
+    report 抛出异常时停止计算，尚未开始的任务被取消
+    """
+    workers = min(max_workers or os.cpu_count() or 1, len(tasks))
+    outputs = [None] * len(tasks)
+    if workers <= 1:
+        _init_batch_worker(*inventory)
+        for i, task in enumerate(tasks):
+            outputs[i] = func(*task)
+            report(i + 1, i)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                                   initargs=inventory)
+        try:
+            futures = {pool.submit(func, *task): i for i, task in enumerate(tasks)}
+            for done, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
+                outputs[i] = future.result()
+                report(done, i)
+        finally:
+            # 正常结束时所有任务都已完成；中途取消时丢弃排队中的任务，不等待
+            pool.shutdown(wait=False, cancel_futures=True)
+    return outputs
+
+
+def _batch_inventory_args(element_matrix, weights, prices, names, areas, uncertainty=None):
+    """整理传给各工作进程的库存数据"""
+    return (
+        np.asarray(element_matrix, dtype=float),
+        np.asarray(weights, dtype=float),
+        np.asarray(prices, dtype=float),
+        list(names),
+        list(areas),
+        None if uncertainty is None else np.asarray(uncertainty, dtype=float)
+    )
+
+
+def solve_standards(element_matrix, weights, prices, names, areas, standards,
+                    selected=None, max_workers=None, progress=None, uncertainty=None, **solve_kwargs):
+    """针对同一份库存批量求解多个产品标准
+
+    standards: [{'name', 'ranges'}, ...]；selected: 只计算这些名称，None 表示全部
+    max_workers: 进程数，None 为 CPU 核数，1 表示在当前进程串行计算
+    progress: 可选回调 progress(percent, text)，每完成一个标准调用一次；
+    回调抛出异常时停止计算，尚未开始的标准被取消
+    uncertainty: 可选的化验标准差矩阵，与库存一起传给各工作进程
+    返回按 standards 顺序排列的对比表
+    """
+    if selected is not None:
+        selected = set(selected)
+        standards = [s for s in standards if s['name'] in selected]
+    if not standards:
+        return []
+
+    inventory = _batch_inventory_args(element_matrix, weights, prices, names, areas, uncertainty)
+    total = len(standards)
+
+    def report(done, i):
+        if progress is not None:
+            progress(done * 100 // total, f"已完成 {done}/{total}: {standards[i]['name']}")
+
+    outputs = _map_with_inventory(inventory, _solve_batch_item, [(s, solve_kwargs) for s in standards],
+                                  max_workers, report)
+    return [comparison_row(s['name'], result, solve_time)
+            for s, (result, solve_time) in zip(standards, outputs)]
+
+
+def solve_jobs(element_matrix, weights, prices, names, areas, jobs,
+               max_workers=None, progress=None, uncertainty=None):
+    """针对同一份库存批量求解多组（产品标准, 区域, 求解参数）
+
+    jobs: [(standard, area, solve_kwargs), ...]，area 为 None 时使用全部库存，否则只用该区域的废料
+    其余参数同 solve_standards；返回按 jobs 顺序排列的对比表
+    """
+    if not jobs:
+        return []
+
+    inventory = _batch_inventory_args(element_matrix, weights, prices, names, areas, uncertainty)
+    total = len(jobs)
+
+    def report(done, i):
+        if progress is not None:
+            progress(done * 100 // total, f"已完成 {done}/{total}: {jobs[i][0]['name']}")
+
+    outputs = _map_with_inventory(inventory, _solve_batch_item,
+                                  [(standard, solve_kwargs, area) for standard, area, solve_kwargs in jobs],
+                                  max_workers, report)
+    return [comparison_row(standard['name'], result, solve_time)
+            for (standard, _, _), (result, solve_time) in zip(jobs, outputs)]
+
+
+# 成本权衡曲线默认的点数，以及按批数取点时每个混合整数规划的时间上限（秒）
+PARETO_POINTS = 12
+PARETO_TIME_LIMIT = 10
+
+PARETO_AXES = {'margin': '安全裕度', 'lots': '使用批数'}
+
+
+def max_safety_margin(element_matrix, weights, ranges, target_weight=None, min_weight=None):
+    """库存能达到的最大安全裕度（百分点），按名义成分也无解时返回 None
+
+    以装料比例 y（合计为 1）为变量时，收窄 d 后的含量约束 (min + d - a)·y <= 0、(a - max + d)·y <= 0
+    对 (y, d) 是线性的，求一次 max d 即可；产量只影响每批废料能占的最大比例 库存 / 产量
+    """
+    element_matrix = np.asarray(element_matrix, dtype=float)
+    weights = np.clip(np.asarray(weights, dtype=float), 0, None)
+    idx, lo, hi = element_bounds(ranges)
+    content = element_matrix[:, idx].T
+    lower, upper = lo > 0, hi < 1
+    rows = np.vstack([lo[lower, None] - content[lower], content[upper] - hi[upper, None]])
+    if not len(rows):
+        return 0.0
+    n = len(weights)
+    required = target_weight if target_weight is not None else min_weight
+    share = weights / required if required else (weights > 0).astype(float)
+    A_ub = np.hstack([rows, np.ones((len(rows), 1))])
+    A_eq = np.append(np.ones(n), 0.0)[None, :]
+    bounds = np.column_stack([np.append(np.zeros(n), 0.0), np.append(np.minimum(share, 1.0), np.inf)])
+    c = np.append(np.zeros(n), -1.0)
+    res = _linprog(c, A_ub, np.zeros(len(rows)), A_eq, np.array([1.0]), bounds, {})
+    if res.status != 0:
+        return None
+    return float(res.x[-1] * 100)
+
+
+def _solve_sweep_chunk(ranges, chunk, solve_kwargs, state):
+    """在工作进程中依次求解一段权衡曲线上的点，从 state 开始逐点热启动"""
+    warm_start = WarmStart()
+    warm_start.state = state
+    return [_solve_batch_item({'ranges': ranges}, dict(solve_kwargs, warm_start=warm_start, **point))
+            for point in chunk]
+
+
+def _sweep_point(value, result, solve_time):
+    """整理权衡曲线上的一个点"""
+    feasible = result['feasible']
+    return {
+        'value': value,
+        'feasible': feasible,
+        'status': result.get('status', ''),
+        'total_cost': result.get('total_cost'),
+        'margin': plan_margin(result['element_analysis']) if feasible else None,
+        'lots': len(result['waste_mix']) if feasible else None,
+        'efficient': False,
+        'message': result.get('message', ''),
+        'solve_time': solve_time,
+        'result': result
+    }
+
+
+def _mark_efficient(points, axis):
+    """标出 Pareto 有效的点：没有别的点成本不高于它、同时裕度更大（或批数更少）"""
+    sign = -1 if axis == 'margin' else 1
+    feasible = [p for p in points if p['feasible']]
+    for p in feasible:
+        p['efficient'] = not any(
+            q['total_cost'] <= p['total_cost'] + 1e-6 and sign * q[axis] <= sign * p[axis] + 1e-9 and
+            (q['total_cost'] < p['total_cost'] - 1e-6 or sign * q[axis] < sign * p[axis] - 1e-9)
+            for q in feasible)
+
+
+def pareto_sweep(element_matrix, weights, prices, names, areas, ranges, axis='margin', points=PARETO_POINTS,
+                 max_workers=None, progress=None, uncertainty=None, **solve_kwargs):
+    """成本与安全裕度（axis='margin'）或使用废料批数（axis='lots'）的权衡曲线
+
+    先按当前设置求出最低成本方案作为曲线的一端。安全裕度在 0 到 max_safety_margin 之间均匀取点，
+    分成几段在进程池中并行求解，每段从最低成本方案出发、按裕度从小到大逐点热启动；
+    批数在 1 到最低成本方案用到的批数之间取点，每个点是一个限时 PARETO_TIME_LIMIT 的混合整数规划。
+    progress 与取消的约定同 solve_standards。
+    返回 {'axis', 'feasible', 'message', 'max_margin', 'points': [...按横轴从小到大]}
+    """
+    inventory = _batch_inventory_args(element_matrix, weights, prices, names, areas, uncertainty)
+    warm_start = WarmStart()
+    start = time.perf_counter()
+    base = solve_blend(*inventory[:3], ranges, *inventory[3:5], uncertainty=inventory[5],
+                       warm_start=warm_start, **solve_kwargs)
+    base_time = time.perf_counter() - start
+    sweep = {'axis': axis, 'feasible': base['feasible'], 'message': base.get('message', ''),
+             'max_margin': None, 'points': []}
+    if not base['feasible']:
+        return sweep
+
+    first = _sweep_point(0.0, base, base_time)
+    if axis == 'margin':
+        target_weight = solve_kwargs.get('target_weight')
+        top = max_safety_margin(element_matrix, weights, ranges, target_weight,
+                                solve_kwargs.get('min_weight'))
+        sweep['max_margin'] = top
+        values = [float(v) for v in np.linspace(0, top or 0, points)[1:] if v > 0]
+        # 相邻的裕度分在同一段，段内热启动最有效
+        chunks = [[{'safety_margin': v} for v in part]
+                  for part in np.array_split(values, min(len(values), 2 * (max_workers or os.cpu_count() or 1)))
+                  if len(part)] if values else []
+    else:
+        first['value'] = first['lots']
+        values = sorted({int(round(v)) for v in np.linspace(1, first['lots'], points)} - {first['lots']})
+        if values and values[0] == 1:
+            # 只用 1 批时这批废料本身必须达标，混合整数规划很难在时限内证明无解，直接检查
+            idx, lo, hi = element_bounds(ranges)
+            required = solve_kwargs.get('target_weight') or solve_kwargs.get('min_weight') or 0
+            content = inventory[0][:, idx]
+            single = np.all((content >= lo - 1e-9) & (content <= hi + 1e-9), axis=1) & (inventory[1] >= required)
+            if not (single & (inventory[1] > 0)).any():
+                values = values[1:]
+        limit = solve_kwargs.get('time_limit') or PARETO_TIME_LIMIT
+        chunks = [[{'max_lots': v, 'time_limit': limit}] for v in values]
+
+    total = len(chunks) + 1
+    if progress is not None:
+        progress(100 // total, f"已完成 1/{total}: 最低成本方案")
+
+    def report(done, i):
+        if progress is not None:
+            progress((done + 1) * 100 // total, f"已完成 {done + 1}/{total}")
+
+    outputs = _map_with_inventory(inventory, _solve_sweep_chunk,
+                                  [(ranges, chunk, solve_kwargs, warm_start.state) for chunk in chunks],
+                                  max_workers, report)
+    rest = [_sweep_point(v, result, solve_time)
+            for v, (result, solve_time) in zip(values, (item for chunk in outputs for item in chunk))]
+    sweep['points'] = sorted([first] + rest, key=lambda p: p['value'])
+    _mark_efficient(sweep['points'], axis)
+    return sweep
+
+
+def _order_groups(orders):
+    """按产品标准合并订单，同一标准内按优先级分层
+
+    同一标准的订单可以按比例共用同一个配比，所以模型规模只随标准数增长，而不随订单数增长。
+    返回 [(standard, [(priority, [订单序号, ...]), ...按优先级从高到低]), ...]
+    """
+    groups = {}
+    for o, (standard, _, priority) in enumerate(orders):
+        key = (standard['name'], json.dumps(standard['ranges'], sort_keys=True))
+        if key not in groups:
+            groups[key] = (standard, {})
+        groups[key][1].setdefault(priority, []).append(o)
+    return [(standard, sorted(levels.items(), key=lambda item: item[0], reverse=True))
+            for standard, levels in groups.values()]
+
+
+def plan_orders(element_matrix, weights, prices, names, areas, orders,
+                allow_partial=True, time_limit=None):
+    """多订单联合排产：在同一份库存上一次性求解全部订单
+
+    orders: [(standard, weight_kg, priority), ...]，priority 数值越大越优先
+    allow_partial: 库存不足时允许按优先级减产，否则必须全部满足
+
+    变量: x[g, i] 产品标准 g 使用废料 i 的重量，m[g, e] 标准 g 中元素 e 的总量，
+    s[g, q] 标准 g 在优先级 q 上的缺口。每批废料在所有订单中的用量之和不超过库存。
+    """
+    element_matrix = np.asarray(element_matrix, dtype=float)
+    weights = np.clip(np.asarray(weights, dtype=float), 0, None)
+    prices = np.asarray(prices, dtype=float)
+    n = len(weights)
+    if not orders:
+        return {'feasible': False, 'status': 'infeasible', 'message': '没有订单'}
+
+    order_weights = np.array([float(w) for _, w, _ in orders])
+    groups = _order_groups(orders)
+    n_groups = len(groups)
+    group_bounds = [binding_bounds(element_matrix, *element_bounds(standard['ranges']))
+                    for standard, _ in groups]
+    levels = [(g, priority, members) for g, (_, group_levels) in enumerate(groups)
+              for priority, members in group_levels]
+    level_weights = np.array([order_weights[members].sum() for _, _, members in levels])
+    group_weights = np.zeros(n_groups)
+    np.add.at(group_weights, [g for g, _, _ in levels], level_weights)
+
+    n_x = n_groups * n
+    n_elem = np.array([len(b[0]) for b in group_bounds])
+    m_offset = n_x + np.concatenate([[0], np.cumsum(n_elem)])
+    s_start = int(m_offset[-1])
+    n_vars = s_start + len(levels)
+
+    eq_r, eq_c, eq_v, eq_b = [], [], [], []
+    ub_r, ub_c, ub_v, ub_b = [], [], [], []
+
+    # 产量: sum_i x[g, i] + sum_q s[g, q] = W[g]
+    eq_r += [np.repeat(np.arange(n_groups), n), [g for g, _, _ in levels]]
+    eq_c += [np.arange(n_x), s_start + np.arange(len(levels))]
+    eq_v += [np.ones(n_x), np.ones(len(levels))]
+    eq_b.append(group_weights)
+    n_eq = n_groups
+
+    # 库存共享: sum_g x[g, i] <= w[i]
+    ub_r.append(np.tile(np.arange(n), n_groups))
+    ub_c.append(np.arange(n_x))
+    ub_v.append(np.ones(n_x))
+    ub_b.append(weights)
+    n_ub = n
+
+    for g, (idx, lo, hi) in enumerate(group_bounds):
+        k = len(idx)
+        if k == 0:
+            continue
+        m_cols = m_offset[g] + np.arange(k)
+        s_cols = s_start + np.array([j for j, level in enumerate(levels) if level[0] == g])
+
+        # 元素总量: m[g, e] - sum_i a[i, e] x[g, i] = 0
+        rows = n_eq + np.arange(k)
+        eq_r += [np.repeat(rows, n), rows]
+        eq_c += [np.tile(g * n + np.arange(n), k), m_cols]
+        eq_v += [-element_matrix[:, idx].T.ravel(), np.ones(k)]
+        eq_b.append(np.zeros(k))
+        n_eq += k
+
+        # 含量范围: lo * (W - sum s) <= m <= hi * (W - sum s)
+        for sign, bound in ((-1.0, lo), (1.0, hi)):
+            rows = n_ub + np.arange(k)
+            ub_r += [rows, np.repeat(rows, len(s_cols))]
+            ub_c += [m_cols, np.tile(s_cols, k)]
+            ub_v += [np.full(k, sign), np.repeat(sign * bound, len(s_cols))]
+            ub_b.append(sign * bound * group_weights[g])
+            n_ub += k
+
+    bounds = np.zeros((n_vars, 2))
+    bounds[:, 1] = np.inf
+    bounds[:n_x, 1] = np.tile(weights, n_groups)
+    bounds[s_start:, 1] = level_weights if allow_partial else 0
+
+    options = {}
+    if time_limit:
+        options['time_limit'] = float(time_limit)
+
+    A_ub = sparse.csr_matrix((np.concatenate(ub_v), (np.concatenate(ub_r), np.concatenate(ub_c))),
+                             shape=(n_ub, n_vars))
+    b_ub = np.concatenate(ub_b)
+    A_eq = sparse.csr_matrix((np.concatenate(eq_v), (np.concatenate(eq_r), np.concatenate(eq_c))),
+                             shape=(n_eq, n_vars))
+    b_eq = np.concatenate(eq_b)
+
+    # 按优先级从高到低逐层求解：先使本层缺口最小，再把该缺口作为约束固定下来，
+    # 低优先级的产量再多也不能挤占高优先级订单；最后在固定的缺口下求最低成本
+    stages = []
+    if allow_partial:
+        for priority in sorted({p for _, p, _ in levels}, reverse=True):
+            cols = s_start + np.array([j for j, level in enumerate(levels) if level[1] == priority])
+            stages.append(cols)
+    stages.append(None)
+
+    # 最后一轮缺口仍按高于任何废料单价计价，不会为了省钱用掉上面留出的余量
+    penalty = np.max(prices, initial=0) + 1.0
+    fixed_rows = []
+    for cols in stages:
+        if cols is None:
+            c = np.concatenate([np.tile(prices, n_groups), np.zeros(s_start - n_x), np.full(len(levels), penalty)])
+        else:
+            c = np.zeros(n_vars)
+            c[cols] = 1.0
+        res = linprog(
+            c,
+            A_ub=sparse.vstack([A_ub] + [row for row, _ in fixed_rows], format='csr'),
+            b_ub=np.concatenate([b_ub, [bound for _, bound in fixed_rows]]),
+            A_eq=A_eq,
+            b_eq=b_eq,
+            bounds=bounds,
+            method='highs',
+            options=options
+        )
+
+        status = SOLVER_STATUS.get(res.status, 'numerical_error')
+        if status != 'optimal':
+            return {
+                'feasible': False,
+                'status': status,
+                'message': STATUS_MESSAGES[status]
+            }
+        if cols is not None:
+            # 留出与需求量成比例的极小余量，避免数值误差使下一层不可行
+            row = sparse.csr_matrix((np.ones(len(cols)), (np.zeros(len(cols), dtype=int), cols)),
+                                    shape=(1, n_vars))
+            fixed_rows.append((row, res.fun + 1e-9 * max(level_weights[cols - s_start].sum(), 1.0)))
+
+    # 按优先级把各标准的产量分配给订单，同一层内按订单重量比例分配
+    x_groups = res.x[:n_x].reshape(n_groups, n)
+    produced = np.zeros(len(orders))
+    for j, (g, _, members) in enumerate(levels):
+        filled = level_weights[j] - res.x[s_start + j]
+        produced[members] = order_weights[members] * (filled / level_weights[j] if level_weights[j] > 0 else 0)
+
+    order_results = [None] * len(orders)
+    for g, (standard, group_levels) in enumerate(groups):
+        group_total = x_groups[g].sum()
+        for _, members in group_levels:
+            for o in members:
+                share = produced[o] / group_total if group_total > 0 else 0
+                result = build_result(x_groups[g] * share, element_matrix, prices,
+                                      standard['ranges'], names, areas)
+                result.update(
+                    standard=standard['name'],
+                    order_weight=float(order_weights[o]),
+                    priority=orders[o][2],
+                    shortfall=float(order_weights[o] - produced[o]),
+                    fulfilled=bool(order_weights[o] - produced[o] <= 1e-6 * max(order_weights[o], 1.0))
+                )
+                order_results[o] = result
+
+    used = x_groups.sum(axis=0)
+    lot_usage = {}
+    for i in np.flatnonzero(used > 0.001):
+        lot_usage[names[i]] = {
+            'used': float(used[i]),
+            'stock': float(weights[i]),
+            'area': areas[i]
+        }
+
+    return {
+        'feasible': True,
+        'status': 'optimal',
+        'total_cost': float(np.dot(used, prices)),
+        'orders': order_results,
+        'lot_usage': lot_usage
+    }
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成方案求解结果缓存
+键为筛选后库存数组、产品标准范围、区域和产量设置的哈希，库存或标准有任何变化键就不同，
+旧结果不会再被命中，由 LRU 自然淘汰；可选把缓存保存到本地文件，重启程序后仍然有效。
+新结果先只记在内存中，稍后（或批量计算结束、程序退出时）统一写入文件
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# 结果结构变化时加一，旧的缓存文件随之失效
+CACHE_VERSION = 5
+
+SOLVER_CACHE_CONFIG = {
+    "max_entries": 256,
+    "persist_path": os.path.join(os.path.expanduser("~"), ".recycle_mind", "solver_cache.json"),
+    "save_delay": 5.0,   # 有新结果后最多等待此秒数写入缓存文件
+}
+
+# 与输入一一对应的求解状态才缓存，达到时间上限等结果下次可能不同
+CACHEABLE_STATUS = ('optimal', 'infeasible', 'unbounded')
+
+
+def inventory_fingerprint(element_matrix, weights, prices, names, areas, uncertainty=None):
+    """库存数组的指纹"""
+    digest = hashlib.blake2b(digest_size=16)
+    arrays = (element_matrix, weights, prices) if uncertainty is None else (element_matrix, weights, prices, uncertainty)
+    for array in arrays:
+        array = np.ascontiguousarray(array, dtype=float)
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+    for values in (names, areas):
+        digest.update("\0".join(map(str, values)).encode('utf-8'))
+        digest.update(b"\1")
+    return digest.hexdigest()
+
+
+def solve_key(inventory_key, ranges, area, **solve_kwargs):
+    """一次求解的缓存键"""
+    payload = json.dumps([CACHE_VERSION, inventory_key, ranges, area, solve_kwargs],
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class SolverCache:
+    """线程安全的 LRU 结果缓存，get() 每次返回新的副本，调用方可以随意修改"""
+
+    def __init__(self, max_entries=256, persist_path=None, save_delay=5.0):
+        self.max_entries = max_entries
+        self.persist_path = persist_path
+        self.save_delay = save_delay
+        self._entries = OrderedDict()  # 键 -> 结果 JSON 字符串
+        self._lock = threading.Lock()
+        # 写文件时不持有 _lock，读缓存的线程不用等待磁盘；多个写入按顺序进行
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._timer = None
+        self._loaded = persist_path is None
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    def get(self, key):
+        """命中时返回结果字典（带 cached=True），否则返回 None"""
+        with self._lock:
+            self._load()
+            text = self._entries.get(key)
+            if text is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+        result = json.loads(text)
+        result['cached'] = True
+        return result
+
+    def put(self, key, result):
+        """保存结果；不可缓存的状态直接忽略"""
+        if result.get('status') not in CACHEABLE_STATUS:
+            return
+        text = json.dumps(result, ensure_ascii=False)
+        with self._lock:
+            self._load()
+            self._entries[key] = text
+            self._entries.move_to_end(key)
+            self._stats['stores'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+            self._mark_dirty()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._loaded = True
+            self._mark_dirty()
+        self.save()
+
+    def save(self):
+        """把有变化的缓存写入文件；批量计算结束时调用，其余时候由定时器和程序退出时调用"""
+        if not self.persist_path:
+            return
+        with self._save_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self._dirty:
+                    return
+                self._dirty = False
+                entries = list(self._entries.items())
+            if not self._write(entries):
+                with self._lock:
+                    self._dirty = True
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(entries=len(self._entries), max_entries=self.max_entries)
+        return stats
+
+    def _load(self):
+        """首次使用时读取缓存文件（调用方持有锁），文件损坏或版本不符时忽略"""
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.persist_path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == CACHE_VERSION:
+                self._entries.update((key, text) for key, text in data['entries'][-self.max_entries:])
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"读取求解缓存失败，已忽略: {e}")
+
+    def _mark_dirty(self):
+        """记下缓存有变化，save_delay 秒后写入文件（调用方持有锁）"""
+        if not self.persist_path:
+            return
+        self._dirty = True
+        if self._timer is None:
+            self._timer = threading.Timer(self.save_delay, self.save)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _write(self, entries):
+        """按 LRU 顺序写入缓存文件，先写临时文件再替换，中途退出不会损坏；返回是否成功"""
+        try:
+            os.makedirs(os.path.dirname(self.persist_path), exist_ok=True)
+            partial = self.persist_path + ".tmp"
+            with open(partial, 'w', encoding='utf-8') as f:
+                json.dump({'version': CACHE_VERSION, 'entries': entries}, f, ensure_ascii=False)
+            os.replace(partial, self.persist_path)
+            return True
+        except Exception as e:
+            print(f"保存求解缓存失败: {e}")
+            return False
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_solver_cache():
+    """全局求解缓存（首次使用时创建）"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SolverCache(**SOLVER_CACHE_CONFIG)
+                atexit.register(_cache.save)
+    return _cache
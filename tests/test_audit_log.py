@@ -0,0 +1,96 @@
+import json
+
+import pymysql
+
+from audit_log import AuditLogWriter
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def executemany(self, sql, rows):
+        if self.conn.down:
+            raise pymysql.err.OperationalError(2003, "连接失败")
+        for row in rows:
+            # 模拟 operation_logs.user_id 的外键
+            if row[0] == 999:
+                raise pymysql.err.IntegrityError(1452, "foreign key constraint fails")
+            self.conn.pending.append(tuple(row))
+
+
+class FakeConnection:
+    def __init__(self):
+        self.rows = []
+        self.pending = []
+        self.down = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def begin(self):
+        self.pending = []
+
+    def commit(self):
+        self.rows += self.pending
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+
+    def close(self):
+        pass
+
+
+def _event(user_id, operation):
+    return [user_id, 'admin', operation, '', None, '2024-01-01 00:00:00']
+
+
+def test_bad_spill_lines_do_not_block_later_flushes(tmp_path):
+    spill = tmp_path / "audit_spill.jsonl"
+    with open(spill, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(_event(1, '暂存1'), ensure_ascii=False) + "\n")
+        f.write(json.dumps(_event(999, '用户已删除'), ensure_ascii=False) + "\n")
+        f.write(json.dumps(_event(1, '暂存2'), ensure_ascii=False) + "\n")
+        f.write('[1, "admin", "写到一')  # 追加到一半时退出
+    conn = FakeConnection()
+    writer = AuditLogWriter(connect=lambda: conn, spill_path=str(spill))
+
+    writer.log(1, 'admin', '新日志')
+    assert writer.flush()
+
+    assert [row[2] for row in conn.rows] == ['暂存1', '暂存2', '新日志']
+    assert not spill.exists()
+    rejected = (tmp_path / "audit_spill.jsonl.rejected").read_text(encoding='utf-8').splitlines()
+    assert len(rejected) == 2
+    stats = writer.stats()
+    assert stats['replayed'] == 2 and stats['rejected'] == 2 and stats['written'] == 3
+
+    writer.log(1, 'admin', '之后的日志')
+    assert writer.flush()
+    assert conn.rows[-1][2] == '之后的日志'
+    writer.close()
+
+
+def test_spill_is_kept_while_database_is_down(tmp_path):
+    spill = tmp_path / "audit_spill.jsonl"
+    conn = FakeConnection()
+    conn.down = True
+    writer = AuditLogWriter(connect=lambda: conn, spill_path=str(spill), retry_interval=0)
+
+    writer.log(1, 'admin', '第一条')
+    assert writer.flush()
+    assert spill.exists() and not conn.rows
+
+    conn.down = False
+    writer.log(1, 'admin', '第二条')
+    assert writer.flush()
+    assert [row[2] for row in conn.rows] == ['第一条', '第二条']
+    assert not spill.exists()
+    writer.close()
@@ -0,0 +1,214 @@
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pytest
+
+import backup
+import waste_sync
+
+
+class RecordingConnection:
+    """记录执行的语句，fail 中的语句抛出异常"""
+
+    def __init__(self, log, fail=()):
+        self.log = log
+        self.fail = fail
+        self.closed = False
+
+    @contextmanager
+    def cursor(self):
+        yield self
+
+    def execute(self, query, params=None):
+        self.log.append((query, params))
+        if any(query.startswith(prefix) for prefix in self.fail):
+            raise RuntimeError(f"{query} 失败")
+
+    def fetchone(self):
+        return (50,)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.mark.parametrize("fail, locked", [((), True), (("FLUSH",), False)])
+def test_open_snapshots_restores_lock_wait_timeout(fail, locked):
+    log, workers = [], []
+
+    def connect():
+        workers.append(RecordingConnection([]))
+        return workers[-1]
+    conn = RecordingConnection(log, fail)
+    conns, result, was_locked = backup._open_snapshots(conn, connect, 2, lambda: "watermark")
+
+    assert (result, was_locked, conns) == ("watermark", locked, workers)
+    assert log[-1] == ("SET SESSION lock_wait_timeout = %s", (50,))
+    assert (("UNLOCK TABLES", None) in log) == locked
+    assert all(worker.log[-1][0] == "START TRANSACTION WITH CONSISTENT SNAPSHOT" for worker in workers)
+
+
+def test_open_snapshots_closes_workers_on_error():
+    log, workers = [], []
+
+    def connect():
+        if workers:
+            raise RuntimeError("连接池已满")
+        workers.append(RecordingConnection([]))
+        return workers[-1]
+    with pytest.raises(RuntimeError):
+        backup._open_snapshots(RecordingConnection(log), connect, 2, lambda: None)
+    assert workers[0].closed
+    assert log[-2:] == [("UNLOCK TABLES", None), ("SET SESSION lock_wait_timeout = %s", (50,))]
+
+
+class MySQLStandIn:
+    """sqlite3 数据库文件上的 MySQL 替身，只改写备份和恢复用到的几种 MySQL 语句，
+    没有全局读锁（FLUSH TABLES 失败，与没有 RELOAD 权限时相同）"""
+
+    def __init__(self, path):
+        self.raw = sqlite3.connect(path, check_same_thread=False)
+
+    def cursor(self, cursor_class=None):
+        return StandInCursor(self.raw)
+
+    def begin(self):
+        pass
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        self.raw.close()
+
+
+class StandInCursor:
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, query, params=None):
+        query = " ".join(query.split())
+        self.rows = None
+        if query.startswith(("SET ", "START TRANSACTION", "SELECT @@")):
+            return
+        if query.startswith("FLUSH TABLES"):
+            raise sqlite3.OperationalError("Access denied; you need the RELOAD privilege")
+        if query == "SELECT NOW(6)":
+            self.rows = [(_now(),)]
+            return
+        tables = [row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        if "information_schema.TABLES" in query:
+            self.rows = [(t, self.conn.execute(f"SELECT COUNT(*) FROM `{t}`").fetchone()[0]) for t in tables]
+            return
+        if "information_schema.COLUMNS" in query:
+            self.rows = [(t, row[1]) for t in tables for row in self.conn.execute(f"PRAGMA table_info(`{t}`)")]
+            return
+        query = re.sub(r"%s - INTERVAL (\d+) SECOND", r"datetime(%s, '-\1 seconds')", query)
+        self.cursor.execute(query.replace("%s", "?"), tuple(params or ()))
+
+    def executemany(self, query, rows):
+        self.cursor.executemany(query.replace("%s", "?"), [tuple(row) for row in rows])
+
+    @property
+    def description(self):
+        return self.cursor.description
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows is not None else self.cursor.fetchone()
+
+    def fetchall(self):
+        return self.rows if self.rows is not None else self.cursor.fetchall()
+
+    def fetchmany(self, size):
+        return self.cursor.fetchmany(size)
+
+    def close(self):
+        self.cursor.close()
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+SCHEMA = """
+CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT);
+CREATE TABLE wastes (名称 TEXT PRIMARY KEY, 区域 TEXT, 重量 REAL, updated_at TEXT);
+CREATE TABLE waste_deletions (名称 TEXT PRIMARY KEY,
+                              deleted_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')));
+CREATE TABLE product_standards (id INTEGER PRIMARY KEY, name TEXT, ranges TEXT);
+CREATE TABLE operation_logs (id INTEGER PRIMARY KEY, operation TEXT);
+CREATE TABLE backup_logs (id INTEGER PRIMARY KEY, backup_name TEXT, backup_path TEXT, backup_size INTEGER,
+                          created_by INTEGER, status TEXT DEFAULT 'success', backup_type TEXT DEFAULT 'full',
+                          parent_path TEXT, watermarks TEXT, duration_seconds REAL, source TEXT DEFAULT 'manual');
+"""
+
+
+def _snapshot(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {table: sorted(conn.execute(f"SELECT * FROM `{table}`").fetchall())
+                for table in ('users', 'wastes', 'product_standards', 'operation_logs')}
+    finally:
+        conn.close()
+
+
+def test_backup_restore_round_trip_with_incremental_chain(tmp_path):
+    path = str(tmp_path / "recycle_mind.db")
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    db.execute("INSERT INTO users VALUES (1, 'admin')")
+    db.executemany("INSERT INTO wastes VALUES (?, ?, ?, ?)",
+                   [(f"w{i}", 'A区', 100.0 * i, '2026-01-01 00:00:00.000000') for i in range(50)])
+    db.execute("INSERT INTO product_standards VALUES (1, 'ADC12', '{}')")
+    db.executemany("INSERT INTO operation_logs (operation) VALUES (?)", [(f"op{i}",) for i in range(30)])
+    db.commit()
+    connect = lambda: MySQLStandIn(path)
+
+    full_file = str(tmp_path / "full.zip")
+    manifest = backup.create_backup(full_file, connect=connect, chunk_rows=7, workers=2)
+    assert manifest['type'] == 'full' and not manifest['consistent']
+    conn = connect()
+    backup.record_backup(conn, manifest, full_file, 1)
+    conn.close()
+
+    # 修改、删除、新增废料，追加日志，然后做增量备份
+    time.sleep(0.01)
+    db.execute("UPDATE wastes SET 重量 = 1, updated_at = ? WHERE 名称 = 'w3'", (_now(),))
+    db.execute("DELETE FROM wastes WHERE 名称 = 'w4'")
+    db.execute("INSERT INTO waste_deletions (名称) VALUES ('w4')")
+    db.execute("INSERT INTO wastes VALUES ('new', 'B区', 5, ?)", (_now(),))
+    db.executemany("INSERT INTO operation_logs (operation) VALUES (?)", [(f"later{i}",) for i in range(5)])
+    db.commit()
+    incremental_file = str(tmp_path / "incremental.zip")
+    manifest = backup.create_backup(incremental_file, 'incremental', connect=connect, chunk_rows=7, workers=2)
+    assert manifest['type'] == 'incremental'
+    assert manifest['tables']['operation_logs']['rows'] == 5
+    assert manifest['tables']['wastes']['mode'] == 'upsert' and manifest['tables']['wastes']['deleted'] == 1
+    expected = _snapshot(path)
+
+    # 之后的修改应被恢复撤销
+    db.execute("DELETE FROM wastes WHERE 名称 LIKE 'w1%'")
+    db.execute("UPDATE product_standards SET name = 'changed'")
+    db.execute("DELETE FROM operation_logs")
+    db.commit()
+
+    result = backup.restore_backup(incremental_file, connect=connect, batch_rows=8)
+    assert result['chain'] == [full_file, incremental_file]
+    assert _snapshot(path) == expected
+    assert db.execute("SELECT COUNT(*) FROM waste_deletions WHERE 名称 = ?",
+                      (waste_sync.RESTORE_MARKER,)).fetchone()[0] == 1
+    db.close()
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+import blend_batch
+
+
+def test_load_jobs_reports_every_invalid_item(tmp_path):
+    path = tmp_path / "jobs.json"
+    path.write_text(json.dumps([
+        {'standard': 'ADC12', 'target_weight': 5000},
+        {'standard': 'ADC12', 'target_weight': -1},
+        {'target_weight': 5000},
+        {'standard': 'A380', 'min_weight': 8000, 'max_weight': 3000},
+        {'standard': 'A380', 'max_lots': 2.5, 'target_weight': 5000},
+        {'standard': 'A380'},
+    ]), encoding='utf-8')
+    with pytest.raises(ValueError) as e:
+        blend_batch.load_jobs(str(path))
+    lines = str(e.value).splitlines()[1:]
+    assert [line.split(":")[0] for line in lines] == ["第 2 项", "第 3 项", "第 4 项", "第 5 项", "第 6 项"]
+
+
+def test_load_jobs(tmp_path):
+    path = tmp_path / "jobs.json"
+    path.write_text(json.dumps([{'standard': 'ADC12', 'area': 'A区', 'min_weight': 800, 'max_weight': 1200}]),
+                    encoding='utf-8')
+    assert blend_batch.load_jobs(str(path)) == [
+        {'standard': 'ADC12', 'area': 'A区', 'options': {'min_weight': 800, 'max_weight': 1200}}]
+
+
+@pytest.mark.parametrize("argv", [
+    [],
+    ["--weights", "0"],
+    ["--weights", "5000", "-100"],
+    ["--weights", "5000", "--max-lots", "0"],
+    ["--weights", "5000", "--default-uncertainty", "-0.1"],
+])
+def test_invalid_arguments_fail_before_connecting(argv, monkeypatch):
+    def connect():
+        raise AssertionError("参数无效时不应连接数据库")
+    monkeypatch.setattr(blend_batch, "get_db_conn", connect)
+    with pytest.raises(SystemExit) as e:
+        blend_batch.main(argv)
+    assert e.value.code == 2
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import waste_sync
+from blend_planner import BlendPlanner
+
+START = datetime(2026, 1, 1, 8, 0, 0)
+
+
+def _row(name, area='A', weight=1000):
+    return (name, area, 8, 0.5, 3, 0.2, 0.1, 0.5, 0.05, 0, 0, 0, 0, 0, 0, 87.65, weight, 15)
+
+
+@pytest.fixture
+def planner(monkeypatch):
+    db = {'rows': [_row('a'), _row('b')], 'changes': [], 'deleted': [], 'full_loads': 0}
+
+    def fetch_all(conn, uncertainty=False, snapshot=True):
+        db['full_loads'] += 1
+        return list(db['rows']), START
+    monkeypatch.setattr(waste_sync, 'ensure_sync_schema', lambda conn: True)
+    monkeypatch.setattr(waste_sync, 'ensure_uncertainty_schema', lambda conn: False)
+    monkeypatch.setattr(waste_sync, 'fetch_all', fetch_all)
+    monkeypatch.setattr(waste_sync, 'fetch_changes',
+                        lambda conn, since, uncertainty=False: (db['changes'], db['deleted'],
+                                                                since + timedelta(seconds=1)))
+    planner = BlendPlanner()
+    planner.load_inventory(None)
+    return planner, db
+
+
+def test_sync_applies_changes(planner):
+    planner, db = planner
+    db['changes'], db['deleted'] = [_row('c', weight=500)], ['a']
+    assert planner.sync_inventory(None)[0] is planner.inventory
+    assert sorted(planner.inventory.names) == ['b', 'c']
+    assert db['full_loads'] == 1
+
+
+def test_sync_reloads_after_restore(planner):
+    planner, db = planner
+    before = planner.inventory
+    # 恢复后的行保留旧的 updated_at，增量查询取不到，只能看到恢复标记
+    db['rows'] = [_row('x'), _row('y'), _row('z')]
+    db['deleted'] = [waste_sync.RESTORE_MARKER]
+    assert planner.sync_inventory(None) is None
+    assert planner.inventory is not before
+    assert sorted(planner.inventory.names) == ['x', 'y', 'z']
+    assert db['full_loads'] == 2
+    assert planner.watermark == START
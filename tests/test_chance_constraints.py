@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+import optimizer
+from optimizer import ELEMENT_FIELDS, solve_blend
+
+
+def _problem(n=60, seed=1):
+    rng = np.random.default_rng(seed)
+    element_matrix = np.zeros((n, len(ELEMENT_FIELDS)))
+    element_matrix[:, 0] = rng.uniform(0.05, 0.12, n)
+    element_matrix[:, 1] = rng.uniform(0.01, 0.05, n)
+    weights = rng.uniform(500, 3000, n)
+    prices = rng.uniform(10, 20, n)
+    ranges = {ELEMENT_FIELDS[0]: {'min': 8, 'max': 9}, ELEMENT_FIELDS[1]: {'min': 2.5, 'max': 3.5}}
+    return element_matrix, weights, prices, ranges, [f"w{i}" for i in range(n)], ['A'] * n
+
+
+def _solve(**kwargs):
+    element_matrix, weights, prices, ranges, names, areas = _problem()
+    return solve_blend(element_matrix, weights, prices, ranges, names, areas, target_weight=5000,
+                       uncertainty=element_matrix * 0.08, robust='chance', confidence=0.95, **kwargs)
+
+
+def test_converged_chance_solution():
+    result = _solve()
+    assert result['status'] == 'optimal'
+    assert result['robust']['converged']
+    assert result['total_cost'] >= result['robust']['lower_bound'] - 1e-6
+
+
+def test_round_limit_reports_not_converged(monkeypatch):
+    monkeypatch.setattr(optimizer, 'ROBUST_ROUNDS', 1)
+    result = _solve()
+    assert result['feasible']
+    assert result['status'] == 'not_converged'
+    assert not result['robust']['converged']
+    assert result['warnings'][0].startswith(optimizer.STATUS_MESSAGES['not_converged'])
+
+
+def test_warnings_when_sampled_probability_is_below_confidence():
+    reliability = {'samples': 100, 'probability': 0.85,
+                   'elements': {'Si': {'probability': 0.9}, 'Cu': {'probability': 0.99}}}
+    warnings = optimizer.reliability_warnings(reliability, 0.95)
+    assert len(warnings) == 2
+    assert "Si 90.0%" in warnings[0] and "Cu" not in warnings[0]
+    assert optimizer.reliability_warnings(
+        dict(reliability, probability=0.97, elements={'Cu': {'probability': 0.99}}), 0.95) == []
+
+
+def test_chance_result_carries_warnings():
+    # 硅的上下限都起作用，各自 95% 时硅整体和全部元素同时达标的概率都低于 95%
+    result = _solve()
+    assert result['reliability']['probability'] < 0.95
+    assert result['message'] == "\n".join(result['warnings'])
+    assert any("不是联合概率" in warning for warning in result['warnings'])
+
+
+def test_check_aborts_between_rounds():
+    class Stop(Exception):
+        pass
+    calls = []
+
+    def check():
+        calls.append(1)
+        if len(calls) == 2:
+            raise Stop()
+    with pytest.raises(Stop):
+        _solve(check=check)
+    assert len(calls) == 2
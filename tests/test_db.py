@@ -0,0 +1,143 @@
+import threading
+
+import pytest
+from pymysql.constants import SERVER_STATUS
+
+import db
+from db import ConnectionPool
+
+
+class FakeConnection:
+    """记录调用的连接，只实现连接池用到的方法"""
+
+    def __init__(self, **config):
+        self.config = config
+        self.open = True
+        self.server_status = 0
+        self._autocommit = config.get('autocommit', False)
+        self.alive = True
+        self.rollbacks = 0
+
+    def get_autocommit(self):
+        return self._autocommit
+
+    def autocommit(self, value):
+        self._autocommit = value
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.server_status &= ~SERVER_STATUS.SERVER_STATUS_IN_TRANS
+
+    def ping(self, reconnect=False):
+        if not self.alive:
+            raise ConnectionError("server has gone away")
+
+    def close(self):
+        self.open = False
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(db.time, 'monotonic', clock)
+    return clock
+
+
+def _pool(**kwargs):
+    created = []
+
+    def connect(**config):
+        created.append(FakeConnection(**config))
+        return created[-1]
+
+    options = dict(max_size=2, max_idle=300, health_check_interval=30, acquire_timeout=0.05)
+    options.update(kwargs)
+    return ConnectionPool({'autocommit': True}, connect=connect, **options), created
+
+
+def test_checkout_and_return_reuses_connection(clock):
+    pool, created = _pool()
+    with pool.connection() as conn:
+        first = conn.raw
+        assert pool.stats()['in_use'] == 1
+    # 归还后不能再使用
+    with pytest.raises(db.pymysql.err.InterfaceError):
+        conn.cursor()
+    with pool.connection() as conn:
+        assert conn.raw is first
+    stats = pool.stats()
+    assert len(created) == 1 and first.open
+    assert (stats['created'], stats['reused'], stats['checkouts']) == (1, 1, 2)
+    assert (stats['size'], stats['idle'], stats['in_use']) == (1, 1, 0)
+
+
+def test_return_rolls_back_open_transaction(clock):
+    pool, created = _pool()
+    conn = pool.acquire()
+    conn.raw.server_status |= SERVER_STATUS.SERVER_STATUS_IN_TRANS
+    conn.raw.autocommit(False)
+    conn.close()
+    assert created[0].rollbacks == 1 and created[0].get_autocommit()
+    assert pool.stats()['idle'] == 1
+
+
+def test_broken_connection_is_discarded_on_return(clock):
+    pool, created = _pool()
+    conn = pool.acquire()
+    conn.raw.open = False
+    conn.close()
+    stats = pool.stats()
+    assert (stats['size'], stats['closed_broken']) == (0, 1)
+    with pool.connection() as conn:
+        assert conn.raw is not created[0]
+
+
+def test_full_pool_waits_then_times_out():
+    pool, _ = _pool(max_size=1)
+    held = pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+    assert pool.stats()['waits'] >= 1
+
+    # 其他线程归还后等待的一方拿到同一个连接
+    timer = threading.Timer(0.1, held.close)
+    timer.start()
+    conn = pool.acquire(timeout=5)
+    timer.join()
+    assert pool.stats()['reused'] == 1
+    conn.close()
+
+
+def test_idle_connections_are_evicted(clock):
+    pool, created = _pool()
+    a, b = pool.acquire(), pool.acquire()
+    a.close()
+    clock.now += 200
+    b.close()
+    clock.now += 150
+    # a 空闲 350 秒被关闭，b 空闲 150 秒仍可复用（超过检查间隔，先 ping）
+    with pool.connection() as conn:
+        assert conn.raw is created[1]
+    stats = pool.stats()
+    assert not created[0].open and stats['closed_idle'] == 1
+    assert stats['health_checks'] == 1 and stats['size'] == 1
+
+
+def test_dead_idle_connection_is_replaced_after_health_check(clock):
+    pool, created = _pool()
+    pool.acquire().close()
+    created[0].alive = False
+    clock.now += 60
+    with pool.connection() as conn:
+        assert conn.raw is created[1]
+    stats = pool.stats()
+    assert not created[0].open
+    assert (stats['health_checks'], stats['closed_broken'], stats['created'], stats['size']) == (1, 1, 2, 1)
@@ -0,0 +1,50 @@
+import numpy as np
+
+from optimizer import ELEMENT_FIELDS, solve_blend
+
+
+def _lot(**content):
+    row = np.zeros(len(ELEMENT_FIELDS))
+    for element, percent in content.items():
+        row[ELEMENT_FIELDS.index(element)] = percent / 100.0
+    row[ELEMENT_FIELDS.index('Al')] = 1.0 - row.sum()
+    return row
+
+
+def _solve(element_matrix, weights, ranges, **kwargs):
+    n = len(weights)
+    return solve_blend(element_matrix, np.array(weights, dtype=float), np.linspace(10, 12, n), ranges,
+                       [f"w{i}" for i in range(n)], ['A'] * n, **kwargs)
+
+
+def test_precheck_reports_short_stock():
+    result = _solve(np.array([_lot(Cu=3), _lot(Cu=2)]), [400, 500], {'Cu': {'min': 2, 'max': 3}},
+                    target_weight=1000)
+    assert not result['feasible']
+    assert result['diagnosis']['precheck'] == [{'type': 'stock', 'required': 1000.0, 'available': 900.0}]
+
+
+def test_precheck_reports_unreachable_bounds():
+    result = _solve(np.array([_lot(Cu=3, Fe=0.5), _lot(Cu=1, Fe=0.9)]), [1000, 1000],
+                    {'Cu': {'min': 4, 'max': 5}, 'Fe': {'min': 0, 'max': 0.3}}, target_weight=1000)
+    issues = {(item['element'], item['bound']): item for item in result['diagnosis']['precheck']}
+    assert issues.keys() == {('Cu', 'min'), ('Fe', 'max')}
+    assert abs(issues['Cu', 'min']['achievable'] - 3.0) < 1e-6
+    assert abs(issues['Fe', 'max']['achievable'] - 0.5) < 1e-6
+
+
+def test_elastic_diagnosis_suggestions_make_standard_feasible():
+    # 各元素单独都能达到，但高硅的废料铁也高，两个条件不能同时满足，预检查发现不了
+    element_matrix = np.array([_lot(Si=10, Fe=1.0), _lot(Si=5, Fe=0.2)])
+    ranges = {'Si': {'min': 8, 'max': 12}, 'Fe': {'min': 0, 'max': 0.4}}
+    result = _solve(element_matrix, [5000, 5000], ranges, target_weight=1000)
+    assert not result['feasible']
+    assert 'precheck' not in result['diagnosis']
+    relaxations = result['diagnosis']['relaxations']
+    assert relaxations and all(item['type'] == 'element' for item in relaxations)
+
+    relaxed = {element: dict(bounds) for element, bounds in ranges.items()}
+    for item in relaxations:
+        relaxed[item['element']][item['bound']] = item['suggested']
+    assert _solve(element_matrix, [5000, 5000], relaxed, target_weight=1000)['feasible']
+
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from optimizer import ELEMENT_FIELDS, solve_blend
+
+RANGES = {'Si': {'min': 7, 'max': 8}, 'Cu': {'min': 2, 'max': 3}, 'Fe': {'min': 0, 'max': 0.8}}
+
+
+def _inventory(n=80, seed=7):
+    rng = np.random.default_rng(seed)
+    element_matrix = np.zeros((n, len(ELEMENT_FIELDS)))
+    for element, low, high in (('Si', 4, 11), ('Cu', 0.5, 4.5), ('Fe', 0.2, 1.2)):
+        element_matrix[:, ELEMENT_FIELDS.index(element)] = rng.uniform(low, high, n) / 100
+    return element_matrix, rng.uniform(200, 2000, n), rng.uniform(10, 20, n)
+
+
+def _solve(**kwargs):
+    element_matrix, weights, prices = _inventory()
+    n = len(weights)
+    return solve_blend(element_matrix, weights, prices, RANGES, [f"w{i}" for i in range(n)], ['A'] * n,
+                       target_weight=10000, **kwargs)
+
+
+def _weights(result):
+    return {name: lot['weight'] for name, lot in result['waste_mix'].items()}
+
+
+def test_min_take():
+    stock = dict(zip([f"w{i}" for i in range(80)], _inventory()[1]))
+    result = _solve(min_take=600)
+    assert result['feasible'] and 'integer' in result
+    # 库存不足最小取用量的废料只能整批用完
+    for name, weight in _weights(result).items():
+        assert weight >= min(600, stock[name]) - 1e-6
+    assert result['total_weight'] == pytest.approx(10000)
+    assert result['total_cost'] >= _solve()['total_cost'] - 1e-6
+
+
+def test_unit_weight():
+    result = _solve(unit_weight=250)
+    assert result['feasible']
+    for name, lot in result['waste_mix'].items():
+        assert lot['weight'] == pytest.approx(lot['units'] * 250)
+    # 按整件取用时总重允许多出不超过一件
+    assert 10000 - 1e-6 <= result['total_weight'] <= 10250 + 1e-6
+
+
+def test_per_lot_unit_weight():
+    units = np.where(np.arange(80) % 2 == 0, 100.0, 0.0)
+    result = _solve(unit_weight=units)
+    assert result['feasible']
+    for name, lot in result['waste_mix'].items():
+        if units[int(name[1:])] > 0:
+            assert lot['weight'] == pytest.approx(lot['units'] * 100)
+        else:
+            assert 'units' not in lot
+
+
+@pytest.mark.parametrize('max_lots', [7, 9])
+def test_max_lots(max_lots):
+    unlimited = _solve()
+    assert len(unlimited['waste_mix']) > max_lots
+    result = _solve(max_lots=max_lots)
+    assert result['feasible']
+    assert result['integer']['lots'] == len(result['waste_mix']) <= max_lots
+    assert result['total_cost'] >= unlimited['total_cost'] - 1e-6
+    assert result['integer']['lp_bound'] == pytest.approx(unlimited['total_cost'], rel=1e-7)
+
+
+def test_max_lots_below_needed_stock_is_infeasible():
+    # 每批库存不超过 2000 kg，3 批凑不出 10000 kg
+    result = _solve(max_lots=3)
+    assert not result['feasible'] and result['status'] == 'infeasible'
@@ -0,0 +1,64 @@
+import numpy as np
+
+from inventory import ALL_AREAS, WASTE_COLUMNS, Inventory, uncertainty_from_text
+from optimizer import ELEMENT_FIELDS
+
+
+def _row(name, area, si=7.0, weight=1000, price=12, uncertainty=None):
+    elements = [0.0] * len(ELEMENT_FIELDS)
+    elements[ELEMENT_FIELDS.index('Si')] = si
+    elements[ELEMENT_FIELDS.index('Al')] = 100 - si
+    return (name, area, *elements, weight, price, uncertainty)
+
+
+def _texts(inventory):
+    return sorted(tuple(inventory.row(r)) + (inventory.uncertainty_text(r),) for r in range(len(inventory)))
+
+
+def test_categorical_columns():
+    inventory = Inventory.from_rows([
+        _row("w1", "A区"), _row("w2", "B区", weight="约500"), _row("w3", "A区", uncertainty='{"Si": 0.3}'),
+    ])
+    assert list(inventory.names) == ["w1", "w2", "w3"]
+    assert list(inventory.area_categories) == ["A区", "B区"]
+    assert inventory.area_list() == ["A区", "B区"]
+    assert list(inventory.area_mask("A区")) == [True, False, True]
+    assert not inventory.area_mask("C区").any()
+    assert inventory.area_mask(ALL_AREAS).all()
+    # 无法解析的数值按原文本显示，计算时为 0
+    assert list(inventory.invalid_rows()) == [1]
+    assert inventory.cell_text(1, WASTE_COLUMNS.index("重量")) == "约500"
+    assert inventory.weights[1] == 0
+    assert inventory.uncertainty_text(2) == "Si:0.3"
+    assert list(inventory.find(["w3", "w9", "w1"])) == [2, -1, 0]
+
+
+def test_with_changes_matches_rebuilt_inventory():
+    rows = [_row("w1", "A区"), _row("w2", "B区", weight="?"), _row("w3", "C区"), _row("w4", "A区", si=8)]
+    inventory = Inventory.from_rows(rows)
+    before = _texts(inventory)
+
+    changes = [_row("w2", "A区", weight=800, uncertainty=uncertainty_from_text("Si:0.2")),
+               _row("w5", "D区", si=6, price="--")]
+    updated, removed, changed, appended = inventory.with_changes(changes, ["w3", "w9"])
+
+    assert list(removed) == [2]
+    assert list(changed) == [list(updated.names).index("w2")]
+    assert appended == 1
+    expected = Inventory.from_rows([rows[0], changes[0], rows[3], changes[1]])
+    assert _texts(updated) == _texts(expected)
+    assert list(updated.invalid_rows()) == [list(updated.names).index("w5")]
+    # 不再使用的类别被去掉，新区域加入
+    assert updated.area_list() == ["A区", "D区"]
+    assert list(updated.find(["w3"])) == [-1]
+    # 写时复制，原库存不变
+    assert _texts(inventory) == before
+
+
+def test_with_changes_on_empty_inventory():
+    inventory = Inventory.from_rows([])
+    assert len(inventory) == 0 and inventory.area_list() == []
+    updated, removed, changed, appended = inventory.with_changes([_row("w1", "A区")], ["w0"])
+    assert len(updated) == 1 and appended == 1
+    assert len(removed) == 0 and len(changed) == 0
+    assert np.allclose(updated.element_matrix.sum(axis=1), 1.0)
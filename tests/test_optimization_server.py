@@ -0,0 +1,154 @@
+import asyncio
+import contextlib
+import json
+import sqlite3
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import solver_cache
+from optimization_server import OptimizationService, RequestError, serve
+from optimizer import ELEMENT_FIELDS
+
+STANDARD = {'name': 'ADC12', 'ranges': {'Cu': {'min': 2, 'max': 3}}}
+
+
+@pytest.mark.parametrize('options', [
+    {'confidence': 1},
+    {'confidence': 0},
+    {'robust': 'worst'},
+    {'robust': ['box']},
+    {'max_lots': 0},
+    {'max_lots': 2.5},
+    {'time_limit': -1},
+    {'min_take': 0},
+    {'target_weight': '5000'},
+    {'min_weight': 8000, 'max_weight': 3000},
+])
+def test_invalid_options_are_rejected(options):
+    service = OptimizationService(connect=None)
+    with pytest.raises(RequestError) as error:
+        service.parse_optimize(dict(options, standard=STANDARD))
+    assert error.value.status == 400
+    service.close()
+
+
+def test_valid_options_pass_through():
+    service = OptimizationService(connect=None)
+    options = {'target_weight': 5000, 'robust': 'chance', 'confidence': 0.9, 'max_lots': 4}
+    standard, area, parsed = service.parse_optimize(dict(options, standard=STANDARD))
+    assert parsed == options and area == "全部区域" and standard['ranges'] == STANDARD['ranges']
+    service.close()
+
+
+class SQLiteConnection:
+    """sqlite3 连接的替身：游标支持 with 语句，用法与 pymysql 相同"""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path)
+
+    @contextlib.contextmanager
+    def cursor(self):
+        cursor = self._conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+def _create_database(path):
+    conn = sqlite3.connect(path)
+    columns = ", ".join(f"{element} REAL" for element in ELEMENT_FIELDS)
+    conn.execute(f"CREATE TABLE wastes (名称 TEXT PRIMARY KEY, 区域 TEXT, {columns}, 重量 REAL, 单价 REAL)")
+    conn.execute("CREATE TABLE product_standards (name TEXT PRIMARY KEY, ranges TEXT)")
+    conn.execute("INSERT INTO product_standards VALUES (?, ?)", ('ADC12', json.dumps(STANDARD['ranges'])))
+    conn.commit()
+    conn.close()
+
+
+def _add_lot(path, name, area, cu, weight, price):
+    content = dict.fromkeys(ELEMENT_FIELDS, 0.0)
+    content.update(Cu=cu, Al=100.0 - cu)
+    conn = sqlite3.connect(path)
+    conn.execute(f"INSERT INTO wastes VALUES ({', '.join('?' * (len(ELEMENT_FIELDS) + 4))})",
+                 (name, area, *[content[e] for e in ELEMENT_FIELDS], weight, price))
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setitem(solver_cache.SOLVER_CACHE_CONFIG, 'persist_path', None)
+    monkeypatch.setattr(solver_cache, '_cache', None)
+    path = str(tmp_path / "recycle_mind.db")
+    _create_database(path)
+    _add_lot(path, 'cu5', 'A区', 5.0, 1000.0, 20.0)
+    _add_lot(path, 'cu1', 'A区', 1.0, 5000.0, 10.0)
+
+    service = OptimizationService(connect=lambda: SQLiteConnection(path), port=0, refresh_interval=0)
+    started = threading.Event()
+    loop = asyncio.new_event_loop()
+
+    def ready(srv):
+        service.port = srv.sockets[0].getsockname()[1]
+        started.set()
+
+    def run():
+        try:
+            loop.run_until_complete(serve(service, ready))
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert started.wait(10)
+    yield service, path
+    for task in asyncio.all_tasks(loop):
+        loop.call_soon_threadsafe(task.cancel)
+    thread.join(10)
+    service.close()
+
+
+def _request(service, path, body=None):
+    data = None if body is None else json.dumps(body).encode('utf-8')
+    request = urllib.request.Request(f"http://127.0.0.1:{service.port}{path}", data=data,
+                                     method='GET' if body is None else 'POST')
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_optimize_over_http_with_sqlite_stand_in(server):
+    service, path = server
+    status, health = _request(service, '/health')
+    assert status == 200 and health['lots'] == 2 and health['standards'] == 1
+
+    status, standards = _request(service, '/standards')
+    assert status == 200 and standards[0]['name'] == 'ADC12'
+
+    # Cu 2%-3%：cu5 与 cu1 各用一半时铜含量恰好 3%，再多用 cu1 更便宜，最优为铜含量 2%
+    status, result = _request(service, '/optimize', {'standard': 'ADC12', 'area': 'A区', 'target_weight': 4000})
+    assert status == 200 and result['status'] == 'optimal'
+    assert result['waste_mix']['cu5']['weight'] == pytest.approx(1000.0)
+    assert result['total_cost'] == pytest.approx(1000 * 20.0 + 3000 * 10.0)
+
+    assert _request(service, '/optimize', {'standard': 'A380'})[0] == 404
+    assert _request(service, '/optimize', {'standard': 'ADC12', 'confidence': 1})[0] == 400
+    assert _request(service, '/optimize', [])[0] == 400
+    assert _request(service, '/optimize')[0] == 405
+    assert _request(service, '/standards', {})[0] == 405
+
+    # 新加入的废料在下一次请求前同步进来
+    _add_lot(path, 'cu3', 'B区', 3.0, 2000.0, 5.0)
+    status, result = _request(service, '/optimize', {'standard': 'ADC12', 'area': 'B区', 'target_weight': 1500})
+    assert status == 200 and result['total_cost'] == pytest.approx(1500 * 5.0)
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from optimizer import ELEMENT_FIELDS, pareto_sweep
+
+RANGES = {'Si': {'min': 7, 'max': 8}, 'Cu': {'min': 2, 'max': 3}, 'Fe': {'min': 0, 'max': 0.8}}
+
+
+def _sweep(axis, points=6):
+    rng = np.random.default_rng(11)
+    n = 40
+    element_matrix = np.zeros((n, len(ELEMENT_FIELDS)))
+    for element, low, high in (('Si', 4, 11), ('Cu', 0.5, 4.5), ('Fe', 0.2, 1.2)):
+        element_matrix[:, ELEMENT_FIELDS.index(element)] = rng.uniform(low, high, n) / 100
+    return pareto_sweep(element_matrix, rng.uniform(500, 3000, n), rng.uniform(10, 20, n),
+                        [f"w{i}" for i in range(n)], ['A'] * n, RANGES, axis=axis, points=points,
+                        max_workers=1, target_weight=5000)
+
+
+def test_cost_rises_with_safety_margin():
+    sweep = _sweep('margin')
+    assert sweep['feasible'] and sweep['max_margin'] > 0
+    points = [p for p in sweep['points'] if p['feasible']]
+    assert len(points) == len(sweep['points']) >= 4
+    values = [p['value'] for p in points]
+    costs = [p['total_cost'] for p in points]
+    assert values == sorted(values) and values[0] == 0.0
+    assert all(b >= a - 1e-6 for a, b in zip(costs, costs[1:]))
+    # 每个方案的实际裕度不小于要求的裕度
+    assert all(p['margin'] >= p['value'] - 1e-6 for p in points)
+    assert points[0]['efficient']
+
+
+def test_cost_falls_with_more_lots():
+    sweep = _sweep('lots')
+    points = [p for p in sweep['points'] if p['feasible']]
+    assert len(points) >= 3
+    assert all(p['lots'] <= p['value'] for p in points)
+    costs = [p['total_cost'] for p in points]
+    assert all(b <= a + 1e-6 for a, b in zip(costs, costs[1:]))
+    # 最低成本方案（批数最多）总是有效点
+    assert points[-1]['efficient']
+
+
+@pytest.mark.parametrize('axis', ['margin', 'lots'])
+def test_efficient_points_are_not_dominated(axis):
+    sign = -1 if axis == 'margin' else 1
+    points = [p for p in _sweep(axis)['points'] if p['feasible']]
+    for p in points:
+        dominated = any(q['total_cost'] < p['total_cost'] - 1e-6 and sign * q[axis] <= sign * p[axis]
+                        for q in points)
+        assert not (p['efficient'] and dominated)
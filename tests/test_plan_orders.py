@@ -0,0 +1,42 @@
+import numpy as np
+
+from optimizer import ELEMENT_FIELDS, plan_orders
+
+
+def _lot(**content):
+    row = np.zeros(len(ELEMENT_FIELDS))
+    for element, percent in content.items():
+        row[ELEMENT_FIELDS.index(element)] = percent / 100.0
+    row[ELEMENT_FIELDS.index('Al')] = 1.0 - row.sum()
+    return row
+
+
+def test_scarce_lot_goes_to_higher_priority_order():
+    # 唯一含铜的 100 kg 废料，高优先级订单整批都需要它，低优先级订单产量大得多
+    element_matrix = np.array([_lot(Cu=50), _lot()])
+    weights = np.array([100.0, 10000.0])
+    prices = np.array([10.0, 5.0])
+    high = {'name': 'high', 'ranges': {'Cu': {'min': 40, 'max': 50}}}
+    low = {'name': 'low', 'ranges': {'Cu': {'min': 1, 'max': 2}}}
+
+    result = plan_orders(element_matrix, weights, prices, ['cu', 'al'], ['A', 'A'],
+                         [(high, 100.0, 10), (low, 5000.0, 0)])
+
+    assert result['feasible']
+    high_result, low_result = result['orders']
+    assert high_result['fulfilled']
+    assert high_result['shortfall'] < 1e-3
+    # 高优先级订单至少要用 80 kg 含铜废料，剩下的 20 kg 最多做出 1000 kg 低优先级产品
+    assert abs(low_result['shortfall'] - 4000.0) < 1e-3
+
+
+def test_cost_is_minimized_once_orders_are_met():
+    element_matrix = np.array([_lot(Cu=3), _lot(Cu=3)])
+    weights = np.array([1000.0, 1000.0])
+    prices = np.array([12.0, 8.0])
+    standard = {'name': 'std', 'ranges': {'Cu': {'min': 2, 'max': 4}}}
+
+    result = plan_orders(element_matrix, weights, prices, ['a', 'b'], ['A', 'A'], [(standard, 500.0, 0)])
+
+    assert result['orders'][0]['fulfilled']
+    assert abs(result['total_cost'] - 500.0 * 8.0) < 1e-3
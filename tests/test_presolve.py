@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from scipy.optimize import linprog
+
+import optimizer
+from optimizer import ELEMENT_FIELDS, charge_constraints, element_bounds, ratio_constraints, solve_blend
+
+RANGES = {'Si': {'min': 7, 'max': 8}, 'Cu': {'min': 2, 'max': 3}, 'Fe': {'min': 0, 'max': 0.8}}
+TARGET = 20000
+
+
+def _inventory(n=300, seed=13):
+    """带重复、无库存和被占优批次的库存"""
+    rng = np.random.default_rng(seed)
+    element_matrix = np.zeros((n, len(ELEMENT_FIELDS)))
+    for element, low, high in (('Si', 4, 11), ('Cu', 0.5, 4.5), ('Fe', 0.2, 1.2)):
+        # 含量取到 0.5 个百分点，很多批次成分相同
+        element_matrix[:, ELEMENT_FIELDS.index(element)] = np.round(rng.uniform(low, high, n) * 2) / 200
+    weights = rng.uniform(200, 2000, n)
+    weights[rng.random(n) < 0.1] = 0
+    prices = np.round(rng.uniform(10, 20, n))
+    # 库存超过炉次重量的大批次，成分相同、单价更高的批次被它占优
+    big = rng.choice(n, 20, replace=False)
+    element_matrix = np.vstack([element_matrix, element_matrix[big]])
+    weights = np.concatenate([weights, np.full(len(big), 2.0 * TARGET)])
+    prices = np.concatenate([prices, np.full(len(big), 15.0)])
+    return element_matrix, weights, prices
+
+
+def _reference_cost(element_matrix, weights, prices):
+    """不做预处理，直接在全部批次上求解"""
+    A_ub, b_ub = ratio_constraints(element_matrix, *element_bounds(RANGES))
+    charge_ub, charge_b, A_eq, b_eq = charge_constraints(len(weights), TARGET)
+    res = linprog(prices, A_ub=np.vstack([A_ub, charge_ub]), b_ub=np.concatenate([b_ub, charge_b]),
+                  A_eq=A_eq, b_eq=b_eq, bounds=np.column_stack([np.zeros_like(weights), weights]),
+                  method='highs')
+    assert res.status == 0
+    return res.fun
+
+
+@pytest.mark.parametrize('block', [optimizer.PRESOLVE_BLOCK, 2])
+def test_presolve_keeps_optimal_cost(block, monkeypatch):
+    # block 很小时走大组分块比较的路径
+    monkeypatch.setattr(optimizer, 'PRESOLVE_BLOCK', block)
+    monkeypatch.setattr(optimizer, 'PRESOLVE_REFERENCE', block)
+    element_matrix, weights, prices = _inventory()
+    names = [f"w{i}" for i in range(len(weights))]
+    result = solve_blend(element_matrix, weights, prices, RANGES, names, ['A'] * len(names),
+                         target_weight=TARGET)
+
+    presolve = result['presolve']
+    assert presolve['zero_stock'] > 0 and presolve['merged'] > 0 and presolve['dominated'] > 0
+    assert presolve['kept'] < presolve['lots']
+    assert result['total_cost'] == pytest.approx(_reference_cost(element_matrix, weights, prices), rel=1e-7)
+
+    # 分回原批次后不超过各批库存，成分达标
+    for name, lot in result['waste_mix'].items():
+        assert lot['weight'] <= weights[int(name[1:])] + 1e-6
+    assert result['total_weight'] == pytest.approx(TARGET)
+    for element, bounds in RANGES.items():
+        content = sum(lot['weight'] * element_matrix[int(name[1:]), ELEMENT_FIELDS.index(element)]
+                      for name, lot in result['waste_mix'].items()) / result['total_weight'] * 100
+        assert bounds['min'] - 1e-6 <= content <= bounds['max'] + 1e-6
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from optimizer import ELEMENT_FIELDS, solve_blend
+
+RANGES = {'Si': {'min': 7, 'max': 8}, 'Cu': {'min': 2, 'max': 3}, 'Fe': {'min': 0, 'max': 0.8}}
+
+
+def _inventory(n=60, seed=5):
+    rng = np.random.default_rng(seed)
+    element_matrix = np.zeros((n, len(ELEMENT_FIELDS)))
+    for element, low, high in (('Si', 4, 11), ('Cu', 0.5, 4.5), ('Fe', 0.2, 1.2)):
+        element_matrix[:, ELEMENT_FIELDS.index(element)] = rng.uniform(low, high, n) / 100
+    return element_matrix, rng.uniform(200, 2000, n), rng.uniform(10, 20, n)
+
+
+def _solve(prices=None, ranges=RANGES, target_weight=10000):
+    element_matrix, weights, base_prices = _inventory()
+    prices = base_prices if prices is None else prices
+    n = len(weights)
+    return solve_blend(element_matrix, weights, prices, ranges, [f"w{i}" for i in range(n)], ['A'] * n,
+                       target_weight=target_weight)
+
+
+def test_weight_shadow_price_matches_finite_difference():
+    base = _solve()
+    more = _solve(target_weight=10001)
+    assert more['total_cost'] - base['total_cost'] == pytest.approx(
+        base['sensitivity']['weight_shadow_price'], rel=1e-4)
+
+
+def test_element_shadow_prices_match_finite_difference():
+    base = _solve()
+    elements = base['sensitivity']['elements']
+    assert any(item['min_shadow'] > 0 or item['max_shadow'] > 0 for item in elements.values())
+    delta = 0.001
+    for element, item in elements.items():
+        for side, shadow in (('min', item['min_shadow']), ('max', item['max_shadow'])):
+            ranges = {e: dict(r) for e, r in RANGES.items()}
+            ranges[element][side] += -delta if side == 'min' else delta
+            if ranges[element]['min'] < 0:
+                continue
+            saving = base['total_cost'] - _solve(ranges=ranges)['total_cost']
+            # 每放宽 1 个百分点节省 shadow 元
+            assert saving == pytest.approx(shadow * delta, rel=1e-3, abs=1e-6)
+
+
+def test_unused_lot_enters_below_price_low():
+    base = _solve()
+    lots = base['sensitivity']['lots']
+    name, lot = next((name, lot) for name, lot in lots.items() if lot['status'] == 'lower')
+    assert lot['reduced_cost'] > 0
+    i = int(name[1:])
+    prices = _inventory()[2].copy()
+
+    prices[i] = lot['price_low'] + 0.01
+    assert name not in _solve(prices)['waste_mix']
+    prices[i] = lot['price_low'] - 0.01
+    assert name in _solve(prices)['waste_mix']
+
+
+def test_basic_lot_price_range_keeps_plan():
+    base = _solve()
+    lots = base['sensitivity']['lots']
+    name, lot = next((name, lot) for name, lot in lots.items()
+                     if lot['status'] == 'basic' and lot['price_low'] is not None)
+    i = int(name[1:])
+    prices = _inventory()[2].copy()
+    for price in (lot['price_low'] + 1e-3, lot['price_high'] - 1e-3):
+        prices[i] = price
+        mix = _solve(prices)['waste_mix']
+        assert mix.keys() == base['waste_mix'].keys()
+        assert mix[name]['weight'] == pytest.approx(base['waste_mix'][name]['weight'], rel=1e-6)
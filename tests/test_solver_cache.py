@@ -0,0 +1,24 @@
+import os
+
+from solver_cache import SolverCache
+
+
+def test_put_defers_writing_until_save(tmp_path):
+    path = str(tmp_path / "solver_cache.json")
+    cache = SolverCache(persist_path=path, save_delay=60)
+    for i in range(20):
+        cache.put(f"key{i}", {'status': 'optimal', 'total_cost': i})
+    assert not os.path.exists(path)
+
+    cache.save()
+    reloaded = SolverCache(persist_path=path)
+    assert reloaded.get("key7")['total_cost'] == 7
+    assert reloaded.stats()['entries'] == 20
+
+
+def test_timer_saves_after_delay(tmp_path):
+    path = str(tmp_path / "solver_cache.json")
+    cache = SolverCache(persist_path=path, save_delay=0.05)
+    cache.put("key", {'status': 'optimal'})
+    cache._timer.join(5)
+    assert SolverCache(persist_path=path).get("key") is not None
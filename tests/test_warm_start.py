@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from optimizer import ELEMENT_FIELDS, WarmStart, solve_blend
+
+RANGES = {'Si': {'min': 7, 'max': 8}, 'Cu': {'min': 2, 'max': 3}, 'Fe': {'min': 0, 'max': 0.8}}
+
+
+def _inventory(n=400, seed=3):
+    rng = np.random.default_rng(seed)
+    element_matrix = np.zeros((n, len(ELEMENT_FIELDS)))
+    for element, low, high in (('Si', 4, 11), ('Cu', 0.5, 4.5), ('Fe', 0.2, 1.2)):
+        element_matrix[:, ELEMENT_FIELDS.index(element)] = rng.uniform(low, high, n) / 100
+    weights = rng.uniform(200, 2000, n)
+    prices = rng.uniform(10, 20, n)
+    return element_matrix, weights, prices, [f"w{i}" for i in range(n)], ['A'] * n
+
+
+def _solve(element_matrix, weights, prices, names, warm_start=None):
+    return solve_blend(element_matrix, weights, prices, RANGES, names, ['A'] * len(names),
+                       target_weight=20000, warm_start=warm_start)
+
+
+@pytest.mark.parametrize('change', ['price', 'remove', 'stock'])
+def test_warm_start_matches_cold_solve(change):
+    element_matrix, weights, prices, names, _ = _inventory()
+    warm_start = WarmStart()
+    first = _solve(element_matrix, weights, prices, names, warm_start)
+    assert first['feasible'] and 'warm_start' not in first
+
+    used = [names.index(name) for name in first['waste_mix']]
+    if change == 'price':
+        prices = prices.copy()
+        prices[used[0]] *= 1.5
+    elif change == 'remove':
+        keep = np.ones(len(names), dtype=bool)
+        keep[used[:2]] = False
+        element_matrix, weights, prices = element_matrix[keep], weights[keep], prices[keep]
+        names = [name for name, k in zip(names, keep) if k]
+    else:
+        weights = weights.copy()
+        weights[used] *= 0.5
+
+    warm = _solve(element_matrix, weights, prices, names, warm_start)
+    cold = _solve(element_matrix, weights, prices, names)
+    assert warm['feasible'] and cold['feasible']
+    assert 'warm_start' in warm
+    assert warm['total_cost'] == pytest.approx(cold['total_cost'], rel=1e-7)
+    assert warm['total_weight'] == pytest.approx(20000)
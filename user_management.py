@@ -1,7 +1,5 @@
 import os
-import json
 import shutil
-import zipfile
 from datetime import datetime, timedelta
 from PyQt6.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QFormLayout, QLineEdit, 
@@ -9,8 +7,12 @@ from PyQt6.QtWidgets import (
     QMessageBox, QLabel, QTextEdit, QFileDialog, QProgressBar,
     QGroupBox, QCheckBox, QSpinBox, QDateEdit, QTabWidget, QWidget
 )
-from PyQt6.QtCore import Qt, QTimer, QThread, pyqtSignal
+from PyQt6.QtCore import Qt, QTimer, QThread, QObject, pyqtSignal
 from db import get_db_conn
+from audit_log import get_audit_writer
+from background_jobs import BackgroundJobRunner
+import backup
+import backup_scheduler
 import traceback # Added for traceback.print_exc()
 
 # 角色权限定义
@@ -29,6 +31,68 @@ ROLES = {
     }
 }
 
+class AutoBackupService(QObject):
+    """程序内的自动备份：定时检查是否到期，到期则在后台线程中备份"""
+    
+    backup_done = pyqtSignal(object)   # run_if_due 的结果摘要
+    
+    def __init__(self, user_manager=None, parent=None):
+        super().__init__(parent)
+        self.user_manager = user_manager
+        self.settings = backup_scheduler.load_settings()
+        self.job = None
+        self.runner = BackgroundJobRunner(max_concurrent=1, parent=self)
+        self.runner.job_finished.connect(self.on_finished)
+        self.runner.job_failed.connect(self.on_failed)
+        self.runner.job_cancelled.connect(self.on_cancelled)
+        self.timer = QTimer(self)
+        self.timer.setInterval(backup_scheduler.CHECK_INTERVAL * 1000)
+        self.timer.timeout.connect(self.check)
+        self.reload()
+    
+    def reload(self):
+        """重新读取设置（设置对话框保存后调用），启用时立即检查一次"""
+        self.settings = backup_scheduler.load_settings()
+        if self.settings['enabled']:
+            self.timer.start()
+            QTimer.singleShot(0, self.check)
+        else:
+            self.timer.stop()
+    
+    def check(self):
+        if self.job is not None or not self.settings['enabled']:
+            return
+        created_by = None
+        if self.user_manager and self.user_manager.current_user:
+            created_by = self.user_manager.current_user['id']
+        self.job = self.runner.submit("自动备份", backup_scheduler.run_if_due, self.settings,
+                                      created_by=created_by)
+    
+    def on_finished(self, job_id, result):
+        self.job = None
+        if result is None:
+            return
+        if self.user_manager:
+            self.user_manager.log_operation(
+                "自动备份", f"{backup.BACKUP_TYPES[result['type']]}: {result['name']}, "
+                f"{result['size'] / 1024 / 1024:.1f} MB, 用时 {result['seconds']:.1f} 秒"
+            )
+        self.backup_done.emit(result)
+    
+    def on_failed(self, job_id, message):
+        self.job = None
+        # 另一个备份正在运行时跳过本次，下次定时检查再试
+        print(f"自动备份失败: {message}")
+    
+    def on_cancelled(self, job_id):
+        self.job = None
+    
+    def stop(self):
+        """程序退出前停止定时器并等待正在运行的备份结束"""
+        self.timer.stop()
+        self.runner.cancel_all()
+        self.runner.pool.waitForDone()
+
 class UserManager:
     """用户管理类"""
     
@@ -141,28 +205,10 @@ class UserManager:
         return permission in ROLES.get(role, {}).get('permissions', [])
     
     def log_operation(self, operation, details=""):
-        """记录操作日志"""
+        """记录操作日志（放入队列后立即返回，由后台线程批量写入数据库）"""
         if not self.current_user:
             return
-            
-        try:
-            conn = get_db_conn()
-            with conn.cursor() as cursor:
-                cursor.execute("""
-                    INSERT INTO operation_logs (user_id, username, operation, details)
-                    VALUES (%s, %s, %s, %s)
-                """, (
-                    self.current_user['id'],
-                    self.current_user['username'],
-                    operation,
-                    details
-                ))
-                conn.commit()
-            conn.close()
-        except Exception as e:
-            print(f"日志记录错误: {e}")
-            # 如果数据库连接失败，只打印日志到控制台
-            print(f"操作日志: {self.current_user['username']} - {operation} - {details}")
+        get_audit_writer().log(self.current_user['id'], self.current_user['username'], operation, details)
 
 class UserManagementDialog(QDialog):
     """用户管理对话框"""
@@ -172,8 +218,16 @@ class UserManagementDialog(QDialog):
         self.user_manager = user_manager
         self.setWindowTitle("用户管理")
         self.setMinimumSize(800, 600)
+        # 备份/恢复在后台线程执行，同一时间只运行一个
+        self.backup_runner = BackgroundJobRunner(max_concurrent=1, parent=self)
+        self.backup_runner.job_progress.connect(self.on_backup_progress)
+        self.backup_runner.job_finished.connect(self.on_backup_finished)
+        self.backup_runner.job_failed.connect(self.on_backup_failed)
+        self.backup_runner.job_cancelled.connect(self.on_backup_cancelled)
+        self.backup_job = None
         self.init_ui()
         self.load_users()
+        self.load_backups()
     
     def init_ui(self):
         layout = QVBoxLayout(self)
@@ -263,10 +317,14 @@ class UserManagementDialog(QDialog):
         backup_group_layout = QVBoxLayout(backup_group)
         
         backup_btn_layout = QHBoxLayout()
+        self.backup_type_combo = QComboBox()
+        for backup_type, label in backup.BACKUP_TYPES.items():
+            self.backup_type_combo.addItem(label, backup_type)
         self.btn_backup = QPushButton("创建备份")
         self.btn_restore = QPushButton("恢复备份")
         self.btn_auto_backup = QPushButton("设置自动备份")
         
+        backup_btn_layout.addWidget(self.backup_type_combo)
         backup_btn_layout.addWidget(self.btn_backup)
         backup_btn_layout.addWidget(self.btn_restore)
         backup_btn_layout.addWidget(self.btn_auto_backup)
@@ -274,6 +332,19 @@ class UserManagementDialog(QDialog):
         
         backup_group_layout.addLayout(backup_btn_layout)
         
+        # 备份进度
+        backup_progress_layout = QHBoxLayout()
+        self.backup_status_label = QLabel("")
+        self.backup_progress = QProgressBar()
+        self.backup_progress.setRange(0, 100)
+        self.btn_cancel_backup = QPushButton("取消")
+        self.btn_cancel_backup.clicked.connect(self.cancel_backup)
+        backup_progress_layout.addWidget(self.backup_status_label)
+        backup_progress_layout.addWidget(self.backup_progress)
+        backup_progress_layout.addWidget(self.btn_cancel_backup)
+        backup_group_layout.addLayout(backup_progress_layout)
+        self.set_backup_running(False)
+        
         # 自动备份设置
         auto_backup_layout = QHBoxLayout()
         auto_backup_layout.addWidget(QLabel("自动备份间隔:"))
@@ -283,11 +354,35 @@ class UserManagementDialog(QDialog):
         self.backup_interval.setSuffix(" 天")
         auto_backup_layout.addWidget(self.backup_interval)
         
+        auto_backup_layout.addWidget(QLabel("保留:"))
+        self.backup_keep_days = QSpinBox()
+        self.backup_keep_days.setRange(1, 365)
+        self.backup_keep_days.setSuffix(" 天")
+        auto_backup_layout.addWidget(self.backup_keep_days)
+        
         self.enable_auto_backup = QCheckBox("启用自动备份")
         auto_backup_layout.addWidget(self.enable_auto_backup)
         auto_backup_layout.addStretch()
         
         backup_group_layout.addLayout(auto_backup_layout)
+        
+        auto_dir_layout = QHBoxLayout()
+        auto_dir_layout.addWidget(QLabel("自动备份目录:"))
+        self.auto_backup_dir = QLineEdit()
+        auto_dir_layout.addWidget(self.auto_backup_dir)
+        self.btn_auto_backup_dir = QPushButton("选择...")
+        self.btn_auto_backup_dir.clicked.connect(self.choose_auto_backup_dir)
+        auto_dir_layout.addWidget(self.btn_auto_backup_dir)
+        backup_group_layout.addLayout(auto_dir_layout)
+        
+        settings = backup_scheduler.load_settings()
+        self.backup_interval.setValue(settings['interval_days'])
+        self.backup_keep_days.setValue(settings['keep_days'])
+        self.enable_auto_backup.setChecked(settings['enabled'])
+        self.auto_backup_dir.setText(settings['directory'])
+        service = getattr(self.parent(), 'auto_backup', None)
+        if service is not None:
+            service.backup_done.connect(lambda result: self.load_backups())
         backup_layout.addWidget(backup_group)
         
         # 备份历史
@@ -295,9 +390,9 @@ class UserManagementDialog(QDialog):
         backup_history_layout = QVBoxLayout(backup_history_group)
         
         self.backup_table = QTableWidget()
-        self.backup_table.setColumnCount(5)
+        self.backup_table.setColumnCount(8)
         self.backup_table.setHorizontalHeaderLabels([
-            "备份名称", "创建时间", "大小", "状态", "创建者"
+            "备份名称", "类型", "创建时间", "大小", "用时", "方式", "状态", "创建者"
         ])
         backup_history_layout.addWidget(self.backup_table)
         
@@ -352,6 +447,9 @@ class UserManagementDialog(QDialog):
             user_filter = self.user_filter.currentText()
             operation_filter = self.operation_filter.currentText()
             
+            # 先写入队列中尚未落库的日志
+            get_audit_writer().flush(timeout=2.0)
+            
             conn = get_db_conn()
             with conn.cursor() as cursor:
                 query = """
@@ -528,67 +626,133 @@ class UserManagementDialog(QDialog):
             QMessageBox.critical(self, "错误", f"重置密码失败：{str(e)}")
     
     def create_backup(self):
-        """创建数据备份"""
+        """创建数据备份（后台流式写入，界面显示进度）"""
+        if self.backup_job is not None:
+            QMessageBox.information(self, "提示", "已有备份任务正在运行")
+            return
+        backup_name = f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        backup_path = QFileDialog.getExistingDirectory(self, "选择备份目录")
+        
+        if not backup_path:
+            return
+        
+        backup_file = os.path.join(backup_path, f"{backup_name}.zip")
+        backup_type = self.backup_type_combo.currentData()
+        created_by = self.user_manager.current_user['id'] if self.user_manager else None
+        self.backup_job = self.backup_runner.submit(
+            f"备份 {backup_name}", backup.run_backup, backup_file, backup_type=backup_type, created_by=created_by
+        )
+        self.backup_job_info = {'kind': 'backup', 'name': backup_name, 'file': backup_file}
+        self.set_backup_running(True)
+    
+    def set_backup_running(self, running):
+        self.btn_backup.setEnabled(not running)
+        self.btn_restore.setEnabled(not running)
+        self.backup_status_label.setVisible(running)
+        self.backup_progress.setVisible(running)
+        self.btn_cancel_backup.setVisible(running)
+        if running:
+            self.backup_progress.setValue(0)
+            self.backup_status_label.setText("准备中")
+    
+    def cancel_backup(self):
+        if self.backup_job is not None:
+            self.backup_runner.cancel(self.backup_job)
+    
+    def on_backup_progress(self, job_id, percent, text):
+        self.backup_progress.setValue(percent)
+        if text:
+            self.backup_status_label.setText(text)
+    
+    def on_backup_finished(self, job_id, result):
+        self.backup_job = None
+        self.set_backup_running(False)
+        if self.backup_job_info['kind'] == 'restore':
+            self.on_restore_finished(result)
+            return
+        manifest = result
+        backup_name = self.backup_job_info['name']
+        backup_file = self.backup_job_info['file']
+        # 备份日志已在后台任务中写入 backup_logs
+        if self.user_manager:
+            self.user_manager.log_operation("数据备份", f"创建{backup.BACKUP_TYPES[manifest['type']]}: {backup_name}")
+        self.load_backups()
+        
+        rows = sum(info['rows'] for info in manifest['tables'].values())
+        message = f"{backup.BACKUP_TYPES[manifest['type']]}创建成功！\n共 {rows} 行数据\n文件位置: {backup_file}"
+        if manifest.get('base'):
+            message += f"\n上一级备份: {manifest['base']}"
+        elif self.backup_type_combo.currentData() != 'full':
+            message += "\n没有可用的上一级备份，已改为全量备份"
+        QMessageBox.information(self, "成功", message)
+    
+    def load_backups(self):
+        """加载备份历史"""
         try:
-            backup_name = f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            backup_path = QFileDialog.getExistingDirectory(self, "选择备份目录")
-            
-            if not backup_path:
-                return
-            
-            # 创建备份文件
-            backup_file = os.path.join(backup_path, f"{backup_name}.zip")
-            
-            with zipfile.ZipFile(backup_file, 'w') as zipf:
-                # 备份数据库数据
-                conn = get_db_conn()
-                with conn.cursor() as cursor:
-                    # 获取所有表数据
-                    tables = ['users', 'wastes', 'product_standards', 'operation_logs', 'backup_logs']
-                    
-                    for table in tables:
-                        try:
-                            cursor.execute(f"SELECT * FROM {table}")
-                            rows = cursor.fetchall()
-                            
-                            # 获取列名
-                            cursor.execute(f"DESCRIBE {table}")
-                            columns = [col[0] for col in cursor.fetchall()]
-                            
-                            # 保存表数据
-                            table_data = {
-                                'columns': columns,
-                                'data': [list(row) for row in rows]
-                            }
-                            
-                            zipf.writestr(f"{table}.json", json.dumps(table_data, default=str))
-                        except Exception as e:
-                            print(f"备份表 {table} 失败: {e}")
-                            continue
-                
-                conn.close()
-            
-            # 记录备份日志
-            backup_size = os.path.getsize(backup_file)
-            if self.user_manager:
-                conn = get_db_conn()
-                with conn.cursor() as cursor:
-                    cursor.execute("""
-                        INSERT INTO backup_logs (backup_name, backup_path, backup_size, created_by)
-                        VALUES (%s, %s, %s, %s)
-                    """, (backup_name, backup_file, backup_size, self.user_manager.current_user['id']))
-                    conn.commit()
-                conn.close()
-                
-                self.user_manager.log_operation("数据备份", f"创建备份: {backup_name}")
-            
-            QMessageBox.information(self, "成功", f"备份创建成功！\n文件位置: {backup_file}")
-            
+            conn = get_db_conn()
+            backup.ensure_backup_schema(conn)
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT b.backup_name, b.backup_type, b.created_at, b.backup_size, b.duration_seconds,
+                           b.source, b.status, u.username
+                    FROM backup_logs b LEFT JOIN users u ON b.created_by = u.id
+                    ORDER BY b.id DESC LIMIT 200
+                """)
+                rows = cursor.fetchall()
+            conn.close()
         except Exception as e:
-            QMessageBox.critical(self, "错误", f"备份创建失败：{str(e)}")
+            print(f"加载备份历史错误: {e}")
+            return
+        
+        sources = {'manual': '手动', 'auto': '自动'}
+        self.backup_table.setRowCount(len(rows))
+        for row, (name, backup_type, created_at, size, seconds, source, status, username) in enumerate(rows):
+            self.backup_table.setItem(row, 0, QTableWidgetItem(name))
+            self.backup_table.setItem(row, 1, QTableWidgetItem(backup.BACKUP_TYPES.get(backup_type, backup_type or '')))
+            self.backup_table.setItem(row, 2, QTableWidgetItem(str(created_at)))
+            self.backup_table.setItem(row, 3, QTableWidgetItem(f"{(size or 0) / 1024 / 1024:.1f} MB"))
+            self.backup_table.setItem(row, 4, QTableWidgetItem('' if seconds is None else f"{seconds:.1f} 秒"))
+            self.backup_table.setItem(row, 5, QTableWidgetItem(sources.get(source, source or '')))
+            self.backup_table.setItem(row, 6, QTableWidgetItem(status or ''))
+            self.backup_table.setItem(row, 7, QTableWidgetItem(username or ''))
+    
+    def on_restore_finished(self, result):
+        if self.user_manager:
+            self.user_manager.log_operation("数据恢复", f"恢复备份: {os.path.basename(self.backup_job_info['file'])}")
+        # 恢复替换了库存和产品标准，主窗口全量重新加载（恢复的行带着旧的修改时间，增量同步取不到）
+        for name in ('load_waste_data', 'load_product_standards'):
+            reload = getattr(self.parent(), name, None)
+            if reload is not None:
+                reload()
+        QMessageBox.information(
+            self, "成功",
+            f"数据恢复成功！\n共 {result['rows']} 行，用时 {result['seconds']:.1f} 秒"
+            f"（{result['rows_per_second']:.0f} 行/秒）\n应用的备份: {len(result['chain'])} 个"
+        )
+    
+    def on_backup_failed(self, job_id, message):
+        self.backup_job = None
+        self.set_backup_running(False)
+        if self.backup_job_info['kind'] == 'restore':
+            QMessageBox.critical(self, "错误", f"数据恢复失败，数据库未做任何修改：{message}")
+        else:
+            QMessageBox.critical(self, "错误", f"备份创建失败：{message}")
+    
+    def on_backup_cancelled(self, job_id):
+        self.backup_job = None
+        self.set_backup_running(False)
+    
+    def done(self, result):
+        # 关闭对话框前结束后台备份，避免线程池随对话框销毁时仍在写文件
+        self.backup_runner.cancel_all()
+        self.backup_runner.pool.waitForDone()
+        super().done(result)
     
     def restore_backup(self):
-        """恢复数据备份"""
+        """恢复数据备份（后台执行，单个事务，失败或取消时整体回滚）"""
+        if self.backup_job is not None:
+            QMessageBox.information(self, "提示", "已有备份任务正在运行")
+            return
         backup_file, _ = QFileDialog.getOpenFileName(self, "选择备份文件", "", "ZIP files (*.zip)")
         
         if not backup_file:
@@ -599,46 +763,37 @@ class UserManagementDialog(QDialog):
                                    QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         
         if reply == QMessageBox.StandardButton.Yes:
-            try:
-                with zipfile.ZipFile(backup_file, 'r') as zipf:
-                    conn = get_db_conn()
-                    with conn.cursor() as cursor:
-                        # 恢复表数据
-                        tables = ['users', 'wastes', 'product_standards', 'operation_logs', 'backup_logs']
-                        
-                        for table in tables:
-                            if f"{table}.json" in zipf.namelist():
-                                table_data = json.loads(zipf.read(f"{table}.json").decode())
-                                
-                                # 清空表
-                                cursor.execute(f"DELETE FROM {table}")
-                                
-                                # 恢复数据
-                                if table_data['data']:
-                                    columns = table_data['columns']
-                                    placeholders = ', '.join(['%s'] * len(columns))
-                                    query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
-                                    
-                                    for row in table_data['data']:
-                                        cursor.execute(query, row)
-                    
-                    conn.commit()
-                    conn.close()
-                
-                if self.user_manager:
-                    self.user_manager.log_operation("数据恢复", f"恢复备份: {os.path.basename(backup_file)}")
-                QMessageBox.information(self, "成功", "数据恢复成功！")
-                
-            except Exception as e:
-                QMessageBox.critical(self, "错误", f"数据恢复失败：{str(e)}")
+            self.backup_job = self.backup_runner.submit(
+                f"恢复 {os.path.basename(backup_file)}", backup.run_restore, backup_file
+            )
+            self.backup_job_info = {'kind': 'restore', 'file': backup_file}
+            self.set_backup_running(True)
+    
+    def choose_auto_backup_dir(self):
+        directory = QFileDialog.getExistingDirectory(self, "选择自动备份目录", self.auto_backup_dir.text())
+        if directory:
+            self.auto_backup_dir.setText(directory)
     
     def setup_auto_backup(self):
-        """设置自动备份"""
+        """保存自动备份设置，主窗口的自动备份服务立即按新设置运行"""
         interval = self.backup_interval.value()
         enabled = self.enable_auto_backup.isChecked()
+        directory = self.auto_backup_dir.text().strip()
+        if enabled and not directory:
+            QMessageBox.warning(self, "警告", "请选择自动备份目录！")
+            return
         
-        # 这里可以实现自动备份的定时任务
-        # 可以使用 QTimer 或系统级的定时任务
+        settings = backup_scheduler.load_settings()
+        settings.update(enabled=enabled, interval_days=interval, directory=directory,
+                        keep_days=self.backup_keep_days.value())
+        try:
+            backup_scheduler.save_settings(settings)
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"保存自动备份设置失败：{str(e)}")
+            return
+        service = getattr(self.parent(), 'auto_backup', None)
+        if service is not None:
+            service.reload()
         
         if self.user_manager:
             self.user_manager.log_operation("设置自动备份", 
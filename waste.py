@@ -2,22 +2,34 @@ from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
     QTableWidget, QTableWidgetItem, QMessageBox, QLabel, QDialog, QFormLayout, QLineEdit, QDialogButtonBox,
     QTabWidget, QComboBox, QSpinBox, QDoubleSpinBox, QTextEdit, QGroupBox, QGridLayout,
-    QMenuBar, QMenu
+    QMenuBar, QMenu, QProgressBar, QTableView, QAbstractItemView, QHeaderView
 )
 from PyQt6.QtGui import QAction
 from PyQt6.QtCore import Qt
-from db import get_db_conn
-import numpy as np
-from scipy.optimize import minimize
+import matplotlib
+from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg
+from matplotlib.figure import Figure
+from matplotlib.ticker import MaxNLocator
+from db import get_db_conn, pool_stats
+from optimizer import ELEMENT_FIELDS, MILP_GAP, MILP_TIME_LIMIT, ROBUST_MODES, PARETO_AXES, PARETO_POINTS
+from solver_cache import get_solver_cache
+from inventory import ALL_AREAS, uncertainty_from_text
+from waste_model import WasteTableModel, WasteFilterProxyModel
+import waste_sync
+from blend_planner import BlendPlanner
+from background_jobs import BackgroundJobRunner
 import json
 
+# 图表中的中文字体，按顺序取系统中第一个可用的
+matplotlib.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei', 'Noto Sans CJK SC', 'WenQuanYi Micro Hei',
+                                          'DejaVu Sans']
+matplotlib.rcParams['axes.unicode_minus'] = False
+
 WASTE_FIELDS = [
     "名称", "区域", "Si(%)", "Fe(%)", "Cu(%)", "Mn(%)", "Mg(%)", "Zn(%)", "Ti(%)", "Cr(%)", "Ni(%)",
     "Zr(%)", "Sr(%)", "Bi(%)", "Na(%)", "Al(%)", "重量(kg)", "单价(元/kg)"
 ]
 
-ELEMENT_FIELDS = ["Si", "Fe", "Cu", "Mn", "Mg", "Zn", "Ti", "Cr", "Ni", "Zr", "Sr", "Bi", "Na", "Al"]
-
 class ProductStandardDialog(QDialog):
     def __init__(self, parent=None, data=None):
         super().__init__(parent)
@@ -129,20 +141,47 @@ class WasteDialog(QDialog):
             layout.addRow(field_labels.get(field, field), edit)
             self.edits.append(edit)
         
+        # 化验偏差（百分点，按标准差计），未填写的元素按合成方案页的默认偏差计算
+        self.uncertainty_edit = QLineEdit(self)
+        if data and len(data) > len(WASTE_FIELDS):
+            self.uncertainty_edit.setText(data[len(WASTE_FIELDS)])
+        self.uncertainty_edit.setPlaceholderText("各元素化验偏差(百分点)，如: Si:0.3, Cu:0.1")
+        layout.addRow("成分偏差", self.uncertainty_edit)
+        
         btns = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
         btns.accepted.connect(self.accept)
         btns.rejected.connect(self.reject)
         layout.addWidget(btns)
 
+    def accept(self):
+        try:
+            uncertainty_from_text(self.uncertainty_edit.text())
+        except ValueError as e:
+            QMessageBox.warning(self, "输入错误", str(e))
+            return
+        super().accept()
+
     def get_data(self):
-        return [edit.text() for edit in self.edits]
+        """字段文本列表，最后一项为成分偏差 JSON（未填写为 None）"""
+        return [edit.text() for edit in self.edits] + [uncertainty_from_text(self.uncertainty_edit.text())]
+
+def format_price_range(low, high):
+    """单价范围，None 表示不限"""
+    if low is None and high is None:
+        return "-"
+    low_text = "不限" if low is None else f"{low:.2f}"
+    high_text = "不限" if high is None else f"{high:.2f}"
+    return f"{low_text} ~ {high_text}"
+
 
 class OptimizationResultDialog(QDialog):
     def __init__(self, parent=None, result_data=None):
         super().__init__(parent)
         self.setWindowTitle("合成方案结果")
-        self.setMinimumSize(800, 600)
+        self.setMinimumSize(900, 700)
         layout = QVBoxLayout(self)
+        sensitivity = (result_data or {}).get('sensitivity') or {}
+        lots = sensitivity.get('lots', {})
         
         # 方案摘要
         summary_group = QGroupBox("方案摘要")
@@ -155,6 +194,32 @@ class OptimizationResultDialog(QDialog):
             平均单价: {result_data['avg_price']:.2f} 元/kg
             可行性: {'可行' if result_data['feasible'] else '不可行'}
             """
+            if sensitivity.get('weight_shadow_price') is not None:
+                summary_text = summary_text.rstrip(' ') + \
+                    f"            产量边际成本: {sensitivity['weight_shadow_price']:.2f} 元/kg\n"
+            integer = result_data.get('integer')
+            if integer:
+                # 相对线性规划下界的间隙同时反映取用限制本身带来的成本
+                gap = "—" if integer['mip_gap'] is None else f"{integer['mip_gap'] * 100:.3f}%"
+                summary_text = summary_text.rstrip(' ') + \
+                    f"            使用废料: {integer['lots']} 批，求解间隙: {gap}，" \
+                    f"比连续配比下界高 {integer['bound_gap'] * 100:.3f}%" \
+                    f"{'（达到时间上限）' if integer['time_limit_reached'] else ''}\n"
+            presolve = result_data.get('presolve')
+            if presolve and presolve['kept'] < presolve['lots']:
+                summary_text = summary_text.rstrip(' ') + \
+                    f"            预处理: {presolve['lots']} 批废料中求解 {presolve['kept']} 批" \
+                    f"（无库存 {presolve['zero_stock']}，合并重复 {presolve['merged']}，" \
+                    f"被占优 {presolve['dominated']}）\n"
+            reliability = result_data.get('reliability')
+            if reliability:
+                robust = result_data.get('robust')
+                method = f"，{ROBUST_MODES[robust['mode']]} {robust['confidence']:.1%}" if robust else ""
+                summary_text = summary_text.rstrip(' ') + \
+                    f"            达标概率: {reliability['probability']:.1%}" \
+                    f"（按化验偏差抽样 {reliability['samples']} 次{method}）\n"
+            for warning in result_data.get('warnings', []):
+                summary_text = summary_text.rstrip(' ') + f"            注意: {warning}\n"
             summary_label = QLabel(summary_text)
             summary_layout.addWidget(summary_label)
         
@@ -166,8 +231,9 @@ class OptimizationResultDialog(QDialog):
             mix_layout = QVBoxLayout(mix_group)
             
             mix_table = QTableWidget()
-            mix_table.setColumnCount(4)
-            mix_table.setHorizontalHeaderLabels(["废料名称", "区域", "重量(kg)", "占比(%)"])
+            mix_table.setColumnCount(7)
+            mix_table.setHorizontalHeaderLabels(["废料名称", "区域", "重量(kg)", "占比(%)",
+                                                 "单价(元/kg)", "检验数(元/kg)", "方案不变的单价范围"])
             
             waste_mix = result_data['waste_mix']
             mix_table.setRowCount(len(waste_mix))
@@ -175,8 +241,17 @@ class OptimizationResultDialog(QDialog):
                 if mix_data['weight'] > 0:
                     mix_table.setItem(row, 0, QTableWidgetItem(name))
                     mix_table.setItem(row, 1, QTableWidgetItem(mix_data['area']))
-                    mix_table.setItem(row, 2, QTableWidgetItem(f"{mix_data['weight']:.2f}"))
+                    weight_text = f"{mix_data['weight']:.2f}"
+                    if 'units' in mix_data:
+                        weight_text += f" ({mix_data['units']} 件)"
+                    mix_table.setItem(row, 2, QTableWidgetItem(weight_text))
                     mix_table.setItem(row, 3, QTableWidgetItem(f"{mix_data['weight']/result_data['total_weight']*100:.2f}"))
+                    lot = lots.get(name)
+                    if lot:
+                        # 库存全部用完的废料检验数为负：每多 1 kg 库存可节省的成本
+                        mix_table.setItem(row, 4, QTableWidgetItem(f"{lot['price']:.2f}"))
+                        mix_table.setItem(row, 5, QTableWidgetItem(f"{lot['reduced_cost']:.3f}"))
+                        mix_table.setItem(row, 6, QTableWidgetItem(format_price_range(lot['price_low'], lot['price_high'])))
             
             mix_layout.addWidget(mix_table)
             layout.addWidget(mix_group)
@@ -187,10 +262,13 @@ class OptimizationResultDialog(QDialog):
             analysis_layout = QVBoxLayout(analysis_group)
             
             analysis_table = QTableWidget()
-            analysis_table.setColumnCount(4)
-            analysis_table.setHorizontalHeaderLabels(["元素", "含量(%)", "目标范围(%)", "状态"])
+            analysis_table.setColumnCount(7)
+            analysis_table.setHorizontalHeaderLabels(["元素", "含量(%)", "目标范围(%)", "状态",
+                                                      "下限放宽1%节省(元)", "上限放宽1%节省(元)", "达标概率"])
             
             element_analysis = result_data['element_analysis']
+            shadows = sensitivity.get('elements', {})
+            element_reliability = (result_data.get('reliability') or {}).get('elements', {})
             analysis_table.setRowCount(len(element_analysis))
             for row, (element, data) in enumerate(element_analysis.items()):
                 analysis_table.setItem(row, 0, QTableWidgetItem(element))
@@ -198,51 +276,300 @@ class OptimizationResultDialog(QDialog):
                 analysis_table.setItem(row, 2, QTableWidgetItem(f"{data['target_min']:.3f}%~{data['target_max']:.3f}%"))
                 status = "✓" if data['in_range'] else "✗"
                 analysis_table.setItem(row, 3, QTableWidgetItem(status))
+                if sensitivity:
+                    # 对偶值为 0 的元素范围没有起约束作用
+                    shadow = shadows.get(element, {'min_shadow': 0.0, 'max_shadow': 0.0})
+                    analysis_table.setItem(row, 4, QTableWidgetItem(f"{shadow['min_shadow']:.2f}"))
+                    analysis_table.setItem(row, 5, QTableWidgetItem(f"{shadow['max_shadow']:.2f}"))
+                if element in element_reliability:
+                    item = element_reliability[element]
+                    text = f"{item['probability']:.1%}（{item['mean']:.3f}±{item['std']:.3f}%）"
+                    analysis_table.setItem(row, 6, QTableWidgetItem(text))
             
             analysis_layout.addWidget(analysis_table)
             layout.addWidget(analysis_group)
         
+        # 未使用废料中最接近进入方案的几批：单价降到多少才值得使用
+        candidates = [(name, lot) for name, lot in lots.items() if lot['status'] == 'lower']
+        if candidates:
+            candidate_group = QGroupBox("替代候选（单价降到下列价格以下才会进入方案）")
+            candidate_layout = QVBoxLayout(candidate_group)
+            
+            candidate_table = QTableWidget()
+            candidate_table.setColumnCount(5)
+            candidate_table.setHorizontalHeaderLabels(["废料名称", "区域", "单价(元/kg)", "检验数(元/kg)", "单价降至(元/kg)"])
+            candidate_table.setRowCount(len(candidates))
+            for row, (name, lot) in enumerate(candidates):
+                candidate_table.setItem(row, 0, QTableWidgetItem(name))
+                candidate_table.setItem(row, 1, QTableWidgetItem(lot['area']))
+                candidate_table.setItem(row, 2, QTableWidgetItem(f"{lot['price']:.2f}"))
+                candidate_table.setItem(row, 3, QTableWidgetItem(f"{lot['reduced_cost']:.3f}"))
+                candidate_table.setItem(row, 4, QTableWidgetItem(f"{lot['price_low']:.2f}"))
+            
+            candidate_layout.addWidget(candidate_table)
+            layout.addWidget(candidate_group)
+        
         # 关闭按钮
         close_btn = QPushButton("关闭")
         close_btn.clicked.connect(self.accept)
         layout.addWidget(close_btn)
 
+class BatchOptimizationDialog(QDialog):
+    """批量计算结果对比"""
+    
+    def __init__(self, parent=None, rows=None):
+        super().__init__(parent)
+        self.setWindowTitle("批量合成方案对比")
+        self.setMinimumSize(800, 400)
+        self.rows = rows or []
+        layout = QVBoxLayout(self)
+        
+        self.table = QTableWidget(len(self.rows), 7)
+        self.table.setHorizontalHeaderLabels(["产品标准", "可行性", "总成本(元)", "总重量(kg)", "平均单价(元/kg)",
+                                              "达标概率", "用时(s)"])
+        for row, data in enumerate(self.rows):
+            self.table.setItem(row, 0, QTableWidgetItem(data['name']))
+            if data['feasible']:
+                self.table.setItem(row, 1, QTableWidgetItem('可行'))
+            else:
+                # 第一行为原因，其余为调整建议，悬停或双击查看
+                item = QTableWidgetItem(data['message'].split("\n")[0])
+                item.setToolTip(data['message'])
+                self.table.setItem(row, 1, item)
+            if data['feasible']:
+                self.table.setItem(row, 2, QTableWidgetItem(f"{data['total_cost']:.2f}"))
+                self.table.setItem(row, 3, QTableWidgetItem(f"{data['total_weight']:.2f}"))
+                self.table.setItem(row, 4, QTableWidgetItem(f"{data['avg_price']:.2f}"))
+                if data.get('probability') is not None:
+                    self.table.setItem(row, 5, QTableWidgetItem(f"{data['probability']:.1%}"))
+            self.table.setItem(row, 6, QTableWidgetItem(f"{data['solve_time']:.3f}"))
+        self.table.cellDoubleClicked.connect(self.show_detail)
+        layout.addWidget(self.table)
+        
+        layout.addWidget(QLabel("双击可行方案查看详细配比，双击不可行方案查看调整建议"))
+        
+        close_btn = QPushButton("关闭")
+        close_btn.clicked.connect(self.accept)
+        layout.addWidget(close_btn)
+    
+    def show_detail(self, row, column):
+        data = self.rows[row]
+        if data['feasible']:
+            dlg = OptimizationResultDialog(self, data['result'])
+            dlg.exec()
+        else:
+            QMessageBox.information(self, data['name'], data['message'])
+
+class ProductionPlanDialog(QDialog):
+    """多订单排产：多个订单共享同一份库存联合求解"""
+    
+    def __init__(self, parent=None, standards=None, planner=None):
+        super().__init__(parent)
+        self.setWindowTitle("多订单排产")
+        self.setMinimumSize(900, 600)
+        self.standards = standards or []
+        self.planner = planner
+        self.plan = None
+        layout = QVBoxLayout(self)
+        
+        # 订单列表
+        order_group = QGroupBox("订单")
+        order_layout = QVBoxLayout(order_group)
+        self.order_table = QTableWidget(0, 3)
+        self.order_table.setHorizontalHeaderLabels(["产品标准", "产量(kg)", "优先级"])
+        order_layout.addWidget(self.order_table)
+        
+        btn_layout = QHBoxLayout()
+        self.btn_add_order = QPushButton("添加订单")
+        self.btn_remove_order = QPushButton("删除订单")
+        self.btn_solve = QPushButton("计算排产")
+        btn_layout.addWidget(self.btn_add_order)
+        btn_layout.addWidget(self.btn_remove_order)
+        btn_layout.addWidget(self.btn_solve)
+        btn_layout.addStretch()
+        order_layout.addLayout(btn_layout)
+        layout.addWidget(order_group)
+        
+        self.btn_add_order.clicked.connect(self.add_order)
+        self.btn_remove_order.clicked.connect(self.remove_order)
+        self.btn_solve.clicked.connect(self.solve)
+        
+        # 排产结果
+        result_group = QGroupBox("排产结果（双击查看配比）")
+        result_layout = QVBoxLayout(result_group)
+        self.summary_label = QLabel("")
+        result_layout.addWidget(self.summary_label)
+        self.result_table = QTableWidget(0, 7)
+        self.result_table.setHorizontalHeaderLabels(["订单", "产品标准", "优先级", "需求(kg)", "完成(kg)", "缺口(kg)", "成本(元)"])
+        self.result_table.cellDoubleClicked.connect(self.show_detail)
+        result_layout.addWidget(self.result_table)
+        layout.addWidget(result_group)
+        
+        close_btn = QPushButton("关闭")
+        close_btn.clicked.connect(self.accept)
+        layout.addWidget(close_btn)
+        
+        self.add_order()
+    
+    def add_order(self):
+        row = self.order_table.rowCount()
+        self.order_table.insertRow(row)
+        
+        standard_combo = QComboBox()
+        for standard in self.standards:
+            standard_combo.addItem(standard['name'])
+        self.order_table.setCellWidget(row, 0, standard_combo)
+        
+        weight_spin = QDoubleSpinBox()
+        weight_spin.setRange(0, 1e7)
+        weight_spin.setDecimals(1)
+        weight_spin.setValue(1000)
+        self.order_table.setCellWidget(row, 1, weight_spin)
+        
+        priority_spin = QSpinBox()
+        priority_spin.setRange(0, 100)
+        self.order_table.setCellWidget(row, 2, priority_spin)
+    
+    def remove_order(self):
+        row = self.order_table.currentRow()
+        if row >= 0:
+            self.order_table.removeRow(row)
+    
+    def get_orders(self):
+        orders = []
+        for row in range(self.order_table.rowCount()):
+            index = self.order_table.cellWidget(row, 0).currentIndex()
+            weight = self.order_table.cellWidget(row, 1).value()
+            priority = self.order_table.cellWidget(row, 2).value()
+            if index >= 0 and weight > 0:
+                orders.append((self.standards[index], weight, priority))
+        return orders
+    
+    def solve(self):
+        orders = self.get_orders()
+        if not orders:
+            QMessageBox.warning(self, "提示", "请添加产量大于0的订单")
+            return
+        
+        self.summary_label.setText("计算中...")
+        self.planner(orders, self.show_plan)
+    
+    def show_plan(self, plan):
+        self.plan = plan
+        if not self.plan['feasible']:
+            self.result_table.setRowCount(0)
+            self.summary_label.setText("")
+            QMessageBox.warning(self, "计算结果", self.plan['message'])
+            return
+        
+        order_results = self.plan['orders']
+        unfilled = sum(1 for r in order_results if not r['fulfilled'])
+        self.summary_label.setText(
+            f"总成本: {self.plan['total_cost']:.2f} 元    使用废料: {len(self.plan['lot_usage'])} 批    "
+            f"未完成订单: {unfilled} 个"
+        )
+        self.result_table.setRowCount(len(order_results))
+        for row, result in enumerate(order_results):
+            self.result_table.setItem(row, 0, QTableWidgetItem(str(row + 1)))
+            self.result_table.setItem(row, 1, QTableWidgetItem(result['standard']))
+            self.result_table.setItem(row, 2, QTableWidgetItem(str(result['priority'])))
+            self.result_table.setItem(row, 3, QTableWidgetItem(f"{result['order_weight']:.2f}"))
+            self.result_table.setItem(row, 4, QTableWidgetItem(f"{result['total_weight']:.2f}"))
+            self.result_table.setItem(row, 5, QTableWidgetItem(f"{result['shortfall']:.2f}"))
+            self.result_table.setItem(row, 6, QTableWidgetItem(f"{result['total_cost']:.2f}"))
+    
+    def show_detail(self, row, column):
+        result = self.plan['orders'][row]
+        if result['total_weight'] > 0:
+            dlg = OptimizationResultDialog(self, result)
+            dlg.exec()
+
 class WasteManager(QMainWindow):
     def __init__(self, user_manager=None):
         super().__init__()
         self.user_manager = user_manager
         self.setWindowTitle("废料管理系统")
         self.resize(1200, 700)
-        self.waste_data = []
-        self.product_standards = []
+        # 库存、产品标准和求解状态，合成方案计算都在其中进行
+        self.planner = BlendPlanner()
+        # 优化计算在后台线程排队执行
+        self.job_runner = BackgroundJobRunner(max_concurrent=2, parent=self)
+        self.job_callbacks = {}
+        self.job_runner.job_added.connect(self.on_job_added)
+        self.job_runner.job_progress.connect(self.on_job_progress)
+        self.job_runner.job_finished.connect(self.on_job_finished)
+        self.job_runner.job_failed.connect(self.on_job_failed)
+        self.job_runner.job_cancelled.connect(self.on_job_cancelled)
         self.init_ui()
         self.load_waste_data()
         self.load_product_standards()
+        # 有备份权限时在后台按设置定时自动备份
+        self.auto_backup = None
+        if self.user_manager and self.user_manager.has_permission('backup'):
+            from user_management import AutoBackupService
+            self.auto_backup = AutoBackupService(self.user_manager, self)
+
+    @property
+    def inventory(self):
+        return self.planner.inventory
+
+    @property
+    def product_standards(self):
+        return self.planner.product_standards
 
     def load_waste_data(self):
+        """全量加载废料库存"""
         try:
             conn = get_db_conn()
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT 名称, 区域, Si, Fe, Cu, Mn, Mg, Zn, Ti, Cr, Ni, Zr, Sr, Bi, Na, Al, 重量, 单价 FROM wastes")
-                self.waste_data = [list(map(str, row)) for row in cursor.fetchall()]
+            self.planner.load_inventory(conn)
             self.refresh_waste_table()
+            
+            invalid_rows = self.inventory.invalid_rows()
+            if len(invalid_rows):
+                names = ", ".join(self.inventory.names[invalid_rows[:10]])
+                QMessageBox.warning(self, "数据警告",
+                                    f"{len(invalid_rows)} 条废料含有无法解析的数值，已排除在合成方案计算之外：\n{names}")
         except Exception as e:
             QMessageBox.critical(self, "数据库错误", str(e))
         finally:
             if 'conn' in locals():
                 conn.close()
 
+    def sync_waste_data(self):
+        """只取上次同步之后变化的废料，无法增量同步时退回全量加载"""
+        if self.planner.watermark is None:
+            self.load_waste_data()
+            return
+        try:
+            conn = get_db_conn()
+            inventory = self.inventory
+            changes = self.planner.sync_inventory(conn)
+            if changes is None and self.inventory is not inventory:
+                # 期间恢复过备份，已全量重新加载
+                self.refresh_waste_table()
+            else:
+                self.show_waste_changes(changes)
+        except Exception as e:
+            QMessageBox.critical(self, "数据库错误", str(e))
+        finally:
+            if 'conn' in locals():
+                conn.close()
+
+    def apply_waste_changes(self, rows=(), deleted_names=()):
+        """把若干行的新增/修改/删除应用到内存中的库存和表格"""
+        self.show_waste_changes(self.planner.apply_changes(rows, deleted_names))
+
+    def show_waste_changes(self, changes):
+        """把库存的变化更新到表格，changes 为 BlendPlanner.apply_changes 的返回值"""
+        if changes is None:
+            return
+        self.waste_model.apply_changes(*changes)
+        self.update_area_combo()
+
     def load_product_standards(self):
         try:
             conn = get_db_conn()
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT name, ranges FROM product_standards")
-                self.product_standards = []
-                for row in cursor.fetchall():
-                    self.product_standards.append({
-                        'name': row[0],
-                        'ranges': json.loads(row[1])
-                    })
+            self.planner.load_standards(conn)
             self.refresh_standard_table()
         except Exception as e:
             QMessageBox.critical(self, "数据库错误", str(e))
@@ -279,22 +606,48 @@ class WasteManager(QMainWindow):
         title.setAlignment(Qt.AlignmentFlag.AlignCenter)
         layout.addWidget(title)
         
-        self.waste_table = QTableWidget(0, len(WASTE_FIELDS))
-        self.waste_table.setHorizontalHeaderLabels(WASTE_FIELDS)
+        # 筛选
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("名称搜索:"))
+        self.waste_search_edit = QLineEdit()
+        self.waste_search_edit.setPlaceholderText("输入废料名称关键字")
+        filter_layout.addWidget(self.waste_search_edit)
+        filter_layout.addWidget(QLabel("区域:"))
+        self.waste_area_combo = QComboBox()
+        self.waste_area_combo.addItem(ALL_AREAS)
+        filter_layout.addWidget(self.waste_area_combo)
+        layout.addLayout(filter_layout)
+        
+        # 表格只绘制可见行，代理模型负责筛选，排序由源模型完成
+        self.waste_model = WasteTableModel(WASTE_FIELDS, self.inventory, self)
+        self.waste_proxy = WasteFilterProxyModel(self)
+        self.waste_proxy.setSourceModel(self.waste_model)
+        self.waste_table = QTableView()
+        self.waste_table.setModel(self.waste_proxy)
+        self.waste_table.setSortingEnabled(True)
+        self.waste_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.waste_table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.waste_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
         layout.addWidget(self.waste_table)
         
+        self.waste_search_edit.textChanged.connect(self.waste_proxy.set_keyword)
+        self.waste_area_combo.currentTextChanged.connect(self.waste_proxy.set_area)
+        
         btn_layout = QHBoxLayout()
         self.btn_add = QPushButton("添加废料")
         self.btn_edit = QPushButton("编辑废料")
         self.btn_delete = QPushButton("删除废料")
+        self.btn_refresh_waste = QPushButton("刷新")
         btn_layout.addWidget(self.btn_add)
         btn_layout.addWidget(self.btn_edit)
         btn_layout.addWidget(self.btn_delete)
+        btn_layout.addWidget(self.btn_refresh_waste)
         layout.addLayout(btn_layout)
         
         self.btn_add.clicked.connect(self.add_waste)
         self.btn_edit.clicked.connect(self.edit_waste)
         self.btn_delete.clicked.connect(self.delete_waste)
+        self.btn_refresh_waste.clicked.connect(self.sync_waste_data)
         
         self.tab_widget.addTab(waste_widget, "废料管理")
 
@@ -349,10 +702,166 @@ class WasteManager(QMainWindow):
         area_layout.addWidget(self.area_combo)
         layout.addLayout(area_layout)
         
+        # 产量设置
+        charge_layout = QHBoxLayout()
+        charge_layout.addWidget(QLabel("产量模式:"))
+        self.charge_mode_combo = QComboBox()
+        self.charge_mode_combo.addItems(["指定产量", "炉次范围"])
+        self.charge_mode_combo.currentIndexChanged.connect(self.update_charge_mode)
+        charge_layout.addWidget(self.charge_mode_combo)
+        
+        charge_layout.addWidget(QLabel("目标产量:"))
+        self.target_weight_spin = QDoubleSpinBox()
+        # 产量和装料下限至少 1 kg，否则全部取 0 即为“最优”的空方案
+        self.target_weight_spin.setRange(1, 1e7)
+        self.target_weight_spin.setDecimals(1)
+        self.target_weight_spin.setValue(1000)
+        self.target_weight_spin.setSuffix(" kg")
+        charge_layout.addWidget(self.target_weight_spin)
+        
+        charge_layout.addWidget(QLabel("装料范围:"))
+        self.min_weight_spin = QDoubleSpinBox()
+        self.min_weight_spin.setRange(1, 1e7)
+        self.min_weight_spin.setDecimals(1)
+        self.min_weight_spin.setValue(800)
+        self.min_weight_spin.setSuffix(" kg")
+        charge_layout.addWidget(self.min_weight_spin)
+        charge_layout.addWidget(QLabel("~"))
+        self.max_weight_spin = QDoubleSpinBox()
+        self.max_weight_spin.setRange(0, 1e7)
+        self.max_weight_spin.setDecimals(1)
+        self.max_weight_spin.setValue(1200)
+        self.max_weight_spin.setSuffix(" kg")
+        charge_layout.addWidget(self.max_weight_spin)
+        charge_layout.addStretch()
+        layout.addLayout(charge_layout)
+        self.update_charge_mode()
+        
+        # 实际取用限制：设置任一项时按混合整数规划求解
+        integer_layout = QHBoxLayout()
+        integer_layout.addWidget(QLabel("最小取用量:"))
+        self.min_take_spin = QDoubleSpinBox()
+        self.min_take_spin.setRange(0, 1e6)
+        self.min_take_spin.setDecimals(1)
+        self.min_take_spin.setSuffix(" kg")
+        self.min_take_spin.setSpecialValueText("不限")
+        integer_layout.addWidget(self.min_take_spin)
+        
+        integer_layout.addWidget(QLabel("每件重量(全部废料相同):"))
+        self.unit_weight_spin = QDoubleSpinBox()
+        self.unit_weight_spin.setToolTip("库存中没有记录各批废料的件重，只能按同一件重取整")
+        self.unit_weight_spin.setRange(0, 1e5)
+        self.unit_weight_spin.setDecimals(1)
+        self.unit_weight_spin.setSuffix(" kg")
+        self.unit_weight_spin.setSpecialValueText("不按件")
+        integer_layout.addWidget(self.unit_weight_spin)
+        
+        integer_layout.addWidget(QLabel("最多批数:"))
+        self.max_lots_spin = QSpinBox()
+        self.max_lots_spin.setRange(0, 1000)
+        self.max_lots_spin.setSpecialValueText("不限")
+        integer_layout.addWidget(self.max_lots_spin)
+        
+        integer_layout.addWidget(QLabel("时间上限:"))
+        self.mip_time_spin = QSpinBox()
+        self.mip_time_spin.setRange(1, 3600)
+        self.mip_time_spin.setValue(MILP_TIME_LIMIT)
+        self.mip_time_spin.setSuffix(" s")
+        integer_layout.addWidget(self.mip_time_spin)
+        
+        integer_layout.addWidget(QLabel("允许间隙:"))
+        self.mip_gap_spin = QDoubleSpinBox()
+        self.mip_gap_spin.setRange(0, 10)
+        self.mip_gap_spin.setDecimals(2)
+        self.mip_gap_spin.setValue(MILP_GAP * 100)
+        self.mip_gap_spin.setSuffix(" %")
+        integer_layout.addWidget(self.mip_gap_spin)
+        integer_layout.addStretch()
+        layout.addLayout(integer_layout)
+        
+        # 成分偏差：化验值有误差时按区间稳健或机会约束求解，结果附带蒙特卡洛达标概率
+        robust_layout = QHBoxLayout()
+        robust_layout.addWidget(QLabel("成分偏差:"))
+        self.robust_combo = QComboBox()
+        self.robust_combo.addItem("不考虑", None)
+        for mode, label in ROBUST_MODES.items():
+            self.robust_combo.addItem(label, mode)
+        robust_layout.addWidget(self.robust_combo)
+        
+        robust_layout.addWidget(QLabel("各元素达标概率:"))
+        self.confidence_spin = QDoubleSpinBox()
+        self.confidence_spin.setToolTip("对每个元素的上下限分别成立，全部元素同时达标的概率可能更低")
+        self.confidence_spin.setRange(50, 99.9)
+        self.confidence_spin.setDecimals(1)
+        self.confidence_spin.setValue(95)
+        self.confidence_spin.setSuffix(" %")
+        robust_layout.addWidget(self.confidence_spin)
+        
+        robust_layout.addWidget(QLabel("未记录偏差按含量的:"))
+        self.default_uncertainty_spin = QDoubleSpinBox()
+        self.default_uncertainty_spin.setRange(0, 50)
+        self.default_uncertainty_spin.setDecimals(1)
+        self.default_uncertainty_spin.setSuffix(" %")
+        robust_layout.addWidget(self.default_uncertainty_spin)
+        robust_layout.addStretch()
+        layout.addLayout(robust_layout)
+        
         # 计算按钮
         self.btn_calc = QPushButton("计算最佳合成方案")
         self.btn_calc.clicked.connect(self.calculate_optimization)
-        layout.addWidget(self.btn_calc)
+        self.btn_calc_all = QPushButton("批量计算全部标准")
+        self.btn_calc_all.clicked.connect(self.calculate_all_standards)
+        self.btn_plan = QPushButton("多订单排产")
+        self.btn_plan.clicked.connect(self.open_production_plan)
+        calc_layout = QHBoxLayout()
+        calc_layout.addWidget(self.btn_calc)
+        calc_layout.addWidget(self.btn_calc_all)
+        calc_layout.addWidget(self.btn_plan)
+        layout.addLayout(calc_layout)
+        
+        # 成本权衡曲线：成本与安全裕度或使用批数之间取一组方案，由计划员挑选
+        pareto_layout = QHBoxLayout()
+        pareto_layout.addWidget(QLabel("成本权衡:"))
+        self.pareto_axis_combo = QComboBox()
+        for axis, label in PARETO_AXES.items():
+            self.pareto_axis_combo.addItem(label, axis)
+        pareto_layout.addWidget(self.pareto_axis_combo)
+        pareto_layout.addWidget(QLabel("取点数:"))
+        self.pareto_points_spin = QSpinBox()
+        self.pareto_points_spin.setRange(3, 50)
+        self.pareto_points_spin.setValue(PARETO_POINTS)
+        pareto_layout.addWidget(self.pareto_points_spin)
+        self.btn_pareto = QPushButton("计算成本权衡曲线")
+        self.btn_pareto.clicked.connect(self.calculate_pareto)
+        pareto_layout.addWidget(self.btn_pareto)
+        pareto_layout.addStretch()
+        layout.addLayout(pareto_layout)
+        
+        # 计算任务队列
+        job_group = QGroupBox("计算任务")
+        job_layout = QVBoxLayout(job_group)
+        self.job_table = QTableWidget(0, 4)
+        self.job_table.setHorizontalHeaderLabels(["任务", "状态", "进度", "操作"])
+        job_layout.addWidget(self.job_table)
+        job_btn_layout = QHBoxLayout()
+        self.btn_clear_jobs = QPushButton("清除已结束任务")
+        self.btn_clear_jobs.clicked.connect(self.clear_finished_jobs)
+        job_btn_layout.addStretch()
+        job_btn_layout.addWidget(self.btn_clear_jobs)
+        job_layout.addLayout(job_btn_layout)
+        layout.addWidget(job_group)
+        
+        # 成本权衡曲线，计算后显示
+        self.pareto_group = QGroupBox("成本权衡曲线（点击曲线上的点查看方案）")
+        pareto_chart_layout = QVBoxLayout(self.pareto_group)
+        self.pareto_figure = Figure(figsize=(6, 3), tight_layout=True)
+        self.pareto_canvas = FigureCanvasQTAgg(self.pareto_figure)
+        self.pareto_canvas.setMinimumHeight(240)
+        self.pareto_canvas.mpl_connect('pick_event', self.on_pareto_pick)
+        pareto_chart_layout.addWidget(self.pareto_canvas)
+        self.pareto_group.hide()
+        self.pareto_points = []
+        layout.addWidget(self.pareto_group)
         
         # 结果显示区域
         self.result_text = QTextEdit()
@@ -400,6 +909,10 @@ class WasteManager(QMainWindow):
         # 帮助菜单
         help_menu = menubar.addMenu("帮助")
         
+        pool_action = QAction("数据库连接状态", self)
+        pool_action.triggered.connect(self.show_pool_stats)
+        help_menu.addAction(pool_action)
+        
         about_action = QAction("关于", self)
         about_action.triggered.connect(self.show_about)
         help_menu.addAction(about_action)
@@ -454,11 +967,29 @@ class WasteManager(QMainWindow):
                          "• 操作日志记录\n"
                          "• 数据备份恢复")
 
+    def show_pool_stats(self):
+        """显示数据库连接池和求解缓存统计"""
+        stats = pool_stats()
+        cache = get_solver_cache().stats()
+        QMessageBox.information(self, "数据库连接状态",
+                                f"连接数: {stats['size']} / {stats['max_size']}\n"
+                                f"使用中: {stats['in_use']}    空闲: {stats['idle']}\n"
+                                f"取用次数: {stats['checkouts']}    复用: {stats['reused']}    新建: {stats['created']}\n"
+                                f"等待次数: {stats['waits']}    健康检查: {stats['health_checks']}\n"
+                                f"空闲回收: {stats['closed_idle']}    断开丢弃: {stats['closed_broken']}\n\n"
+                                f"求解缓存: {cache['entries']} / {cache['max_entries']} 条\n"
+                                f"命中: {cache['hits']}    未命中: {cache['misses']}    淘汰: {cache['evictions']}")
+
     def refresh_waste_table(self):
-        self.waste_table.setRowCount(len(self.waste_data))
-        for row, data in enumerate(self.waste_data):
-            for col, value in enumerate(data):
-                self.waste_table.setItem(row, col, QTableWidgetItem(str(value)))
+        self.waste_model.set_inventory(self.inventory)
+        self.update_area_combo()
+
+    def current_waste_row(self):
+        """当前选中废料在库存中的行号，未选中时返回 -1"""
+        index = self.waste_table.currentIndex()
+        if not index.isValid():
+            return -1
+        return self.waste_model.inventory_row(self.waste_proxy.mapToSource(index).row())
 
     def refresh_standard_table(self):
         self.standard_table.setRowCount(len(self.product_standards))
@@ -485,18 +1016,59 @@ class WasteManager(QMainWindow):
         self.update_area_combo()
 
     def update_area_combo(self):
-        """更新区域筛选下拉框"""
-        self.area_combo.clear()
-        self.area_combo.addItem("全部区域")
-        
-        # 获取所有区域
-        areas = set()
-        for row in self.waste_data:
-            if len(row) > 1:  # 确保有区域字段
-                areas.add(row[1])
-        
-        for area in sorted(areas):
-            self.area_combo.addItem(area)
+        """更新区域筛选下拉框，保留当前选择"""
+        for combo in (self.area_combo, self.waste_area_combo):
+            current = combo.currentText()
+            combo.blockSignals(True)
+            combo.clear()
+            combo.addItem(ALL_AREAS)
+            combo.addItems(self.inventory.area_list())
+            index = combo.findText(current)
+            combo.setCurrentIndex(max(index, 0))
+            combo.blockSignals(False)
+        self.waste_proxy.set_area(self.waste_area_combo.currentText())
+
+    def update_charge_mode(self):
+        """根据产量模式启用对应的输入框"""
+        mode = self.charge_mode_combo.currentText()
+        self.target_weight_spin.setEnabled(mode == "指定产量")
+        self.min_weight_spin.setEnabled(mode == "炉次范围")
+        self.max_weight_spin.setEnabled(mode == "炉次范围")
+
+    def get_charge_settings(self):
+        """获取产量约束参数"""
+        mode = self.charge_mode_combo.currentText()
+        if mode == "指定产量":
+            return {'target_weight': self.target_weight_spin.value()}
+        return {
+            'min_weight': self.min_weight_spin.value(),
+            'max_weight': self.max_weight_spin.value()
+        }
+
+    def get_integer_settings(self):
+        """获取最小取用量、整件取用和批数限制，都未设置时返回空字典（按线性规划求解）"""
+        settings = {}
+        if self.min_take_spin.value() > 0:
+            settings['min_take'] = self.min_take_spin.value()
+        if self.unit_weight_spin.value() > 0:
+            settings['unit_weight'] = self.unit_weight_spin.value()
+        if self.max_lots_spin.value() > 0:
+            settings['max_lots'] = self.max_lots_spin.value()
+        if settings:
+            settings['time_limit'] = self.mip_time_spin.value()
+            settings['mip_gap'] = self.mip_gap_spin.value() / 100
+        return settings
+
+    def get_robust_settings(self):
+        """获取成分偏差的处理方式，不考虑且没有默认偏差时返回空字典"""
+        settings = {}
+        if self.default_uncertainty_spin.value() > 0:
+            settings['default_uncertainty'] = self.default_uncertainty_spin.value() / 100
+        mode = self.robust_combo.currentData()
+        if mode:
+            settings['robust'] = mode
+            settings['confidence'] = self.confidence_spin.value() / 100
+        return settings
 
     def update_area_filter(self):
         """更新区域筛选"""
@@ -515,11 +1087,19 @@ class WasteManager(QMainWindow):
             try:
                 conn = get_db_conn()
                 with conn.cursor() as cursor:
-                    sql = ("INSERT INTO wastes (名称, 区域, Si, Fe, Cu, Mn, Mg, Zn, Ti, Cr, Ni, Zr, Sr, Bi, Na, Al, 重量, 单价) "
-                           "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)")
+                    fields = "名称, 区域, Si, Fe, Cu, Mn, Mg, Zn, Ti, Cr, Ni, Zr, Sr, Bi, Na, Al, 重量, 单价"
+                    if self.planner.uncertainty_enabled:
+                        fields += f", {waste_sync.UNCERTAINTY_COLUMN}"
+                    else:
+                        data = data[:len(WASTE_FIELDS)]
+                    sql = f"INSERT INTO wastes ({fields}) VALUES ({', '.join(['%s'] * len(data))})"
+                    conn.begin()
                     cursor.execute(sql, data)
+                    if self.planner.sync_enabled:
+                        waste_sync.clear_deletion(cursor, data[0])
                     conn.commit()
-                self.load_waste_data()
+                self.apply_waste_changes([data])
+                self.sync_waste_data()
                 
                 # 记录操作日志
                 if self.user_manager:
@@ -534,21 +1114,28 @@ class WasteManager(QMainWindow):
                     conn.close()
 
     def edit_waste(self):
-        row = self.waste_table.currentRow()
+        row = self.current_waste_row()
         if row < 0:
             QMessageBox.warning(self, "提示", "请先选择要编辑的废料")
             return
-        dlg = WasteDialog(self, self.waste_data[row])
+        name = self.inventory.names[row]
+        dlg = WasteDialog(self, self.inventory.row(row) + [self.inventory.uncertainty_text(row)])
         if dlg.exec():
             data = dlg.get_data()
             try:
                 conn = get_db_conn()
                 with conn.cursor() as cursor:
                     sql = ("UPDATE wastes SET 区域=%s, Si=%s, Fe=%s, Cu=%s, Mn=%s, Mg=%s, Zn=%s, Ti=%s, Cr=%s, Ni=%s, "
-                           "Zr=%s, Sr=%s, Bi=%s, Na=%s, Al=%s, 重量=%s, 单价=%s WHERE 名称=%s")
-                    cursor.execute(sql, data[1:] + [data[0]])
+                           "Zr=%s, Sr=%s, Bi=%s, Na=%s, Al=%s, 重量=%s, 单价=%s")
+                    if self.planner.uncertainty_enabled:
+                        sql += f", {waste_sync.UNCERTAINTY_COLUMN}=%s"
+                    else:
+                        data = data[:len(WASTE_FIELDS)]
+                    cursor.execute(sql + " WHERE 名称=%s", data[1:] + [data[0]])
                     conn.commit()
-                self.load_waste_data()
+                if data[0] == name:
+                    self.apply_waste_changes([data])
+                self.sync_waste_data()
             except Exception as e:
                 QMessageBox.critical(self, "数据库错误", str(e))
             finally:
@@ -556,17 +1143,21 @@ class WasteManager(QMainWindow):
                     conn.close()
 
     def delete_waste(self):
-        row = self.waste_table.currentRow()
+        row = self.current_waste_row()
         if row < 0:
             QMessageBox.warning(self, "提示", "请先选择要删除的废料")
             return
-        name = self.waste_data[row][0]
+        name = self.inventory.names[row]
         try:
             conn = get_db_conn()
             with conn.cursor() as cursor:
+                conn.begin()
                 cursor.execute("DELETE FROM wastes WHERE 名称=%s", (name,))
+                if self.planner.sync_enabled:
+                    waste_sync.record_deletion(cursor, name)
                 conn.commit()
-            self.load_waste_data()
+            self.apply_waste_changes(deleted_names=[name])
+            self.sync_waste_data()
         except Exception as e:
             QMessageBox.critical(self, "数据库错误", str(e))
         finally:
@@ -639,7 +1230,7 @@ class WasteManager(QMainWindow):
         dlg.exec()
 
     def calculate_optimization(self):
-        if not self.waste_data:
+        if not len(self.inventory):
             QMessageBox.warning(self, "提示", "没有废料数据")
             return
         
@@ -662,146 +1253,217 @@ class WasteManager(QMainWindow):
         # 获取选中的区域
         selected_area = self.area_combo.currentText()
         
-        # 执行优化计算
-        result = self.optimize_mix(selected_standard, selected_area)
+        # 产量设置
+        charge_settings = self.get_charge_settings()
+        if charge_settings.get('min_weight', 0) > charge_settings.get('max_weight', float('inf')):
+            QMessageBox.warning(self, "提示", "装料范围下限不能大于上限")
+            return
+        charge_settings.update(self.get_integer_settings())
+        charge_settings.update(self.get_robust_settings())
+        
+        # 在后台执行优化计算
+        self.submit_job(f"合成方案: {selected_standard_name} ({selected_area})",
+                        self.show_optimization_result,
+                        self.planner.optimize_mix, selected_standard, selected_area, **charge_settings)
+
+    def show_optimization_result(self, result):
+        if not result['feasible']:
+            QMessageBox.warning(self, "计算结果", result['message'])
+            return
         
         # 显示结果
         dlg = OptimizationResultDialog(self, result)
+        dlg.show()
+
+    def submit_job(self, title, on_result, func, *args, **kwargs):
+        """提交后台计算任务，完成后在界面线程中调用 on_result(result)"""
+        job_id = self.job_runner.submit(title, func, *args, **kwargs)
+        self.job_callbacks[job_id] = on_result
+        return job_id
+
+    def _job_row(self, job_id):
+        for row in range(self.job_table.rowCount()):
+            if self.job_table.item(row, 0).data(Qt.ItemDataRole.UserRole) == job_id:
+                return row
+        return -1
+
+    def on_job_added(self, job_id, title):
+        row = self.job_table.rowCount()
+        self.job_table.insertRow(row)
+        title_item = QTableWidgetItem(title)
+        title_item.setData(Qt.ItemDataRole.UserRole, job_id)
+        self.job_table.setItem(row, 0, title_item)
+        self.job_table.setItem(row, 1, QTableWidgetItem("排队中"))
+        progress_bar = QProgressBar()
+        progress_bar.setRange(0, 100)
+        self.job_table.setCellWidget(row, 2, progress_bar)
+        cancel_btn = QPushButton("取消")
+        cancel_btn.setToolTip("排队中的任务立即取消；正在计算的任务在当前这次求解结束后停止，"
+                              "单次求解无法中途打断（混合整数规划最长到时间上限）")
+        cancel_btn.clicked.connect(lambda checked, j=job_id: self.cancel_job(j))
+        self.job_table.setCellWidget(row, 3, cancel_btn)
+
+    def cancel_job(self, job_id):
+        self.job_runner.cancel(job_id)
+        row = self._job_row(job_id)
+        if job_id in self.job_runner.jobs and row >= 0:
+            # 正在计算的任务要等当前这次求解结束
+            self.job_table.item(row, 1).setText("正在取消，等待当前求解结束")
+            self.job_table.cellWidget(row, 3).setEnabled(False)
+
+    def on_job_progress(self, job_id, percent, text):
+        row = self._job_row(job_id)
+        if row >= 0 and job_id in self.job_runner.jobs and not self.job_runner.jobs[job_id].is_cancelled:
+            self.job_table.item(row, 1).setText(text or "计算中")
+            self.job_table.cellWidget(row, 2).setValue(percent)
+
+    def _end_job(self, job_id, status):
+        self.job_callbacks.pop(job_id, None)
+        row = self._job_row(job_id)
+        if row >= 0:
+            self.job_table.item(row, 1).setText(status)
+            self.job_table.cellWidget(row, 3).setEnabled(False)
+            self.job_table.item(row, 0).setData(Qt.ItemDataRole.UserRole + 1, True)
+            title = self.job_table.item(row, 0).text()
+            self.result_text.append(f"[{status}] {title}")
+
+    def on_job_finished(self, job_id, result):
+        callback = self.job_callbacks.get(job_id)
+        row = self._job_row(job_id)
+        if row >= 0:
+            self.job_table.cellWidget(row, 2).setValue(100)
+        self._end_job(job_id, "完成")
+        if callback:
+            callback(result)
+
+    def on_job_failed(self, job_id, message):
+        self._end_job(job_id, "失败")
+        QMessageBox.critical(self, "计算错误", message)
+
+    def on_job_cancelled(self, job_id):
+        self._end_job(job_id, "已取消")
+
+    def clear_finished_jobs(self):
+        """从任务列表中移除已结束的任务"""
+        for row in reversed(range(self.job_table.rowCount())):
+            if self.job_table.item(row, 0).data(Qt.ItemDataRole.UserRole + 1):
+                self.job_table.removeRow(row)
+
+    def closeEvent(self, event):
+        self.job_runner.cancel_all()
+        if self.auto_backup is not None:
+            self.auto_backup.stop()
+        super().closeEvent(event)
+
+    def calculate_all_standards(self):
+        """批量计算全部产品标准"""
+        if not len(self.inventory):
+            QMessageBox.warning(self, "提示", "没有废料数据")
+            return
+        
+        if not self.product_standards:
+            QMessageBox.warning(self, "提示", "没有产品标准")
+            return
+        
+        selected_area = self.area_combo.currentText()
+        charge_settings = self.get_charge_settings()
+        if charge_settings.get('min_weight', 0) > charge_settings.get('max_weight', float('inf')):
+            QMessageBox.warning(self, "提示", "装料范围下限不能大于上限")
+            return
+        charge_settings.update(self.get_integer_settings())
+        charge_settings.update(self.get_robust_settings())
+        
+        self.submit_job(f"批量计算全部标准 ({selected_area})",
+                        lambda rows: self.show_batch_result(rows, selected_area),
+                        self.planner.optimize_standards, selected_area=selected_area, **charge_settings)
+
+    def show_batch_result(self, rows, selected_area):
+        if rows is None:
+            QMessageBox.warning(self, "提示", f'在区域 "{selected_area}" 中没有找到废料数据')
+            return
+        
+        dlg = BatchOptimizationDialog(self, rows)
+        dlg.show()
+
+    def calculate_pareto(self):
+        """计算当前产品标准的成本权衡曲线"""
+        if not len(self.inventory):
+            QMessageBox.warning(self, "提示", "没有废料数据")
+            return
+        
+        standard_name = self.standard_combo.currentText()
+        standard = next((s for s in self.product_standards if s['name'] == standard_name), None)
+        if standard is None:
+            QMessageBox.warning(self, "提示", "请选择产品标准")
+            return
+        
+        selected_area = self.area_combo.currentText()
+        charge_settings = self.get_charge_settings()
+        if charge_settings.get('min_weight', 0) > charge_settings.get('max_weight', float('inf')):
+            QMessageBox.warning(self, "提示", "装料范围下限不能大于上限")
+            return
+        charge_settings.update(self.get_integer_settings())
+        charge_settings.update(self.get_robust_settings())
+        
+        axis = self.pareto_axis_combo.currentData()
+        self.submit_job(f"成本权衡曲线: {standard_name} 成本-{PARETO_AXES[axis]} ({selected_area})",
+                        lambda sweep: self.show_pareto(sweep, standard_name),
+                        self.planner.pareto_front, standard, selected_area, axis, self.pareto_points_spin.value(),
+                        **charge_settings)
+
+    def show_pareto(self, sweep, standard_name):
+        """在合成方案页绘制成本权衡曲线，Pareto 有效的点连成折线，被占优的点为灰色"""
+        if not sweep['feasible']:
+            QMessageBox.warning(self, "计算结果", sweep['message'])
+            return
+        
+        axis = sweep['axis']
+        self.pareto_points = [p for p in sweep['points'] if p['feasible']]
+        efficient = [p for p in self.pareto_points if p['efficient']]
+        
+        self.pareto_figure.clear()
+        ax = self.pareto_figure.add_subplot(111)
+        ax.plot([p[axis] for p in efficient], [p['total_cost'] for p in efficient], color='tab:blue', zorder=1)
+        ax.scatter([p[axis] for p in self.pareto_points], [p['total_cost'] for p in self.pareto_points],
+                   c=['tab:blue' if p['efficient'] else 'lightgray' for p in self.pareto_points],
+                   picker=True, pickradius=6, zorder=2)
+        if axis == 'margin':
+            ax.set_xlabel("离标准上下限的最小距离（百分点）")
+        else:
+            ax.set_xlabel("使用废料批数")
+            ax.xaxis.set_major_locator(MaxNLocator(integer=True))
+        ax.set_ylabel("总成本（元）")
+        ax.set_title(f"{standard_name}：成本与{PARETO_AXES[axis]}")
+        ax.grid(True, alpha=0.3)
+        self.pareto_canvas.draw()
+        self.pareto_group.show()
+        
+        skipped = len(sweep['points']) - len(self.pareto_points)
+        if skipped:
+            self.result_text.append(f"成本权衡曲线: {skipped} 个点无解或在时限内未找到方案，未画出")
+
+    def on_pareto_pick(self, event):
+        """点击曲线上的点时显示对应的方案"""
+        if not len(event.ind):
+            return
+        point = self.pareto_points[event.ind[0]]
+        dlg = OptimizationResultDialog(self, point['result'])
+        dlg.show()
+
+    def open_production_plan(self):
+        """打开多订单排产对话框"""
+        if not len(self.inventory):
+            QMessageBox.warning(self, "提示", "没有废料数据")
+            return
+        
+        if not self.product_standards:
+            QMessageBox.warning(self, "提示", "没有产品标准")
+            return
+        
+        selected_area = self.area_combo.currentText()
+        dlg = ProductionPlanDialog(self, self.product_standards,
+                                   lambda orders, callback: self.submit_job(
+                                       f"多订单排产: {len(orders)} 个订单", callback,
+                                       self.planner.plan_production, orders, selected_area))
         dlg.exec()
 
-    def optimize_mix(self, standard, selected_area="全部区域"):
-        """优化混合方案"""
-        try:
-            # 根据区域筛选废料数据
-            filtered_waste_data = self.waste_data
-            if selected_area != "全部区域":
-                filtered_waste_data = [row for row in self.waste_data if row[1] == selected_area]
-            
-            if not filtered_waste_data:
-                return {
-                    'feasible': False,
-                    'message': f'在区域 "{selected_area}" 中没有找到废料数据'
-                }
-            
-            # 准备数据
-            waste_names = [row[0] for row in filtered_waste_data]
-            waste_areas = [row[1] for row in filtered_waste_data]  # 区域
-            waste_weights = [float(row[16]) for row in filtered_waste_data]  # 重量
-            waste_prices = [float(row[17]) for row in filtered_waste_data]   # 单价
-            
-            # 元素含量矩阵 (废料数量 x 元素数量)
-            element_matrix = []
-            for row in filtered_waste_data:
-                element_row = []
-                for i in range(2, 16):  # Si到Al的14个元素（跳过名称和区域）
-                    try:
-                        element_row.append(float(row[i]) / 100.0)  # 转换为小数
-                    except:
-                        element_row.append(0.0)
-                element_matrix.append(element_row)
-            
-            element_matrix = np.array(element_matrix)
-            
-            # 目标范围
-            target_ranges = standard['ranges']
-            
-            # 定义目标函数：最小化总成本
-            def objective(x):
-                return np.sum(x * waste_prices)
-            
-            # 约束条件
-            constraints = []
-            
-            # 元素含量约束
-            for i, element in enumerate(ELEMENT_FIELDS):
-                if element in target_ranges:
-                    min_val = target_ranges[element]['min'] / 100.0
-                    max_val = target_ranges[element]['max'] / 100.0
-                    
-                    # 最小含量约束
-                    constraints.append({
-                        'type': 'ineq',
-                        'fun': lambda x, i=i, min_val=min_val: 
-                              np.sum(x * element_matrix[:, i]) - min_val * np.sum(x)
-                    })
-                    
-                    # 最大含量约束
-                    constraints.append({
-                        'type': 'ineq',
-                        'fun': lambda x, i=i, max_val=max_val: 
-                              max_val * np.sum(x) - np.sum(x * element_matrix[:, i])
-                    })
-            
-            # 重量约束
-            for i in range(len(waste_names)):
-                constraints.append({
-                    'type': 'ineq',
-                    'fun': lambda x, i=i, max_weight=waste_weights[i]: max_weight - x[i]
-                })
-            
-            # 非负约束
-            bounds = [(0, None)] * len(waste_names)
-            
-            # 初始猜测
-            x0 = np.array(waste_weights) * 0.1  # 使用10%的库存作为初始值
-            
-            # 优化
-            result = minimize(
-                objective, x0, 
-                method='SLSQP',
-                bounds=bounds,
-                constraints=constraints,
-                options={'maxiter': 1000}
-            )
-            
-            if result.success:
-                # 计算结果
-                optimal_weights = result.x
-                total_weight = np.sum(optimal_weights)
-                total_cost = result.fun
-                avg_price = total_cost / total_weight if total_weight > 0 else 0
-                
-                # 计算元素含量
-                element_analysis = {}
-                for i, element in enumerate(ELEMENT_FIELDS):
-                    if element in target_ranges:
-                        content = np.sum(optimal_weights * element_matrix[:, i]) / total_weight * 100
-                        target_min = target_ranges[element]['min']
-                        target_max = target_ranges[element]['max']
-                        in_range = target_min <= content <= target_max
-                        
-                        element_analysis[element] = {
-                            'content': content,
-                            'target_min': target_min,
-                            'target_max': target_max,
-                            'in_range': in_range
-                        }
-                
-                # 废料配比
-                waste_mix = {}
-                for i, name in enumerate(waste_names):
-                    if optimal_weights[i] > 0.001:  # 忽略很小的值
-                        waste_mix[name] = {
-                            'weight': optimal_weights[i],
-                            'area': waste_areas[i]
-                        }
-                
-                return {
-                    'feasible': True,
-                    'total_weight': total_weight,
-                    'total_cost': total_cost,
-                    'avg_price': avg_price,
-                    'waste_mix': waste_mix,
-                    'element_analysis': element_analysis
-                }
-            else:
-                return {
-                    'feasible': False,
-                    'message': '无法找到可行解'
-                }
-                
-        except Exception as e:
-            return {
-                'feasible': False,
-                'message': f'计算错误: {str(e)}'
-            }
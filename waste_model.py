@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+废料库存表格模型
+QTableView 只绘制可见行；排序由源模型用 numpy 计算行顺序，代理模型只负责筛选
+"""
+
+import numpy as np
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+from PyQt6.QtGui import QColor
+
+from inventory import ALL_AREAS, NUMERIC_START, WEIGHT_COL
+
+
+class WasteTableModel(QAbstractTableModel):
+    """以 Inventory 为数据源的只读表格模型
+
+    order[表格行] = 库存行，排序只重排 order，不复制数据
+    """
+
+    # 一次增删超过此行数时直接重置模型，比逐行通知快
+    RESET_THRESHOLD = 200
+
+    def __init__(self, headers, inventory, parent=None):
+        super().__init__(parent)
+        self.headers = headers
+        self.inventory = inventory
+        self.order = np.arange(len(inventory))
+        self.sort_column = -1
+        self.sort_order = Qt.SortOrder.AscendingOrder
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def inventory_row(self, row):
+        """表格行对应的库存行"""
+        return int(self.order[row])
+
+    def _positions(self):
+        """库存行对应的表格行"""
+        position = np.empty(len(self.order), dtype=int)
+        position[self.order] = np.arange(len(self.order))
+        return position
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row, col = int(self.order[index.row()]), index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.inventory.cell_text(row, col)
+        if role == Qt.ItemDataRole.TextAlignmentRole and col >= NUMERIC_START:
+            return int(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        if role == Qt.ItemDataRole.ForegroundRole and col >= NUMERIC_START \
+                and self.inventory.invalid[row, col - NUMERIC_START]:
+            return QColor("red")
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.headers[section]
+        return str(section + 1)
+
+    def _sorted_order(self):
+        """按当前排序列计算行顺序（稳定排序）"""
+        inv = self.inventory
+        col = self.sort_column
+        if col < 0:
+            return np.arange(len(inv))
+        if col == 0:
+            key = inv.name_codes  # 类别数组已排序，编码顺序即名称顺序
+        elif col == 1:
+            key = inv.area_codes
+        elif col < WEIGHT_COL:
+            key = inv.composition[:, col - NUMERIC_START]
+        else:
+            key = inv.weights if col == WEIGHT_COL else inv.prices
+        if self.sort_order == Qt.SortOrder.DescendingOrder:
+            key = -key.astype(float)
+        return np.argsort(key, kind='stable')
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        self.sort_column = column
+        self.sort_order = order
+        self.layoutAboutToBeChanged.emit()
+        old_order = self.order
+        self.order = self._sorted_order()
+
+        # 选中行等持久索引继续指向同一条库存记录
+        position = self._positions()
+        old_indexes = self.persistentIndexList()
+        new_indexes = [self.index(int(position[old_order[i.row()]]), i.column()) for i in old_indexes]
+        self.changePersistentIndexList(old_indexes, new_indexes)
+        self.layoutChanged.emit()
+
+    def set_inventory(self, inventory):
+        """替换数据源；行集合不变时只刷新内容有变化的行"""
+        old = self.inventory
+        if len(old) != len(inventory) or not np.array_equal(old.names, inventory.names):
+            self.beginResetModel()
+            self.inventory = inventory
+            self.order = self._sorted_order()
+            self.endResetModel()
+            return
+
+        self.inventory = inventory
+        changed = (
+            (old.areas != inventory.areas)
+            | np.any(old.composition != inventory.composition, axis=1)
+            | (old.weights != inventory.weights)
+            | (old.prices != inventory.prices)
+            | np.any(old.invalid != inventory.invalid, axis=1)
+        )
+        if self.sort_column >= 0 and changed.any():
+            # 排序列的值可能变了，重新排序
+            self.sort(self.sort_column, self.sort_order)
+        self.rows_changed(np.flatnonzero(changed))
+
+    def apply_changes(self, inventory, removed, updated, appended):
+        """切换到 Inventory.with_changes 得到的新库存，逐行通知视图，选中行和滚动位置不变"""
+        if len(removed) + appended > self.RESET_THRESHOLD:
+            self.beginResetModel()
+            self.inventory = inventory
+            self.order = self._sorted_order()
+            self.endResetModel()
+            return
+
+        if len(removed):
+            # 删除过程中 order 仍指向旧库存，视图看到的数据始终一致
+            for pos in np.sort(self._positions()[removed])[::-1]:
+                self.beginRemoveRows(QModelIndex(), int(pos), int(pos))
+                self.order = np.delete(self.order, pos)
+                self.endRemoveRows()
+            keep = np.ones(len(self.inventory), dtype=bool)
+            keep[removed] = False
+            self.order = (np.cumsum(keep) - 1)[self.order]
+        self.inventory = inventory
+
+        if appended:
+            start = len(self.order)
+            self.beginInsertRows(QModelIndex(), start, start + appended - 1)
+            self.order = np.concatenate([self.order, np.arange(start, start + appended)])
+            self.endInsertRows()
+        if self.sort_column >= 0 and (appended or len(updated)):
+            self.sort(self.sort_column, self.sort_order)
+        self.rows_changed(updated)
+
+    def rows_changed(self, rows):
+        """通知视图指定库存行的数据已变化，连续的表格行合并为一次通知"""
+        rows = np.asarray(rows, dtype=int)
+        if len(rows) == 0:
+            return
+        rows = np.sort(self._positions()[rows])
+        breaks = np.flatnonzero(np.diff(rows) != 1)
+        starts = np.concatenate([[rows[0]], rows[breaks + 1]])
+        ends = np.concatenate([rows[breaks], [rows[-1]]])
+        last_col = self.columnCount() - 1
+        for start, end in zip(starts, ends):
+            self.dataChanged.emit(self.index(int(start), 0), self.index(int(end), last_col))
+
+
+class WasteFilterProxyModel(QSortFilterProxyModel):
+    """按名称关键字和区域筛选，筛选掩码按列向量化计算；排序交给源模型"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.keyword = ""
+        self.area = ALL_AREAS
+        self._mask = None
+        self._mask_inventory = None
+
+    def set_keyword(self, keyword):
+        self.keyword = keyword.strip()
+        self._mask_inventory = None
+        self.invalidateFilter()
+
+    def set_area(self, area):
+        self.area = area or ALL_AREAS
+        self._mask_inventory = None
+        self.invalidateFilter()
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        # 逐行比较在几万行时很慢，直接让源模型用 numpy 排序
+        self.sourceModel().sort(column, order)
+
+    def _filter_mask(self):
+        inventory = self.sourceModel().inventory
+        if self._mask_inventory is not inventory:
+            mask = inventory.area_mask(self.area)
+            if self.keyword and len(inventory):
+                hits = np.array([self.keyword in name for name in inventory.name_categories], dtype=bool)
+                mask &= hits[inventory.name_codes]
+            self._mask = mask
+            self._mask_inventory = inventory
+        return self._mask
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        model = self.sourceModel()
+        return bool(self._filter_mask()[model.order[source_row]])
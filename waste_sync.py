@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+废料库存的增量同步
+wastes.updated_at 记录每行的最后修改时间，waste_deletions 记录被删除的名称；
+客户端保存上次同步的服务器时间（水位线），之后只取水位线以后变化的行
+"""
+
+from datetime import timedelta
+
+WASTE_SELECT = ("SELECT 名称, 区域, Si, Fe, Cu, Mn, Mg, Zn, Ti, Cr, Ni, Zr, Sr, Bi, Na, Al, 重量, 单价 "
+                "FROM wastes")
+
+# 各元素化验偏差（JSON，百分点），放在查询结果最后一列
+UNCERTAINTY_COLUMN = "成分偏差"
+WASTE_SELECT_WITH_UNCERTAINTY = WASTE_SELECT.replace(" FROM wastes", f", {UNCERTAINTY_COLUMN} FROM wastes")
+
+# 晚提交的事务可能带着比水位线略早的时间戳，每次多取这段时间内的变化（重复取到的行按名称覆盖，结果不变）
+SYNC_OVERLAP = timedelta(seconds=2)
+
+# 删除记录保留天数
+DELETION_RETENTION_DAYS = 30
+
+# 恢复备份时写入 waste_deletions 的特殊名称。恢复后的行保留备份中的 updated_at，被清空的行也没有删除记录，
+# 增量同步无法得到这些变化，客户端看到这条记录时改为全量加载
+RESTORE_MARKER = "__restore__"
+
+
+def ensure_sync_schema(conn):
+    """创建增量同步需要的列和表，没有 ALTER 权限时返回 False（退回全量加载）"""
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM information_schema.COLUMNS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'wastes' AND COLUMN_NAME = 'updated_at'"
+            )
+            if not cursor.fetchone()[0]:
+                cursor.execute("""
+                    ALTER TABLE wastes
+                        ADD COLUMN updated_at TIMESTAMP(6) NOT NULL
+                            DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+                        ADD INDEX idx_wastes_updated_at (updated_at)
+                """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS waste_deletions (
+                    名称 VARCHAR(100) PRIMARY KEY,
+                    deleted_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+                    INDEX idx_waste_deletions_deleted_at (deleted_at)
+                )
+            """)
+            cursor.execute(
+                "DELETE FROM waste_deletions WHERE deleted_at < NOW(6) - INTERVAL %s DAY",
+                (DELETION_RETENTION_DAYS,)
+            )
+        conn.commit()
+        return True
+    except Exception as e:
+        print(f"增量同步不可用，将使用全量加载: {e}")
+        return False
+
+
+def ensure_uncertainty_schema(conn):
+    """添加成分偏差列，没有 ALTER 权限且列不存在时返回 False（不读写偏差）"""
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM information_schema.COLUMNS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'wastes' AND COLUMN_NAME = %s",
+                (UNCERTAINTY_COLUMN,)
+            )
+            if not cursor.fetchone()[0]:
+                cursor.execute(f"ALTER TABLE wastes ADD COLUMN {UNCERTAINTY_COLUMN} TEXT NULL")
+        conn.commit()
+        return True
+    except Exception as e:
+        print(f"成分偏差列不可用: {e}")
+        return False
+
+
+def fetch_all(conn, uncertainty=False, snapshot=True):
+    """全量读取，返回 (行列表, 水位线)；uncertainty 为 True 时每行最后多一列成分偏差
+
+    snapshot 为 False 时（增量同步不可用）只执行普通查询、水位线为 None，
+    不使用 MySQL 特有的一致性快照和 NOW(6)，其他数据库上也能读取
+    """
+    if not snapshot:
+        with conn.cursor() as cursor:
+            cursor.execute(WASTE_SELECT_WITH_UNCERTAINTY if uncertainty else WASTE_SELECT)
+            rows = cursor.fetchall()
+        conn.commit()
+        return rows, None
+    with conn.cursor() as cursor:
+        cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+        try:
+            cursor.execute("SELECT NOW(6)")
+            watermark = cursor.fetchone()[0]
+            cursor.execute(WASTE_SELECT_WITH_UNCERTAINTY if uncertainty else WASTE_SELECT)
+            rows = cursor.fetchall()
+        finally:
+            conn.commit()
+    return rows, watermark
+
+
+def fetch_changes(conn, since, uncertainty=False):
+    """读取 since 之后新增/修改的行和删除的名称，返回 (行列表, 删除的名称, 新水位线)
+
+    删除的名称中有 RESTORE_MARKER 时说明期间恢复过备份，调用方应改为全量加载
+    """
+    since = since - SYNC_OVERLAP
+    with conn.cursor() as cursor:
+        cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+        try:
+            cursor.execute("SELECT NOW(6)")
+            watermark = cursor.fetchone()[0]
+            cursor.execute((WASTE_SELECT_WITH_UNCERTAINTY if uncertainty else WASTE_SELECT) + " WHERE updated_at > %s",
+                           (since,))
+            rows = cursor.fetchall()
+            cursor.execute("SELECT 名称 FROM waste_deletions WHERE deleted_at > %s", (since,))
+            deleted = [row[0] for row in cursor.fetchall()]
+        finally:
+            conn.commit()
+    return rows, deleted, watermark
+
+
+def record_deletion(cursor, name):
+    """删除废料时写入删除记录，与 DELETE 放在同一事务中"""
+    cursor.execute("REPLACE INTO waste_deletions (名称) VALUES (%s)", (name,))
+
+
+def record_restore(cursor):
+    """恢复 wastes 表时写入恢复标记（见 RESTORE_MARKER），与恢复放在同一事务中并尽量在提交前执行"""
+    cursor.execute("REPLACE INTO waste_deletions (名称) VALUES (%s)", (RESTORE_MARKER,))
+
+
+def clear_deletion(cursor, name):
+    """重新添加同名废料时清除删除记录，与 INSERT 放在同一事务中"""
+    cursor.execute("DELETE FROM waste_deletions WHERE 名称 = %s", (name,))